@@ -6,11 +6,17 @@
 #
 
 import os
+import argparse
 from utils.colors import *
-from utils.git import is_git_installed, extract_git_diffs_to_db
-from base.compiler import compile_v8
+from utils.git import is_git_installed, extract_git_diffs_to_db, load_commit_index
+from base.compiler import compile_v8, restore_checkout
 from base.bisect import *
 from base.query import search_string_in_db
+from base.batch import run_batch, BATCH_JOBS
+from base.multi import find_multi_bisect
+from base.matrix import find_flag_matrix
+from base.verdicts import export_verdicts
+from base.store import pack_legacy_diffs
 from utils.system import detect_os, ensure_env_path, ensure_ripgrep_installed
 
 # Load .env to load V8_PATH (if saved)
@@ -39,7 +45,10 @@ def display_menu():
     magenta("1. Find Bisect for your bug/crash poc")
     magenta("2. Query Commit Code")
     magenta(f"3. Compile V8 for {OS} [debug/release]")
-    magenta("4. Exit")
+    magenta("4. Resume Bisect Session")
+    magenta("5. Find Bisect for several PoCs at once")
+    magenta("6. Run a PoC under a matrix of d8 flag sets")
+    magenta("7. Exit")
 
 def initialize():
     global V8_PATH, OS
@@ -48,7 +57,10 @@ def initialize():
     OS = detect_os()
     is_git_installed(OS)
     ensure_ripgrep_installed(OS)
+    # An interrupted local bisect leaves HEAD detached at an old commit
+    restore_checkout(V8_PATH)
     extract_git_diffs_to_db(DB_PATH,V8_PATH)
+    load_commit_index(DB_PATH,V8_PATH)
 
     os.makedirs("test", exist_ok=True)
     crash_log_path = "test/crash.log"
@@ -57,14 +69,32 @@ def initialize():
         green("[+] Removed old crash.log")
 
 def main():
+    parser = argparse.ArgumentParser(description="Visect - find the commit which introduced a V8 bug")
+    parser.add_argument("--batch", metavar="JOB_FILE", help="run the bisect jobs listed in JOB_FILE (JSON lines) without prompts")
+    parser.add_argument("--jobs", type=int, default=BATCH_JOBS, help=f"number of batch bisects running at once (default: {BATCH_JOBS})")
+    parser.add_argument("--out", metavar="RESULTS_FILE", help="JSON lines file the batch results are appended to")
+    parser.add_argument("--export-verdicts", metavar="CSV_FILE", help="export every stored PoC verdict to CSV_FILE and exit")
+    parser.add_argument("--pack-db", action="store_true", help="move the per-commit .diff files of the DB into the packed store and exit")
+    args = parser.parse_args()
 
     display_banner()
+
+    if args.export_verdicts:
+        export_verdicts(args.export_verdicts)
+        return
+    if args.pack_db:
+        pack_legacy_diffs(DB_PATH)
+        return
     initialize()
 
+    if args.batch:
+        run_batch(args.batch, V8_PATH, DB_PATH, OS, args.jobs, args.out)
+        return
+
     while True:
         display_menu()
         print()
-        choice = yellow_input("Enter your choice (1/2/3/4): ")
+        choice = yellow_input("Enter your choice (1/2/3/4/5/6/7): ")
 
         if choice == '1':
             find_bisect(V8_PATH,DB_PATH,OS)
@@ -73,6 +103,12 @@ def main():
         elif choice == '3':
             compile_v8(V8_PATH,OS)
         elif choice == '4':
+            resume_bisect(V8_PATH,DB_PATH,OS)
+        elif choice == '5':
+            find_multi_bisect(V8_PATH,DB_PATH,OS)
+        elif choice == '6':
+            find_flag_matrix(V8_PATH,DB_PATH,OS)
+        elif choice == '7':
             print()
             magenta("Bye :)")
             print()
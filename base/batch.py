@@ -0,0 +1,164 @@
+import os, sys, json
+from time import time
+from contextlib import redirect_stdout, redirect_stderr
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import base.bisect as bisect
+from base.multi import run_multi_bisect
+from utils.colors import *
+from utils.flags import validate_flags
+from utils.git import is_commit_in_log, load_commit_index
+
+# Variable to hold the directory with the per-job logs and crash logs
+BATCH_DIR = "testarea/batch"
+# Variable to hold the default number of bisects running at the same time
+BATCH_JOBS = 2
+
+def load_jobs(job_file):
+    # One JSON object per line: {"poc": ..., "flags": ..., "target": ..., "bad": ..., "good": ...}
+    # or a multi-PoC job: {"pocs": [{"poc": ..., "flags": ...}, ...], "target": ..., "bad": ..., "good": ...}
+    # or a flag matrix job: {"poc": ..., "flag_sets": ["...", ...], "target": ..., "bad": ..., "good": ...}
+    jobs = []
+    with open(job_file, "r") as f:
+        for n, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                red(f"[-] Skipping line {n} of {job_file}: {e}")
+                continue
+            job.setdefault("id", f"job{n}")
+            if "flag_sets" in job and "pocs" not in job:
+                # A flag matrix bisect is a multi-PoC bisect of one PoC
+                job["pocs"] = [{"poc": job.get("poc"), "flags": flags, "name": f"#{k}"} for k, flags in enumerate(job["flag_sets"], 1)]
+            jobs.append(job)
+    return jobs
+
+def check_job(job, v8_path):
+    if "pocs" in job:
+        if not job["pocs"]:
+            return "Empty 'pocs' list"
+        for entry in job["pocs"]:
+            error = check_poc(entry)
+            if error:
+                return error
+    else:
+        error = check_poc(job)
+        if error:
+            return error
+    for field in ["target", "bad"]:
+        if not job.get(field):
+            return f"Missing field '{field}'"
+    if job["target"].lower() not in ["debug", "release"]:
+        return f"Invalid target {job['target']}"
+    if job.get("strategy", "binary") not in ["binary", "bayes"]:
+        return f"Invalid strategy {job['strategy']}"
+    if not is_commit_in_log(job["bad"][:11], v8_path):
+        return f"BAD commit {job['bad']} not found"
+    if job.get("good") and not is_commit_in_log(job["good"][:11], v8_path):
+        return f"GOOD commit {job['good']} not found"
+    return None
+
+def check_poc(entry):
+    for field in ["poc", "flags"]:
+        if not entry.get(field):
+            return f"Missing field '{field}'"
+    if not os.path.exists(entry["poc"]):
+        return f"PoC {entry['poc']} does not exist"
+    if validate_flags(entry["flags"]) == "":
+        return f"Invalid flags {entry['flags']}"
+    return None
+
+def run_job(job, v8_path, db_path, os_name):
+    # Runs in its own worker process, so the module globals of base.bisect are private to this job
+    job_dir = os.path.join(BATCH_DIR, job["id"])
+    os.makedirs(job_dir, exist_ok=True)
+    bisect.CRASH_LOG = os.path.join(job_dir, "crash.log")
+
+    result = {"id": job["id"], "target": job.get("target")}
+    if "pocs" not in job:
+        result.update({"poc": job.get("poc"), "flags": job.get("flags")})
+    start = time()
+
+    with open(os.path.join(job_dir, "bisect.log"), "w") as log, redirect_stdout(log), redirect_stderr(log):
+        try:
+            load_commit_index(db_path, v8_path)
+            error = check_job(job, v8_path)
+            if error:
+                raise ValueError(error)
+
+            good = job.get("good")
+            if "pocs" in job:
+                # Every PoC of the job shares the downloads, the result holds one entry per PoC
+                result["pocs"] = run_multi_bisect(
+                    v8_path, db_path, os_name,
+                    job["pocs"], job["target"], job["bad"][:11],
+                    good_commit=good[:11] if good else None,
+                    trials=int(job.get("trials", 1)),
+                    local=bool(job.get("local", False)),
+                    prune=bool(job.get("prune", True))
+                )
+            else:
+                result.update(bisect.run_bisect(
+                    v8_path, db_path, os_name,
+                    job["poc"], job["target"], job["bad"][:11], job["flags"],
+                    good_commit=good[:11] if good else None,
+                    parallel=int(job.get("parallel", 1)),
+                    trials=int(job.get("trials", 1)),
+                    local=bool(job.get("local", False)),
+                    prune=bool(job.get("prune", True)),
+                    strategy=job.get("strategy", "binary")
+                ))
+            result["status"] = "ok"
+        except SystemExit:
+            # The bisect engine bails with sys.exit(), the reason is in bisect.log
+            result["status"] = "failed"
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = str(e)
+
+    result["seconds"] = round(time() - start, 2)
+    result["log"] = os.path.join(job_dir, "bisect.log")
+    return result
+
+def run_batch(job_file, v8_path, db_path, os_name, jobs=BATCH_JOBS, out_path=None):
+    if not os.path.isfile(job_file):
+        red(f"[-] Job file {job_file} does not exist.")
+        sys.exit(1)
+
+    job_list = load_jobs(job_file)
+    if not job_list:
+        red(f"[-] No jobs found in {job_file}.")
+        return []
+
+    out_path = out_path or os.path.splitext(job_file)[0] + ".results.jsonl"
+    green(f"[+] Running {len(job_list)} bisect jobs, {jobs} at a time. Results go to {out_path}")
+
+    results = []
+    # Workers share the on-disk build cache, overlapping windows download each build once
+    with open(out_path, "a") as out, ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(run_job, job, v8_path, db_path, os_name): job for job in job_list}
+        for f in as_completed(futures):
+            job = futures[f]
+            try:
+                result = f.result()
+            except Exception as e:
+                result = {"id": job["id"], "status": "failed", "error": str(e)}
+
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+            results.append(result)
+
+            if result["status"] == "ok" and "pocs" in result:
+                found = [f"{r['name']} -> {r.get('bad_commit')}" for r in result["pocs"] if r["status"] == "found"]
+                green(f"[+] {result['id']}: {len(found)}/{len(result['pocs'])} PoCs bisected in {result['seconds']}s ({', '.join(found)})")
+            elif result["status"] == "ok":
+                green(f"[+] {result['id']}: Bisect Found -> {result.get('bad_commit')} (Revision {result.get('revision')}) in {result['seconds']}s")
+            else:
+                red(f"[-] {result['id']}: failed ({result.get('error', 'see ' + str(result.get('log')))})")
+
+    ok = sum(1 for r in results if r["status"] == "ok")
+    green(f"[+] Batch done: {ok}/{len(results)} jobs bisected.")
+    return results
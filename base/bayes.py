@@ -0,0 +1,179 @@
+import re, math
+
+# Prior weight of every candidate commit before looking at the crash
+BASE_PRIOR = 1.0
+# Extra prior weight of a commit touching a file of the crash stack (scaled by how close to the top the frame is)
+FILE_WEIGHT = 20.0
+# Extra prior weight of a file with the same name as a crash stack file in another directory
+BASENAME_WEIGHT = 5.0
+# Extra prior weight of a commit changing (or changing code inside) a function of the crash stack
+FUNCTION_WEIGHT = 10.0
+# Probability that a single verdict is wrong (flaky crash, unrelated breakage)
+NOISE = 0.05
+# Posterior probability at which the passes stop narrowing and only confirm the most likely culprit
+CONFIDENCE = 0.95
+# Passes expected to gain less than this many bits of information are not worth a build
+MIN_GAIN = 0.01
+
+# Frames which say nothing about the bug (sanitizer, libc, allocator and V8 crash reporting)
+IGNORED_FRAMES = ["__", "std::", "v8::base::", "abort", "raise", "gsignal", "_start", "main", "V8_Fatal", "V8_Dcheck"]
+
+# ASAN/UBSAN frames: "#3 0x5581c8 in v8::internal::Foo::Bar(...) ../../src/foo.cc:12:3"
+ASAN_FRAME = re.compile(r'#(\d+)\s+0x[0-9a-fA-F]+\s+in\s+(\S+)')
+# V8 C stack trace frames: "3: 0x5581c8 v8::internal::Foo::Bar(...) [./d8]"
+V8_FRAME = re.compile(r'^\s*(\d+):\s+0x[0-9a-fA-F]+\s+(\S+)')
+SOURCE_FILE = re.compile(r'((?:src|include|third_party)/[\w/.+-]+?\.(?:cc|cpp|c|h|hpp|inc|tq))\b')
+IDENTIFIER = re.compile(r'[A-Za-z_]\w*')
+
+def _function_name(symbol):
+    # v8::internal::compiler::JSCallReducer::ReduceArrayMap<Foo>(Node*) -> ReduceArrayMap
+    symbol = symbol.split("(")[0]
+    while True:
+        stripped = re.sub(r'<[^<>]*>', '', symbol)
+        if stripped == symbol:
+            break
+        symbol = stripped
+    return symbol.split("::")[-1]
+
+def parse_crash_frames(crash_output):
+    # Returns the source files and function names of the crash stack, weighted 1, 1/2, 1/3, ... from the top
+    files, functions = {}, {}
+    rank = 0
+
+    for line in crash_output.splitlines():
+        frame = ASAN_FRAME.search(line) or V8_FRAME.search(line)
+        source = SOURCE_FILE.search(line)
+
+        if frame:
+            symbol = frame.group(2)
+            if any(symbol.startswith(prefix) for prefix in IGNORED_FRAMES):
+                continue
+            weight = 1 / (1 + rank)
+            rank += 1
+            name = _function_name(symbol)
+            if name:
+                functions[name] = max(functions.get(name, 0), weight)
+        elif source:
+            # "# Fatal error in ../../src/objects/foo.h, line 12" and friends
+            weight = 1.0
+        else:
+            continue
+
+        if source:
+            files[source.group(1)] = max(files.get(source.group(1), 0), weight)
+
+    return files, functions
+
+def score_commit(paths, diff_content, files, functions):
+    score = BASE_PRIOR
+    basenames = {}
+    for path, weight in files.items():
+        basenames[path.rsplit("/", 1)[-1]] = max(basenames.get(path.rsplit("/", 1)[-1], 0), weight)
+
+    for path in paths:
+        if path in files:
+            score += FILE_WEIGHT * files[path]
+        elif path.rsplit("/", 1)[-1] in basenames:
+            score += BASENAME_WEIGHT * basenames[path.rsplit("/", 1)[-1]]
+
+    if functions and diff_content:
+        # Changed lines and hunk headers (which name the enclosing function)
+        changed = []
+        for line in diff_content.splitlines():
+            if line.startswith("@@") or ((line.startswith("+") or line.startswith("-")) and not line.startswith(("+++", "---"))):
+                changed.append(line)
+        identifiers = set(IDENTIFIER.findall("\n".join(changed)))
+        score += FUNCTION_WEIGHT * sum(weight for name, weight in functions.items() if name in identifiers)
+
+    return score
+
+def normalize(weights):
+    total = sum(weights)
+    if total <= 0:
+        return [1 / len(weights)] * len(weights)
+    return [w / total for w in weights]
+
+def update_posterior(posterior, t, bad, noise=NOISE):
+    # posterior[c] is the probability that the commit c commits behind BAD_COMMIT is the culprit.
+    # Testing the commit t behind BAD_COMMIT crashes exactly when t <= c.
+    return normalize([p * ((1 - noise) if (t <= c) == bad else noise) for c, p in enumerate(posterior)])
+
+def entropy(posterior):
+    return -sum(p * math.log2(p) for p in posterior if p > 0)
+
+def expected_entropies(posterior, noise=NOISE):
+    # Expected posterior entropy after testing every offset t, in O(n) with suffix sums
+    n = len(posterior)
+    mass = [0.0] * (n + 1)
+    plogp = [0.0] * (n + 1)
+    for c in range(n - 1, -1, -1):
+        p = posterior[c]
+        mass[c] = mass[c + 1] + p
+        plogp[c] = plogp[c + 1] + (p * math.log2(p) if p > 0 else 0)
+
+    log_hit, log_miss = math.log2(1 - noise), math.log2(noise) if noise > 0 else 0
+    total_mass, total_plogp = mass[0], plogp[0]
+
+    def branch(a_hit, b_hit, a_miss, b_miss):
+        # Entropy of the posterior in which a_hit/b_hit are the consistent mass/sum(p log p)
+        z = (1 - noise) * a_hit + noise * a_miss
+        if z <= 0:
+            return 0.0, 0.0
+        wlogw = (1 - noise) * (b_hit + a_hit * log_hit) + (noise * (b_miss + a_miss * log_miss) if noise > 0 else 0)
+        return z, math.log2(z) - wlogw / z
+
+    result = []
+    for t in range(n):
+        a_ge, b_ge = mass[t], plogp[t]
+        a_lt, b_lt = total_mass - a_ge, total_plogp - b_ge
+        z_bad, h_bad = branch(a_ge, b_ge, a_lt, b_lt)
+        z_good, h_good = branch(a_lt, b_lt, a_ge, b_ge)
+        result.append(z_bad * h_bad + z_good * h_good)
+    return result
+
+def best_test_point(posterior, testable, noise=NOISE):
+    # The offset whose verdict is expected to shrink the uncertainty the most, with its gain in bits
+    if not testable:
+        return None, 0.0
+    expected = expected_entropies(posterior, noise)
+    t = min(testable, key=lambda o: (expected[o], o))
+    return t, entropy(posterior) - expected[t]
+
+def quantile_points(posterior, testable, k):
+    # k offsets splitting the culprit probability into k+1 equal parts (the k-ary version of the midpoint)
+    mass = [0.0] * (len(posterior) + 1)
+    for c in range(len(posterior) - 1, -1, -1):
+        mass[c] = mass[c + 1] + posterior[c]
+
+    points = []
+    remaining = sorted(testable)
+    for j in range(1, k + 1):
+        if not remaining:
+            break
+        target = j / (k + 1)
+        t = min(remaining, key=lambda o: abs(mass[o] - target))
+        points.append(t)
+        remaining.remove(t)
+    return sorted(points)
+
+def bracket(posterior, tested, testable):
+    # The most likely culprit, the nearest commit behind it which ran clean and whether the culprit is confirmed:
+    # it crashed (or is BAD_COMMIT itself) and nothing testable is left between it and the clean commit
+    culprit = max(range(len(posterior)), key=lambda c: (posterior[c], -c))
+    good = min([o for o, verdict in tested.items() if verdict == "good" and o > culprit], default=len(posterior))
+    bracketed = (culprit == 0 or tested.get(culprit) == "bad") and not any(culprit < o < good for o in testable)
+    return culprit, good, bracketed
+
+def next_test_points(posterior, culprit, good, testable, k=1, noise=NOISE):
+    # Up to k offsets to test next, none once nothing testable can confirm the culprit
+    if posterior[culprit] >= CONFIDENCE:
+        points = []
+    elif k > 1:
+        points = quantile_points(posterior, testable, k)
+    else:
+        t, gain = best_test_point(posterior, testable, noise)
+        points = [t] if t is not None and gain >= MIN_GAIN else []
+    if not points:
+        # Likely is not found: the culprit has to crash with a clean commit right behind it
+        points = ([culprit] if culprit in testable else []) + [o for o in testable if culprit < o < good][:1]
+    return points[:k]
@@ -1,15 +1,27 @@
 import os, sys, re, shutil
 import subprocess
 import zipfile
-import requests
+import tempfile
+from fnmatch import fnmatch
 from tqdm import tqdm
-from time import time
+from time import time, sleep
 import math
+import statistics
+from concurrent.futures import ThreadPoolExecutor
 
-from base.util import get_cr_commit_position_and_date
+from base.util import get_cr_commit_position_and_date, get_file_hash, get_touched_paths, get_commit_diff
+from base.session import new_session_id, save_checkpoint, choose_session
+from base.verdicts import lookup_verdict, store_verdict, print_verdict_stats
+import base.bayes as bayes
+from base.builds import load_build_index, is_build_available, mark_build_missing, use_local_builds
+from base.compiler import build_local_d8, get_deps_hash, get_synced_deps, print_local_build_stats, restore_checkout
+from base.sandbox import CRASH, OK, ERROR, TIMEOUT, OOM, BROKEN, OUTCOME_NAMES, OUTCOMES, classify_run, run_sandboxed, start_sandboxed, calibrate_timeout
+import base.sandbox as sandbox
+from base.cache import build_key, build_lock, build_in_use, get_cached_build, get_build_sanity, set_build_sanity, get_staging_path, store_build, print_cache_stats, use_shm_cache
 from utils.flags import validate_flags
 from utils.colors import *
 from utils.system import is_internet_working
+from utils.download import DownloadError, download_to_file, format_throughput, print_download_stats
 from utils.git import *
 
 # Variable to hold path to poc.js under test (make sure this test produces a deterministic BAD)
@@ -18,10 +30,12 @@ POC_PATH = "test/test.js"
 BAD_COMMIT = None
 # Variable to hold the hash under which the poc doesn't produce a crash
 GOOD_COMMIT = None
-# Variable to hold the Default speculated Distance between the BAD_COMMIT and the Bisect Commit (Default:1024)
-DISTANCE = 1024
+# Variable to hold the first distance probed behind BAD_COMMIT when speculating GOOD_COMMIT, doubled on every probe (Default:64)
+DISTANCE = 64
 # Link to Download D8 from a commit hash
 D8_LINK = None
+# Bucket the d8 builds are downloaded from (VISECT_BUCKET_URL in .env overrides it, e.g. for a local mirror)
+BUCKET_URL = "https://www.googleapis.com/download/storage/v1/b/v8-asan/o"
 # Define Target to find bisect on (debug/release)
 TARGET = None
 # Define V8 Repo Path
@@ -30,255 +44,812 @@ V8_PATH = None
 DB_PATH = None
 # Define Time Array for ETA Specualtion
 TIME_ARRAY = []
+# Define OS the d8 builds are fetched for (x64/w64)
+OS = None
+# Variable to hold the background downloads of speculated midpoints (commit hash -> future)
+PREFETCH = {}
+# Thread pool used for speculative prefetching of the next midpoints
+PREFETCH_POOL = None
+# Variable to hold the path the crash output of the PoC is saved to
+CRASH_LOG = "test/crash.log"
+# Variable to hold the number of revisions tested per round (1 = classic binary bisect)
+PARALLEL = 1
+# Upper bound for PARALLEL (every revision of a round holds a download spool of up to SPOOL_SIZE in memory)
+MAX_PARALLEL = os.cpu_count() or 1
+# Variable to hold the number of d8 runs per revision used to classify flaky crashes (1 = trust a single run)
+TRIALS = 1
+# Upper bound for TRIALS (trials only run d8, they download nothing)
+MAX_TRIALS = 64
+# Variable to hold the fraction of trials which have to crash for a revision to count as BAD
+TRIAL_THRESHOLD = 0.5
+# Variable to hold the crash rate of every revision tested in this session (build key -> [crashes, trials])
+REPORT = {}
+# What a run that hits the timeout/memory limit means for the bisect: "good", "bad" or "skip" (test a neighbouring revision instead)
+TIMEOUT_POLICY = "skip"
+OOM_POLICY = "skip"
+# Variable to hold commits which were skipped by the TIMEOUT/OOM policy
+SKIPPED = set()
+# Archive members d8 needs to run: the binary, snapshot blobs, ICU data and shared libraries
+D8_MEMBERS = ["d8", "d8.exe", "*.bin", "icudtl.dat", "*.so", "*.so.*", "*.dll"]
+# Optional manifest restricting the extracted members further (one glob per line)
+D8_MANIFEST = "d8_manifest.txt"
+# Archives up to this size are kept in memory, larger ones spill to a temporary file (512 MB)
+SPOOL_SIZE = 512 * 1024 * 1024
+# Variable to hold the id of the running session (checkpointed to testarea/sessions/<id>.json after every verdict)
+SESSION_ID = None
+# Variable to hold the verdict of every commit tested in this session (commit hash -> good/bad/skip)
+VERDICTS = {}
+# Variable to hold the d8 flags of this session
+CUSTOM_ARGS = None
+# Variable to hold whether revisions are built from the V8 checkout instead of downloaded
+LOCAL_BUILD = False
+# Variable to hold whether commits touching no runtime sources are left out of the bisect
+PRUNE = True
+# Path prefixes which end up in d8, a commit touching none of them cannot change its behaviour
+RUNTIME_PATHS = ["src/", "include/", "third_party/", "DEPS"]
+# Windows up to this many commits are bisected by candidate rank, larger ones snap to the nearest candidate
+PRUNE_SCAN = 4096
+# Variable to hold which commits touch runtime sources (commit hash -> bool)
+RUNTIME_COMMITS = {}
+# Variable to hold how test points are picked: "binary" (midpoints) or "bayes" (crash stack weighted, noise tolerant)
+STRATEGY = "binary"
+# Windows larger than this are narrowed with binary passes before the Bayesian passes start
+BAYES_SCAN = 4096
+# Variable to hold the posterior probability of the reported culprit (Bayesian strategy only)
+POSTERIOR = None
+# Variable to hold the most likely culprit of a Bayesian bisect which could not be confirmed (None = confirmed or not Bayesian)
+PROBABLE_COMMIT = None
+# Variable to hold the sha256 of the PoC (verdicts are only reused for the exact same PoC content)
+POC_HASH = None
+# Variable to hold the GOOD_COMMIT given by the user (None = speculate it)
+GOOD_INPUT = None
 
-def download_and_extract_d8(commit_hash):
+def select_d8_members(names):
+    manifest = None
+    if os.path.isfile(D8_MANIFEST):
+        with open(D8_MANIFEST, "r") as f:
+            manifest = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+    members = []
+    for name in names:
+        if name.endswith("/"):
+            continue
+        base = os.path.basename(name)
+        if not any(fnmatch(base, pattern) for pattern in D8_MEMBERS):
+            continue
+        if manifest is not None and not any(fnmatch(name, p) or fnmatch(base, p) for p in manifest):
+            continue
+        members.append(name)
+    return members
+
+def download_and_extract_d8(commit_hash, quiet=False):
     # Validate revision
     revision, date = get_cr_commit_position_and_date(commit_hash,DB_PATH)
     if not re.fullmatch(r"\d{5,6}", str(revision)):
         red("[-] Invalid revision number. Must be 5 or 6 digits.")
         return
 
+    key = build_key(OS, get_build_target(), revision)
+    with build_lock(key):
+        if LOCAL_BUILD:
+            return _build_d8(commit_hash, revision, key, quiet)
+        return _fetch_d8(revision, key, quiet)
+
+def get_build_target():
+    # Local builds are not the ASAN bucket builds, they get cache keys (and verdicts) of their own
+    return f"{TARGET}-local" if LOCAL_BUILD else TARGET
+
+def _build_d8(commit_hash, revision, key, quiet):
+    build_dir = get_cached_build(key)
+    if build_dir:
+        if not quiet:
+            green(f"[+] Revision {revision} found in build cache: {build_dir}")
+        return build_dir
+
+    # The artifacts d8 needs are staged while the checkout is still locked to this commit
+    extract_dir = build_local_d8(V8_PATH, OS, TARGET, commit_hash, get_staging_path(key), select_d8_members)
+    if extract_dir is None:
+        # Remembered like a missing prebuilt d8, the bisect moves on to a neighbouring commit
+        mark_build_missing(revision)
+        return None
+
+    build_dir = store_build(key, extract_dir)
+    if not quiet:
+        green("[+] Done. Build stored in "+build_dir)
+    return build_dir
+
+def _fetch_d8(revision, key, quiet):
+    # Reuse the build if this revision was already fetched for this OS/TARGET
+    build_dir = get_cached_build(key)
+    if build_dir:
+        if not quiet:
+            green(f"[+] Revision {revision} found in build cache: {build_dir}")
+        return build_dir
+
+    # Never request a build the bucket is known not to have
+    if not is_build_available(revision):
+        red(f"[-] No prebuilt d8 available for revision {revision}.")
+        return
+
     # Setup paths
     base_dir = "testarea"
-    zip_path = os.path.join(base_dir, "test.zip")
-    extract_dir = os.path.join(base_dir, "test")
+    extract_dir = get_staging_path(key)
 
-    # Create/empty base directory
+    # Create/empty staging area
     os.makedirs(base_dir, exist_ok=True)
-    if os.path.exists(zip_path):
-        os.remove(zip_path)
     if os.path.isdir(extract_dir):
         shutil.rmtree(extract_dir)
 
     # Format the download URL
     download_url = D8_LINK.replace("@", str(revision))
 
-    yellow(f"[*] Downloading revision {revision}...")
-    print()
+    if not quiet:
+        yellow(f"[*] Downloading revision {revision}...")
+        print()
+
+    # The archive never hits testarea/ as a .zip, it is spooled in memory (or a temp file if huge)
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE, dir=base_dir)
 
     try:
-        is_internet_working()
-        # Using requests with tqdm progress bar
-        with requests.get(download_url, stream=True) as r:
-            r.raise_for_status()
-            total = int(r.headers.get('content-length', 0))
-            with open(zip_path, 'wb') as f, tqdm(
-                total=total, unit='B', unit_scale=True, desc="Downloading"
-            ) as pbar:
-                for chunk in r.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        pbar.update(len(chunk))
-    except:
-        red("[-] V8 Download Failed!")
+        # Pooled, resumable (and for large archives range-parallel) download with tqdm progress bar
+        with tqdm(unit='B', unit_scale=True, desc="Downloading", disable=quiet) as pbar:
+            def set_total(size):
+                pbar.total = size or None
+                pbar.refresh()
+            stats = download_to_file(download_url, spool, progress=pbar.update, on_size=set_total)
+    except DownloadError as e:
+        spool.close()
+        if e.status_code == 404:
+            mark_build_missing(revision)
+            red(f"[-] No prebuilt d8 available for revision {revision} (404). Skipping it from now on.")
+            return
+        if e.status_code in [429, 500, 502, 503, 504]:
+            # The bucket kept failing after the retries, the bisect moves on to a neighbouring revision
+            mark_build_missing(revision)
+            red(f"[-] Build of revision {revision} unavailable (HTTP {e.status_code}). Skipping it for this session.")
+            return
+        red(f"[-] V8 Download Failed for revision {revision}! {e}")
         sys.exit(1)
-        
 
-    # Extract zip
-    print()
-    yellow("[*] Extracting file for analysis...")
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(extract_dir)
+    if not quiet:
+        green(f"[+] Downloaded revision {revision}: {format_throughput(stats)}")
 
-    # Clean up
-    os.remove(zip_path)
-    green("[+] Done. Extracted to "+extract_dir)
+    # Extract only the members d8 needs
+    if not quiet:
+        print()
+        yellow("[*] Extracting file for analysis...")
+    with spool, zipfile.ZipFile(spool, 'r') as zip_ref:
+        members = select_d8_members(zip_ref.namelist())
+        zip_ref.extractall(extract_dir, members=members)
 
-def run_d8_with_args(custom_args):
-    d8_path = "testarea/test/d8"
-    assert os.path.isfile(d8_path), f"[-] d8 binary not found at {d8_path}"
+    # Move the build into the cache
+    build_dir = store_build(key, extract_dir)
+    if not quiet:
+        green("[+] Done. Extracted to "+build_dir)
+    return build_dir
 
-    # Ensure d8 is executable
+def _prefetch_build(commit_hash):
     try:
-        subprocess.run(["chmod", "+x", d8_path], check=True)
-        green(f"[+] Made {d8_path} executable.")
-    except subprocess.CalledProcessError:
-        red(f"[-] Failed to chmod +x {d8_path}")
+        return download_and_extract_d8(commit_hash, quiet=True)
+    except BaseException:
+        # A failed prefetch is not fatal, the foreground fetch will retry it
+        return None
+
+def prefetch_build(commit_hash):
+    global PREFETCH_POOL
+    if commit_hash is None or commit_hash in PREFETCH:
         return
 
-    # Check or create tests/test.js
-    test_js_path = "test/test.js"
-    os.makedirs(os.path.dirname(test_js_path), exist_ok=True)
-    if not os.path.exists(test_js_path):
-        with open(test_js_path, "w") as f:
-            f.write('var a = 42;')
-        green("[+] Created test/test.js")
+    if LOCAL_BUILD:
+        # There is one V8 checkout to build in, nothing can be built ahead
+        return
 
-    # Dry-run with test.js
-    yellow("[*] Running d8 with test.js to verify setup...")
-    try:
-        subprocess.run(
-            [d8_path] + custom_args.split() + [test_js_path],
-            check=True
-        )
-        green("[+] test.js executed successfully.")
-    except subprocess.CalledProcessError:
-        red("[-] Error running d8 with test.js. Check d8 binary or arguments.")
+    if PREFETCH_POOL is None:
+        PREFETCH_POOL = ThreadPoolExecutor(max_workers=2)
+
+    yellow(f"[*] Prefetching {commit_hash} in the background...")
+    PREFETCH[commit_hash] = PREFETCH_POOL.submit(_prefetch_build, commit_hash)
+
+def cancel_prefetch(commit_hash):
+    future = PREFETCH.pop(commit_hash, None)
+    # Downloads which already started are left to finish into the build cache
+    if future is not None:
+        future.cancel()
+
+def fetch_build(commit_hash):
+    future = PREFETCH.pop(commit_hash, None)
+    if future is not None and not future.cancelled():
+        yellow(f"[*] Waiting for prefetched build of {commit_hash}...")
+        build_dir = future.result()
+        if build_dir:
+            green(f"[+] Using prefetched build: {build_dir}")
+            return build_dir
+
+    return download_and_extract_d8(commit_hash)
+
+def checkpoint(finished=False, result=None):
+    if SESSION_ID is None:
+        return
+    save_checkpoint({
+        "session": SESSION_ID,
+        "finished": finished,
+        "poc": POC_PATH,
+        "poc_sha256": POC_HASH,
+        "flags": CUSTOM_ARGS,
+        "target": TARGET,
+        "os": OS,
+        "parallel": PARALLEL,
+        "trials": TRIALS,
+        "local": LOCAL_BUILD,
+        "prune": PRUNE,
+        "strategy": STRATEGY,
+        "good_input": GOOD_INPUT,
+        "bad_commit": BAD_COMMIT,
+        "good_commit": GOOD_COMMIT,
+        "verdicts": VERDICTS,
+        "skipped": sorted(SKIPPED),
+        "report": REPORT,
+        "time_array": TIME_ARRAY,
+        "run_timeout": sandbox.RUN_TIMEOUT,
+        "result": result
+    })
+
+def record_verdict(commit_hash, verdict):
+    VERDICTS[commit_hash] = verdict
+    if verdict == "skip":
+        SKIPPED.add(commit_hash)
+
+def get_known_outcome(commit_hash):
+    return get_known_outcome_and_runtime(commit_hash)[0]
+
+def get_known_outcome_and_runtime(commit_hash):
+    # Returns (outcome, runtime), (None, None) if the commit still has to be run
+    # Commits with a verdict from an earlier (resumed) run of this session are not run again
+    verdict = VERDICTS.get(commit_hash)
+    if verdict == "bad":
+        return CRASH, None
+    if verdict == "good":
+        return OK, None
+
+    # Neither is a revision some earlier bisect already ran this exact PoC and flags on
+    revision, _ = get_cr_commit_position_and_date(commit_hash, DB_PATH)
+    if not re.fullmatch(r"\d{5,6}", str(revision)):
+        return None, None
+    record = lookup_verdict(build_key(OS, get_build_target(), revision), POC_HASH, CUSTOM_ARGS, TRIALS, sandbox.RUN_TIMEOUT)
+    if record is None:
+        return None, None
+
+    cyan(f"[*] {commit_hash} (Revision {revision}) has a stored verdict for this PoC and flags: {record['outcome']}")
+    return OUTCOMES[record["outcome"]], record["runtime"]
+
+def remember_outcome(key, custom_args, outcome, runtime=None, poc_path=None, poc_hash=None, report_key=None):
+    poc_path = poc_path or POC_PATH
+    poc_hash = poc_hash or POC_HASH
+    # BROKEN is a property of the build, the sanity check cache already remembers it
+    if outcome == BROKEN or poc_hash is None:
         return
+    crashes_trials = REPORT.get(report_key or key) if TRIALS > 1 else None
+    crash_rate = round(crashes_trials[0] / crashes_trials[1], 3) if crashes_trials and crashes_trials[1] else None
+    store_verdict(key, poc_hash, custom_args, OUTCOME_NAMES[outcome], TRIALS, crash_rate, runtime, sandbox.RUN_TIMEOUT, poc_path)
 
-    # Run with PoC and log crash if any
+def get_verdict(ret):
+    if ret == TIMEOUT:
+        return TIMEOUT_POLICY
+    if ret == OOM:
+        return OOM_POLICY
+    if ret == BROKEN:
+        return "skip"
+    if ret in [OK, ERROR]:
+        return "good"
+    return "bad"
+
+def is_runtime_commit(commit_hash):
+    if commit_hash not in RUNTIME_COMMITS:
+        paths = get_touched_paths(commit_hash, DB_PATH)
+        # Commits missing from the DB (or without a diff, like merges) are kept, they cannot be ruled out
+        RUNTIME_COMMITS[commit_hash] = not paths or any(path.startswith(prefix) for path in paths for prefix in RUNTIME_PATHS)
+    return RUNTIME_COMMITS[commit_hash]
+
+def get_pruned_commits(anchor, window):
+    # Commits strictly inside the window which were never candidates
+    if not PRUNE:
+        return []
+    commits = [get_commit(anchor, offset, V8_PATH) for offset in range(1, window)]
+    return [commit_hash for commit_hash in commits if not is_runtime_commit(commit_hash)]
+
+def has_runtime_commits(window):
+    # Whether commits which could have changed d8 are left strictly inside the window
+    if not PRUNE:
+        return True
+    return any(is_runtime_commit(get_commit(BAD_COMMIT, offset, V8_PATH)) for offset in range(1, window))
+
+def is_commit_buildable(commit_hash):
+    if commit_hash in SKIPPED:
+        return False
+    if PRUNE and not is_runtime_commit(commit_hash):
+        return False
+    revision, _ = get_cr_commit_position_and_date(commit_hash, DB_PATH)
+    if not re.fullmatch(r"\d{5,6}", str(revision)):
+        return False
+    return is_build_available(revision)
+
+def find_local_commit(anchor, offset, lo, hi):
+    # Prefer a commit close to offset which needs no gclient sync (same DEPS as the last local build)
+    synced = get_synced_deps()
+    radius = max(1, (hi - lo) // 8)
+    for delta in range(0, radius + 1):
+        for candidate in ([offset] if delta == 0 else [offset - delta, offset + delta]):
+            if lo < candidate < hi:
+                commit_hash = get_commit(anchor, candidate, V8_PATH)
+                if is_commit_buildable(commit_hash) and (synced is None or get_deps_hash(commit_hash, V8_PATH) == synced):
+                    return candidate, commit_hash
+    return None, None
+
+def find_candidate_commit(anchor, offset, lo, hi):
+    # Bisect over the runtime commits of (lo, hi) only: offset picks the candidate at the same relative rank
+    candidates = [o for o in range(lo + 1, hi) if is_commit_buildable(get_commit(anchor, o, V8_PATH))]
+    if not candidates:
+        return None, None
+    rank = min(len(candidates) - 1, max(0, round(len(candidates) * (offset - lo) / (hi - lo) - 0.5)))
+    return candidates[rank], get_commit(anchor, candidates[rank], V8_PATH)
+
+def find_available_commit(anchor, offset, lo, hi):
+    if LOCAL_BUILD:
+        candidate, commit_hash = find_local_commit(anchor, offset, lo, hi)
+        if commit_hash is not None:
+            return candidate, commit_hash
+
+    if PRUNE and hi - lo <= PRUNE_SCAN:
+        return find_candidate_commit(anchor, offset, lo, hi)
+
+    # Snap offset (counted back from anchor) to the nearest commit with a prebuilt d8 strictly inside (lo, hi)
+    for delta in range(0, max(offset - lo, hi - offset)):
+        for candidate in ([offset] if delta == 0 else [offset - delta, offset + delta]):
+            if lo < candidate < hi:
+                commit_hash = get_commit(anchor, candidate, V8_PATH)
+                if is_commit_buildable(commit_hash):
+                    return candidate, commit_hash
+    return None, None
+
+def get_next_midpoints(commit_center, window, d):
+    # Midpoint of the next window if commit_center turns out BAD (GOOD_COMMIT..commit_center)
+    next_bad = None
+    if window - d > 1:
+        _, next_bad = find_available_commit(commit_center, (window - d) // 2, 0, window - d)
+
+    # Midpoint of the next window if commit_center turns out GOOD (commit_center..BAD_COMMIT)
+    next_good = None
+    if d > 1:
+        _, next_good = find_available_commit(BAD_COMMIT, d // 2, 0, d)
+
+    return next_bad, next_good
+
+def run_d8_with_args(custom_args, build_dir, crash_log=None, poc_path=None, poc_hash=None):
+    return run_d8_with_args_and_runtime(custom_args, build_dir, crash_log, poc_path, poc_hash)[0]
+
+def run_d8_with_args_and_runtime(custom_args, build_dir, crash_log=None, poc_path=None, poc_hash=None):
+    # Returns (outcome, runtime). The runtime is passed back rather than kept in a global, round threads and batch workers run d8 at once
+    # poc_path/poc_hash default to the PoC of the session, other PoCs are run by the multi-PoC mode
+    crash_log = crash_log or CRASH_LOG
+    poc_path = poc_path or POC_PATH
+    poc_hash = poc_hash or POC_HASH
+    if not build_dir:
+        # No outcome at all, callers skip the commit instead of reading a verdict into it
+        red("[-] No d8 build available to run.")
+        return None, None
+
+    # The build cannot be evicted from under d8 (another round thread or batch worker may store builds meanwhile)
+    with build_in_use(os.path.basename(build_dir)):
+        return _run_d8(custom_args, build_dir, crash_log, poc_path, poc_hash)
+
+def _run_d8(custom_args, build_dir, crash_log, poc_path, poc_hash):
+    d8_path = os.path.join(build_dir, "d8")
+    assert os.path.isfile(d8_path), f"[-] d8 binary not found at {d8_path}"
+
+    # Ensure d8 is executable
+    mode = os.stat(d8_path).st_mode
+    if not os.access(d8_path, os.X_OK):
+        try:
+            os.chmod(d8_path, mode | 0o111)
+            green(f"[+] Made {d8_path} executable.")
+        except OSError:
+            red(f"[-] Failed to chmod +x {d8_path}")
+            return BROKEN, None
+
+    # The test.js verdict is stored with the cached build, so every build is dry-run once per flag set
+    key = os.path.basename(build_dir)
+    sanity = get_build_sanity(key, custom_args)
+    if sanity is False:
+        red(f"[-] {key} failed the test.js sanity check earlier. Skipping it.")
+        return BROKEN, None
+
+    if sanity is None:
+        # Check or create tests/test.js
+        test_js_path = "test/test.js"
+        os.makedirs(os.path.dirname(test_js_path), exist_ok=True)
+        if not os.path.exists(test_js_path):
+            with open(test_js_path, "w") as f:
+                f.write('var a = 42;')
+            green("[+] Created test/test.js")
+
+        # Dry-run with test.js
+        yellow("[*] Running d8 with test.js to verify setup...")
+        try:
+            subprocess.run(
+                [d8_path] + custom_args.split() + [test_js_path],
+                check=True,
+                timeout=sandbox.RUN_TIMEOUT
+            )
+            green("[+] test.js executed successfully.")
+            set_build_sanity(key, custom_args, True)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+            red("[-] Error running d8 with test.js. Check d8 binary or arguments.")
+            set_build_sanity(key, custom_args, False)
+            return BROKEN, None
+
+    # Crash rates of other PoCs/flags on this build are reported separately
+    report_key = key if (poc_path, custom_args) == (POC_PATH, CUSTOM_ARGS) else f"{key} {os.path.basename(poc_path)} {custom_args}"
+
+    if TRIALS > 1:
+        outcome, runtime = run_poc_trials(d8_path, custom_args, crash_log, report_key, poc_path)
+        remember_outcome(key, custom_args, outcome, runtime, poc_path, poc_hash, report_key)
+        return outcome, runtime
+
+    # Run with PoC (under timeout and memory limits) and log crash if any
     yellow("[*] Running d8 with PoC and checking for crash...")
     try:
-        result = subprocess.run(
-            [d8_path] + custom_args.split() + [POC_PATH],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True
+        outcome, returncode, output, runtime = run_sandboxed(
+            [d8_path] + custom_args.split() + [poc_path],
+            d8_path
         )
+    except Exception as e:
+        red("[-] Exception while running PoC:", e)
+        sys.exit(1)
 
-        base_dir = "testarea"
-        zip_path = os.path.join(base_dir, "test.zip")
-        extract_dir = os.path.join(base_dir, "test")
-        os.makedirs(base_dir, exist_ok=True)
-        if os.path.exists(zip_path):
-            os.remove(zip_path)
-        if os.path.isdir(extract_dir):
-            shutil.rmtree(extract_dir)
-
-        if result.returncode != 0:
-            # Log output only on crash or error
-            if result.returncode != 1: # Generic Errors
-                os.makedirs("test", exist_ok=True)
-                with open("test/crash.log", "w") as f:
-                    f.write(result.stdout)
-                light_red(f"[-] d8 crashed with return code {result.returncode}. Output saved to test/crash.log.")
-                return -1
-            else:
-                return 1
-        else:
-            green("[+] d8 ran successfully with PoC.")
-            return 0
+    remember_outcome(key, custom_args, outcome, runtime, poc_path, poc_hash)
+    if outcome == CRASH:
+        # Log output only on crash
+        os.makedirs(os.path.dirname(crash_log), exist_ok=True)
+        with open(crash_log, "w") as f:
+            f.write(output)
+        light_red(f"[-] d8 crashed with return code {returncode}. Output saved to {crash_log}.")
+    elif outcome == TIMEOUT:
+        light_red(f"[-] d8 timed out after {sandbox.RUN_TIMEOUT}s (treated as {TIMEOUT_POLICY}).")
+    elif outcome == OOM:
+        light_red(f"[-] d8 ran out of memory (treated as {OOM_POLICY}).")
+    elif outcome == OK:
+        green("[+] d8 ran successfully with PoC.")
+    return outcome, runtime
+
+def run_poc_trials(d8_path, custom_args, crash_log, key, poc_path=None):
+    # Launch all TRIALS runs at once and stop as soon as the threshold vote is decided. Returns (outcome, runtime)
+    poc_path = poc_path or POC_PATH
+    needed = max(1, math.ceil(TRIALS * TRIAL_THRESHOLD))
+    yellow(f"[*] Running d8 with PoC {TRIALS} times in parallel (BAD if {needed}+ crash)...")
+
+    trials = []
+    start = time()
+    try:
+        for _ in range(TRIALS):
+            out = tempfile.TemporaryFile(mode="w+", errors="replace")
+            proc = start_sandboxed([d8_path] + custom_args.split() + [poc_path], d8_path, out)
+            trials.append((proc, out))
     except Exception as e:
         red("[-] Exception while running PoC:", e)
         sys.exit(1)
 
-def find_bisect(v8_path,db_path,OS): # Method 1 :TODO
-    global POC_PATH, TARGET, D8_LINK, V8_PATH, DB_PATH, BAD_COMMIT, GOOD_COMMIT, TIME, TIME_ARRAY
+    crashes, finished = 0, 0
+    crash_output = None
+    outcomes = []
+    runtimes = []
+    pending = list(trials)
+
+    while pending and crashes < needed and crashes + len(pending) >= needed:
+        timed_out = time() - start > sandbox.RUN_TIMEOUT
+        for proc, out in list(pending):
+            if proc.poll() is None and not timed_out:
+                continue
+            pending.remove((proc, out))
+            finished += 1
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+                outcome = TIMEOUT
+            else:
+                out.seek(0)
+                outcome = classify_run(proc.returncode, out.read())
+                runtimes.append(time() - start)
+            outcomes.append(outcome)
+
+            # TIMEOUT/OOM trials vote according to their policy
+            if outcome == CRASH or get_verdict(outcome) == "bad":
+                crashes += 1
+                if crash_output is None:
+                    out.seek(0)
+                    crash_output = out.read()
+        if pending:
+            sleep(0.05)
+
+    # Vote decided, the remaining runs are not needed
+    for proc, out in trials:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        out.close()
+
+    REPORT[key] = [crashes, finished]
+    rate = crashes / finished if finished else 0
+    # The median trial calibrates the timeout like the single run does (the runs share the cores, so it errs long)
+    runtime = statistics.median(runtimes) if runtimes else None
+
+    if crashes >= needed:
+        os.makedirs(os.path.dirname(crash_log), exist_ok=True)
+        with open(crash_log, "w") as f:
+            f.write(crash_output)
+        light_red(f"[-] d8 crashed in {crashes}/{finished} trials ({rate:.0%}). Output saved to {crash_log}.")
+        return CRASH, runtime
+
+    # Every trial hit a limit, let the bisect policy decide instead of calling it clean
+    if outcomes and all(outcome in [TIMEOUT, OOM] for outcome in outcomes):
+        light_red(f"[-] All {finished} trials hit the timeout/memory limit.")
+        return max(set(outcomes), key=outcomes.count), runtime
+
+    green(f"[+] d8 crashed in {crashes}/{finished} trials ({rate:.0%}), below the threshold.")
+    return OK, runtime
+
+def get_round_points(window):
+    # Split the GOOD..BAD window into PARALLEL+1 segments, offsets are counted back from BAD_COMMIT
+    offsets = set()
+    for i in range(1, PARALLEL + 1):
+        offset = round(i * window / (PARALLEL + 1))
+        if 0 < offset < window:
+            offsets.add(offset)
+    return sorted(offsets)
+
+def _test_commit(commit_hash, custom_args):
+    known = get_known_outcome(commit_hash)
+    if known is not None:
+        return known
+    build_dir = download_and_extract_d8(commit_hash, quiet=True)
+    if build_dir is None:
+        return None
+    crash_log = os.path.join(os.path.dirname(CRASH_LOG), f"crash-{commit_hash}.log")
+    return run_d8_with_args(custom_args, build_dir, crash_log)
+
+def run_parallel_round(window, custom_args):
+    global BAD_COMMIT, GOOD_COMMIT
+
+    points = {}
+    for offset in get_round_points(window):
+        offset, commit_hash = find_available_commit(BAD_COMMIT, offset, 0, window)
+        if commit_hash is not None:
+            points[offset] = commit_hash
+
+    if not points:
+        return False
+
+    offsets = sorted(points)
+    commits = [points[offset] for offset in offsets]
+
+    yellow(f"[*] Testing {len(commits)} revisions in parallel: {', '.join(commits)}")
+
+    # Every revision gets its own cached build directory and d8 process
+    with ThreadPoolExecutor(max_workers=len(commits)) as executor:
+        futures = {ch: executor.submit(_test_commit, ch, custom_args) for ch in commits}
+        results = {ch: futures[ch].result() for ch in commits}
+
+    # Walk from the oldest tested revision to the newest, the first crash is the new BAD_COMMIT
+    new_good, new_bad = GOOD_COMMIT, BAD_COMMIT
+    for offset, ch in sorted(zip(offsets, commits), reverse=True):
+        if results[ch] is None:
+            continue
+        verdict = get_verdict(results[ch])
+        record_verdict(ch, verdict)
+        if verdict == "skip":
+            yellow(f"[*] {ch} [{offset} away from {BAD_COMMIT}] skipped (timeout/OOM).")
+            continue
+        if verdict == "bad":
+            light_red(f"[-] {ch} [{offset} away from {BAD_COMMIT}] ran with a Crash.")
+            new_bad = ch
+            break
+        green(f"[+] {ch} [{offset} away from {BAD_COMMIT}] ran without a Crash.")
+        new_good = ch
+
+    GOOD_COMMIT, BAD_COMMIT = new_good, new_bad
+    checkpoint()
+    green(f"[+] Window narrowed to GOOD_COMMIT {GOOD_COMMIT} .. BAD_COMMIT {BAD_COMMIT}")
+    return True
+
+def gallop_good_commit(custom_args):
+    global BAD_COMMIT, GOOD_COMMIT
+
+    anchor = BAD_COMMIT
+    limit = get_commits_behind(anchor)
+    distance = DISTANCE
+
+    while True:
+        # Probe PARALLEL exponentially growing distances per round (64, 128, 256, ...)
+        distances = [distance * (2 ** i) for i in range(PARALLEL)]
+        if limit is not None:
+            distances = sorted(set(min(d, limit) for d in distances))
+            if distances == [0]:
+                red("[-] BAD_COMMIT is the oldest commit in the history. Cannot speculate a GOOD_COMMIT.")
+                sys.exit(1)
+
+        # Snap every probe to a revision that actually has a prebuilt d8
+        probes = {}
+        for d in distances:
+            hi = limit + 1 if limit is not None else 2 * d
+            d, ch = find_available_commit(anchor, d, 0, hi)
+            if ch is not None:
+                probes[d] = ch
+        distances = sorted(probes)
+        commits = [probes[d] for d in distances]
+        if not commits:
+            red("[-] No prebuilt d8 found behind BAD_COMMIT. Cannot speculate a GOOD_COMMIT.")
+            sys.exit(1)
+
+        yellow(f"[*] Speculating GOOD_COMMIT by moving {', '.join(str(d) for d in distances)} spaces behind {anchor}...")
+
+        start = time()
+        if len(commits) == 1:
+            results = {commits[0]: get_known_outcome(commits[0])}
+            if results[commits[0]] is None:
+                build_dir = download_and_extract_d8(commits[0])
+                if build_dir is not None:
+                    results[commits[0]] = run_d8_with_args(custom_args, build_dir)
+        else:
+            with ThreadPoolExecutor(max_workers=len(commits)) as executor:
+                futures = {ch: executor.submit(_test_commit, ch, custom_args) for ch in commits}
+                results = {ch: futures[ch].result() for ch in commits}
+        TIME_ARRAY.append(time() - start)
+
+        # Nearest probe first: every crash tightens BAD_COMMIT, the first clean run is GOOD_COMMIT
+        for d, ch in zip(distances, commits):
+            if results[ch] is None:
+                continue
+            verdict = get_verdict(results[ch])
+            record_verdict(ch, verdict)
+            if verdict == "skip":
+                continue
+            if verdict == "good":
+                GOOD_COMMIT = ch
+                checkpoint()
+                green(f"[+] GOOD_COMMIT Found {d} spaces behind {anchor}! Setting {GOOD_COMMIT} as GOOD_COMMIT.")
+                green(f"[+] Tightest known window: GOOD_COMMIT {GOOD_COMMIT} .. BAD_COMMIT {BAD_COMMIT}")
+                return
+            light_red(f"[-] d8 ran with a Crash {d} spaces behind. Setting BAD_COMMIT to {ch}")
+            BAD_COMMIT = ch
+
+        checkpoint()
+        if limit is not None and distances[-1] >= limit:
+            red("[-] Reached the oldest commit and the PoC still crashes. Bailing...")
+            sys.exit(1)
+
+        distance = distances[-1] * 2
+
+def setup_bisect(v8_path, db_path, os_name, poc_path, target, parallel=1, trials=1, session_id=None, local=False, prune=True, strategy="binary"):
+    global POC_PATH, TARGET, D8_LINK, V8_PATH, DB_PATH, OS, BAD_COMMIT, GOOD_COMMIT, TIME_ARRAY, PARALLEL, TRIALS, REPORT
+    global SESSION_ID, VERDICTS, CUSTOM_ARGS, GOOD_INPUT, POC_HASH, LOCAL_BUILD, PRUNE, STRATEGY, POSTERIOR, PROBABLE_COMMIT
     V8_PATH = v8_path
     DB_PATH = db_path
-    custom_args = None
-    speculate = 0
-    TIME = 0
+    OS = os_name
+    POC_PATH = poc_path
+    POC_HASH = get_file_hash(poc_path)
+    TARGET = target
+    PARALLEL = parallel
+    TRIALS = trials
+    REPORT = {}
+    SKIPPED.clear()
+    BAD_COMMIT = None
+    GOOD_COMMIT = None
     TIME_ARRAY = []
+    SESSION_ID = session_id or new_session_id()
+    VERDICTS = {}
+    CUSTOM_ARGS = None
+    GOOD_INPUT = None
+    LOCAL_BUILD = local
+    PRUNE = prune
+    STRATEGY = strategy
+    POSTERIOR = None
+    PROBABLE_COMMIT = None
 
-    while True:
-        POC_PATH = yellow_input(f"Enter the path for Crash PoC: ").strip()
-        if not os.path.exists(POC_PATH):
-            red("[-] Path does not exist. Try again.")
-        else:
-            break
-        print()
+    if os.getenv("VISECT_SHM"):
+        use_shm_cache()
 
-    while True:
-        choice = yellow_input("Input Target (debug/release): ")
+    if LOCAL_BUILD:
+        # One checkout means one build at a time
+        PARALLEL = 1
+        use_local_builds()
+        green(f"[+] Revisions are built locally in {V8_PATH}, prebuilt d8 downloads are disabled.")
+        return
 
-        if (choice.lower() == "debug") or (choice.lower() == "release"):
-            TARGET = choice
-            break
-        
-        red("[-] Invalid Target. Please try again.")
-        print()
+    bucket_url = os.getenv("VISECT_BUCKET_URL", BUCKET_URL).rstrip("/")
+    if bucket_url == BUCKET_URL:
+        is_internet_working()
 
     if OS == "x64":
-        D8_LINK = f"https://www.googleapis.com/download/storage/v1/b/v8-asan/o/linux-{TARGET}%2Fd8-linux-{TARGET}-v8-component-@.zip?alt=media"
+        D8_LINK = f"{bucket_url}/linux-{TARGET}%2Fd8-linux-{TARGET}-v8-component-@.zip?alt=media"
     
     elif OS == "w64":
-        D8_LINK = f"https://www.googleapis.com/download/storage/v1/b/v8-asan/o/win64-{TARGET}%2Fd8-asan-win64-{TARGET}-v8-component-@.zip?alt=media"
+        D8_LINK = f"{bucket_url}/win64-{TARGET}%2Fd8-asan-win64-{TARGET}-v8-component-@.zip?alt=media"
     else:
         red("[-] Unsupported OS for v8 download. Exiting...")
         sys.exit(1)
 
-    ## Enter BAD BISECT
-    while True:
-        choice = yellow_input("Input Commit Hash on which PoC Crashes (BAD_COMMIT): ")
-        print()
-        choice = choice[:11]
-        if is_commit_in_log(choice,V8_PATH):
-            BAD_COMMIT = choice
-            break
-        
-        red("[-] Invalid Commit Hash. Please try again.")
+    load_build_index(OS, TARGET)
 
-    while True:
-        choice = yellow_input("Input custom arguments for d8 (space seperated like: \"--allow-natives-syntax --future\"): ")
+def validate_bad_commit(custom_args):
+    if VERDICTS.get(BAD_COMMIT) == "bad":
+        green(f"[+] BAD_COMMIT {BAD_COMMIT} was validated earlier in this session.")
+        return
 
-        if validate_flags(choice) != "":
-            custom_args = choice
-            break
-        
-        red("[-] Invalid Arguments. Please try again.")
-        print()
-    
     # Check if BAD_COMMIT is Valid
     yellow(f"[*] Trying to reproduce crash on {BAD_COMMIT} with {custom_args} flags...")
     start1 = time()
-    download_and_extract_d8(BAD_COMMIT)
-    ret = run_d8_with_args(custom_args)
+    ret, runtime = get_known_outcome_and_runtime(BAD_COMMIT)
+    if ret is None:
+        build_dir = download_and_extract_d8(BAD_COMMIT)
+        if build_dir is None:
+            red("[-] No prebuilt d8 for BAD_COMMIT. Please pick a nearby commit which has a build.")
+            sys.exit(1)
+        ret, runtime = run_d8_with_args_and_runtime(custom_args, build_dir)
     end1 = time()
     green(f"[+] BAD_COMMIT Validation executed in {end1 - start1:.4f} seconds")
     TIME_ARRAY.append(end1-start1)
     # print(ret)
 
-    if ret in [0,1]:
+    if ret != CRASH:
         red("[-] d8 ran with some error other than a Crash. Please check the Testcase (were flags put correctly?)")   
         sys.exit(1)
     else:
         green(f"[+] BAD_COMMIT Validated! Setting {BAD_COMMIT} as BAD_COMMIT.")
+        if runtime is not None:
+            calibrate_timeout(runtime)
+        record_verdict(BAD_COMMIT, "bad")
+        checkpoint()
 
-    ## Enter GOOD BISECT
-    print()
-    while True:
-        choice = yellow_input("Input Commit Hash on which PoC Doesn't Crash (If you don't know just put \"None\"): ")
-        print()
-
-        choice = choice[:11]
-
-        if choice.lower() == "none":
-            # Speculate
-            yellow(f"[*] Speculating GOOD_COMMIT by moving {DISTANCE} spaces behind...")   
-            GOOD_COMMIT = get_commit(BAD_COMMIT,DISTANCE,V8_PATH)
-            speculate = 1
-            break
-        elif is_commit_in_log(choice,V8_PATH):
-            GOOD_COMMIT = choice
-            break
-        
-        red("[-] Invalid Commit Hash or Keyword. Please try again.")
-
+def check_window():
     dist = get_distance(GOOD_COMMIT,BAD_COMMIT,V8_PATH)
     if dist == 0:
         red("[-] Bad commit is behind Good commit, this either happens if the bug is patched in the Good commit or you put the data in reverse.")
         red("[-] Either way, continuing will not give you the correct bisect. Hence bailing... Please check the data and try again.")
         sys.exit(1)
+    return dist
+
+def validate_good_commit(custom_args):
+    if VERDICTS.get(GOOD_COMMIT) == "good":
+        green(f"[+] GOOD_COMMIT {GOOD_COMMIT} was validated earlier in this session.")
+        return
 
     # Check if GOOD_COMMIT is Valid
-    while True:
-        yellow(f"[*] Trying to reproduce crash on {GOOD_COMMIT} ...")
+    yellow(f"[*] Trying to reproduce crash on {GOOD_COMMIT} ...")
 
-        start2 = time()
-        download_and_extract_d8(GOOD_COMMIT)
-        ret = run_d8_with_args(custom_args)
-        end2 = time()
+    start2 = time()
+    ret = get_known_outcome(GOOD_COMMIT)
+    if ret is None:
+        build_dir = download_and_extract_d8(GOOD_COMMIT)
+        if build_dir is None:
+            red("[-] No prebuilt d8 for GOOD_COMMIT. Please pick a nearby commit which has a build.")
+            sys.exit(1)
+        ret = run_d8_with_args(custom_args, build_dir)
+    end2 = time()
 
-        green(f"[+] GOOD_COMMIT Validation executed in {end2 - start2:.4f} seconds")
-        TIME_ARRAY.append(end2-start2)
+    green(f"[+] GOOD_COMMIT Validation executed in {end2 - start2:.4f} seconds")
+    TIME_ARRAY.append(end2-start2)
+
+    if get_verdict(ret) != "good":
+        red("[-] d8 did not run cleanly (Crash, timeout or OOM). Please check the Testcase (were flags put correctly?)")   
+        sys.exit(1)
+    else:
+        green(f"[+] GOOD_COMMIT Validated! Setting {GOOD_COMMIT} as GOOD_COMMIT.")
+        record_verdict(GOOD_COMMIT, "good")
+        checkpoint()
+
+def bisect_window(custom_args, stop_at=1):
+    global BAD_COMMIT, GOOD_COMMIT, TIME
+    dist = check_window()
 
-        if speculate:
-            if ret not in [0,1]:
-                # Speculate Again
-                red(f"[-] d8 ran with a Crash. Speculating GOOD_COMMIT again by moving {DISTANCE} spaces")   
-                GOOD_COMMIT = get_commit(GOOD_COMMIT,DISTANCE,V8_PATH)
-            else:
-                green(f"[+] GOOD_COMMIT Found! Setting {GOOD_COMMIT} as GOOD_COMMIT.")
-                break
-        else:
-            if ret not in [0,1]:
-                red("[-] d8 ran with a Crash. Please check the Testcase (were flags put correctly?)")   
-                sys.exit(1)
-            else:
-                green(f"[+] GOOD_COMMIT Validated! Setting {GOOD_COMMIT} as GOOD_COMMIT.")
-                break
-    
     TIME = sum(TIME_ARRAY) / len(TIME_ARRAY)
     onetime = TIME
 
@@ -286,15 +857,23 @@ def find_bisect(v8_path,db_path,OS): # Method 1 :TODO
     yellow("[*] Starting Bisect Process...")
     print()
 
-    # Number of Passes
-    count = int(math.log2(dist)) + 1
+    # Number of Passes (each round shrinks the window by a factor of PARALLEL+1)
+    candidates = dist
+    if PRUNE and dist <= PRUNE_SCAN:
+        candidates = max(dist - len(get_pruned_commits(BAD_COMMIT, dist)), 1)
+        green(f"[+] {dist - candidates} of {dist} commits in the window touch no runtime sources, bisecting the other {candidates}.")
+    count = int(math.log(candidates, PARALLEL + 1)) + 1
+    unit = "passes" if PARALLEL == 1 else "rounds"
     TIME = TIME * count
 
+    # Set when no prebuilt d8 is left inside the window
+    unresolved = False
+
     # Start bisect
     while True:
         d = get_distance(GOOD_COMMIT,BAD_COMMIT,V8_PATH)
 
-        if d <= 1:
+        if d <= stop_at:
             break
 
         eta_minutes = int(TIME // 60)
@@ -302,14 +881,27 @@ def find_bisect(v8_path,db_path,OS): # Method 1 :TODO
         print()
         magenta("==================================================")
         magenta("|                                                |")
-        magenta(f"|     ETA: {eta_minutes} min {eta_seconds} sec (approx {count} passes)       |")
+        magenta(f"|     ETA: {eta_minutes} min {eta_seconds} sec (approx {count} {unit})       |")
         magenta("|                                                |")
         magenta("==================================================")
         print()
 
+        if PARALLEL > 1:
+            if not run_parallel_round(d, custom_args):
+                unresolved = has_runtime_commits(d)
+                break
+            TIME = max(TIME - onetime, 0)
+            count = max(count - 1, 1)
+            continue
+
+        window = d
         d = int(d/2)
 
-        commit_center = get_commit(BAD_COMMIT,d,V8_PATH)
+        d, commit_center = find_available_commit(BAD_COMMIT, d, 0, window)
+        if commit_center is None:
+            # Only pruned commits left means the bisect is done, anything else had no build
+            unresolved = has_runtime_commits(window)
+            break
 
         if commit_center == BAD_COMMIT or commit_center == GOOD_COMMIT:
             yellow("[*] Commit center has converged with BAD or GOOD — bisect complete.")
@@ -317,23 +909,218 @@ def find_bisect(v8_path,db_path,OS): # Method 1 :TODO
 
         yellow(f"[*] Trying to reproduce crash on {commit_center} [{d} away from {BAD_COMMIT}]...")
 
-        download_and_extract_d8(commit_center)
-        ret = run_d8_with_args(custom_args)
+        next_bad, next_good = None, None
+        ret = get_known_outcome(commit_center)
+        if ret is None:
+            build_dir = fetch_build(commit_center)
+            if build_dir is None:
+                # Missing build is remembered, pick another midpoint
+                continue
+
+            # Download both possible next midpoints while d8 runs on this one
+            next_bad, next_good = get_next_midpoints(commit_center, window, d)
+            prefetch_build(next_bad)
+            prefetch_build(next_good)
 
-        if ret not in [0,1]:
+            ret = run_d8_with_args(custom_args, build_dir)
+        verdict = get_verdict(ret)
+        record_verdict(commit_center, verdict)
+
+        if verdict == "skip":
+            yellow(f"[*] Skipping {commit_center}, a neighbouring revision will be tested instead.")
+            checkpoint()
+            continue
+        elif verdict == "bad":
             light_red(f"[-] d8 ran with a Crash. Setting BAD_COMMIT to {commit_center}")   
             BAD_COMMIT = commit_center
+            if next_good != next_bad:
+                cancel_prefetch(next_good)
         else:
             green(f"[+] d8 ran without a Crash. Setting GOOD_COMMIT to {commit_center}.")
             GOOD_COMMIT = commit_center
+            if next_bad != next_good:
+                cancel_prefetch(next_bad)
 
+        checkpoint()
         TIME = TIME - onetime
         count-=1
-        
+
+    for commit_hash in list(PREFETCH):
+        cancel_prefetch(commit_hash)
+
+    return unresolved
+
+def get_crash_output():
+    # Crash output of BAD_COMMIT (or a later crash of the same PoC) to derive the priors from
+    for path in [CRASH_LOG, os.path.join(os.path.dirname(CRASH_LOG), f"crash-{BAD_COMMIT}.log")]:
+        if os.path.isfile(path):
+            with open(path, "r", errors="replace") as f:
+                return f.read()
+    return None
+
+def get_commit_priors(commits):
+    crash_output = get_crash_output()
+    files, functions = bayes.parse_crash_frames(crash_output) if crash_output else ({}, {})
+    if files or functions:
+        green(f"[+] Crash stack: {len(files)} source files, {len(functions)} functions. Weighting commits which touch them.")
+    else:
+        yellow("[*] No crash stack found in the crash log, every candidate gets the same prior.")
+
+    weights = []
+    for commit_hash in commits:
+        if PRUNE and not is_runtime_commit(commit_hash):
+            weights.append(0.0)
+            continue
+        diff_content = get_commit_diff(commit_hash, DB_PATH)
+        paths = get_touched_paths(commit_hash, DB_PATH, diff_content) or set()
+        weights.append(bayes.score_commit(paths, diff_content, files, functions))
+    return bayes.normalize(weights)
+
+def get_posterior(prior, offsets):
+    # The posterior is a function of the prior and the verdicts, so a resumed session rebuilds it from VERDICTS
+    posterior = prior
+    for commit_hash, verdict in VERDICTS.items():
+        t = offsets.get(commit_hash)
+        if t is None or verdict == "skip" or t >= len(prior):
+            continue
+        posterior = bayes.update_posterior(posterior, t, verdict == "bad")
+    return posterior
+
+def bayes_bisect_window(custom_args):
+    global BAD_COMMIT, GOOD_COMMIT, POSTERIOR, PROBABLE_COMMIT
+    dist = check_window()
+
+    if dist > BAYES_SCAN:
+        yellow(f"[*] Window of {dist} commits is too large for Bayesian passes, narrowing it to {BAYES_SCAN} with binary passes first.")
+        if bisect_window(custom_args, stop_at=BAYES_SCAN):
+            return True
+        dist = get_distance(GOOD_COMMIT,BAD_COMMIT,V8_PATH)
+        if dist <= 1:
+            return False
+
+    # Candidates are the commits 0..dist-1 behind BAD_COMMIT, the culprit is the oldest one which crashes
+    anchor = BAD_COMMIT
+    commits = [get_commit(anchor, offset, V8_PATH) for offset in range(dist)]
+    offsets = {commit_hash: offset for offset, commit_hash in enumerate(commits)}
+    prior = get_commit_priors(commits)
+
+    print()
+    yellow(f"[*] Starting Bayesian Bisect Process over {dist} commits...")
+    print()
+
+    passes = 0
+    while True:
+        posterior = get_posterior(prior, offsets)
+        tested = {offsets[ch]: verdict for ch, verdict in VERDICTS.items() if ch in offsets}
+        testable = [o for o in range(1, dist) if o not in tested and is_commit_buildable(commits[o])]
+        culprit, good, bracketed = bayes.bracket(posterior, tested, testable)
+
+        magenta(f"[*] Most likely culprit: {commits[culprit]} ({posterior[culprit]:.1%}), {len(testable)} untested candidates, {bayes.entropy(posterior):.2f} bits of uncertainty left")
+        if bracketed:
+            break
+
+        points = bayes.next_test_points(posterior, culprit, good, testable, PARALLEL)
+        if not points:
+            break
+
+        passes += 1
+        yellow(f"[*] Pass {passes}: testing {', '.join(commits[t] for t in points)} (crash probability {', '.join(f'{sum(posterior[t:]):.0%}' for t in points)})")
+
+        if len(points) == 1:
+            t = points[0]
+            ret = get_known_outcome(commits[t])
+            if ret is None:
+                build_dir = fetch_build(commits[t])
+                if build_dir is None:
+                    continue
+
+                # The next test point of both outcomes is downloaded while d8 runs on this one
+                for bad in [True, False]:
+                    next_t, _ = bayes.best_test_point(bayes.update_posterior(posterior, t, bad), [o for o in testable if o != t])
+                    if next_t is not None:
+                        prefetch_build(commits[next_t])
+
+                ret = run_d8_with_args(custom_args, build_dir)
+            results = {commits[t]: ret}
+        else:
+            with ThreadPoolExecutor(max_workers=len(points)) as executor:
+                futures = {commits[t]: executor.submit(_test_commit, commits[t], custom_args) for t in points}
+                results = {ch: futures[ch].result() for ch in futures}
+
+        for commit_hash, ret in results.items():
+            if ret is None:
+                continue
+            verdict = get_verdict(ret)
+            record_verdict(commit_hash, verdict)
+            if verdict == "bad":
+                light_red(f"[-] {commit_hash} [{offsets[commit_hash]} away from {anchor}] ran with a Crash.")
+            elif verdict == "good":
+                green(f"[+] {commit_hash} [{offsets[commit_hash]} away from {anchor}] ran without a Crash.")
+            else:
+                yellow(f"[*] {commit_hash} [{offsets[commit_hash]} away from {anchor}] skipped (timeout/OOM).")
+        checkpoint()
+
+    for commit_hash in list(PREFETCH):
+        cancel_prefetch(commit_hash)
+
+    GOOD_COMMIT = commits[good] if good < dist else GOOD_COMMIT
+    POSTERIOR = posterior[culprit]
+    if not bracketed:
+        # Nothing testable is left to confirm the most likely culprit, the range from the first BAD build behind it stays unresolved
+        PROBABLE_COMMIT = commits[culprit]
+        BAD_COMMIT = commits[max([o for o, verdict in tested.items() if verdict == "bad" and o <= culprit], default=0)]
+        checkpoint()
+        return True
+
+    BAD_COMMIT = commits[culprit]
+    checkpoint()
+
+    # Candidates between the culprit and the clean commit behind it which could not be tested
+    return any(prior[o] > 0 and o not in testable and tested.get(o) not in ["good", "bad"] for o in range(culprit + 1, good))
+
+def print_trial_report():
+    cyan(f"[*] Crash rates over {TRIALS} trials per revision:")
+    for key in sorted(REPORT):
+        crashes, finished = REPORT[key]
+        rate = crashes / finished if finished else 0
+        cyan(f"      {key:<32} {crashes}/{finished} crashed ({rate:.0%})")
+
+def report_bisect(unresolved):
+    result = {"bad_commit": BAD_COMMIT, "good_commit": GOOD_COMMIT, "unresolved": unresolved}
+    if TRIALS > 1:
+        result["crash_rates"] = {key: round(c / n, 3) if n else 0 for key, (c, n) in REPORT.items()}
+
+    if unresolved:
+        good_rev, _ = get_cr_commit_position_and_date(GOOD_COMMIT,DB_PATH)
+        bad_rev, _ = get_cr_commit_position_and_date(BAD_COMMIT,DB_PATH)
+        result["unresolved_commits"] = get_distance(GOOD_COMMIT,BAD_COMMIT,V8_PATH)
+        print()
+        red(f"[-] No prebuilt d8 left between GOOD_COMMIT and BAD_COMMIT, the bisect cannot be narrowed further.")
+        red(f"[-] Unresolved range: {GOOD_COMMIT}..{BAD_COMMIT} (Revisions {good_rev}..{bad_rev}, {result['unresolved_commits']} commits)")
+        red(f"[-] The bug was introduced by one of these commits. The first BAD build is reported below.")
+
+    window = get_distance(GOOD_COMMIT,BAD_COMMIT,V8_PATH)
+    pruned = get_pruned_commits(BAD_COMMIT, window) if window > 1 else []
+    if pruned:
+        result["pruned_commits"] = pruned
+        print()
+        yellow(f"[*] {len(pruned)} commits between GOOD_COMMIT and BAD_COMMIT were not tested, they touch no runtime sources ({', '.join(RUNTIME_PATHS)}):")
+        for commit_hash in pruned:
+            yellow(f"      {commit_hash}")
+
+    if PROBABLE_COMMIT is not None:
+        result["probable_commit"] = PROBABLE_COMMIT
+        result["posterior"] = round(POSTERIOR, 4)
+        yellow(f"[*] Most likely culprit: {PROBABLE_COMMIT} ({POSTERIOR:.1%}), not confirmed by a crash with a clean commit right behind it")
+    elif POSTERIOR is not None:
+        result["posterior"] = round(POSTERIOR, 4)
+        cyan(f"[*] Posterior probability of {BAD_COMMIT} being the culprit: {POSTERIOR:.1%}")
 
     url = f"https://chromium.googlesource.com/v8/v8/+/{BAD_COMMIT}"
     link = f"\033]8;;{url}\a{BAD_COMMIT}\033]8;;\a"
-    rev, date_str = get_cr_commit_position_and_date(BAD_COMMIT,db_path)
+    rev, date_str = get_cr_commit_position_and_date(BAD_COMMIT,DB_PATH)
+    result["revision"] = rev
+    result["date"] = date_str
     print()
     green("=======================================================================================")
     green("|                                                                                     |")
@@ -341,5 +1128,233 @@ def find_bisect(v8_path,db_path,OS): # Method 1 :TODO
     green("|                                                                                     |")
     green("=======================================================================================")
     print()
+    if TRIALS > 1:
+        print_trial_report()
+    print_cache_stats()
+    print_download_stats()
+    print_verdict_stats()
+    if LOCAL_BUILD:
+        print_local_build_stats()
+    print()
+    checkpoint(finished=True, result=result)
+    return result
+
+def continue_bisect(custom_args):
+    # Every stage skips the work a restored checkpoint already covers
+    global GOOD_COMMIT
+    try:
+        validate_bad_commit(custom_args)
+
+        if GOOD_COMMIT is None:
+            if GOOD_INPUT is None:
+                gallop_good_commit(custom_args)
+            else:
+                GOOD_COMMIT = GOOD_INPUT
+                check_window()
+                validate_good_commit(custom_args)
+
+        if STRATEGY == "bayes":
+            unresolved = bayes_bisect_window(custom_args)
+        else:
+            unresolved = bisect_window(custom_args)
+        return report_bisect(unresolved)
+    finally:
+        if LOCAL_BUILD:
+            # Local builds detach HEAD, the next launch indexes and syncs from the user's branch again
+            restore_checkout(V8_PATH)
+
+def run_bisect(v8_path, db_path, os_name, poc_path, target, bad_commit, custom_args, good_commit=None, parallel=1, trials=1, local=False, prune=True, strategy="binary"):
+    # Non-interactive bisect, used by the batch runner
+    global BAD_COMMIT, CUSTOM_ARGS, GOOD_INPUT
+    setup_bisect(v8_path, db_path, os_name, poc_path, target, parallel, trials, local=local, prune=prune, strategy=strategy)
+
+    BAD_COMMIT = bad_commit
+    CUSTOM_ARGS = custom_args
+    GOOD_INPUT = good_commit
+    checkpoint()
+    return continue_bisect(custom_args)
+
+def restore_session(state, v8_path, db_path, os_name):
+    global BAD_COMMIT, GOOD_COMMIT, TIME_ARRAY, REPORT, VERDICTS, CUSTOM_ARGS, GOOD_INPUT
+    setup_bisect(v8_path, db_path, os_name, state["poc"], state["target"], state["parallel"], state["trials"], state["session"], state.get("local", False), state.get("prune", True), state.get("strategy", "binary"))
+
+    BAD_COMMIT = state["bad_commit"]
+    GOOD_COMMIT = state["good_commit"]
+    CUSTOM_ARGS = state["flags"]
+    GOOD_INPUT = state["good_input"]
+    VERDICTS = dict(state["verdicts"])
+    SKIPPED.update(state["skipped"])
+    REPORT = {key: list(value) for key, value in state["report"].items()}
+    TIME_ARRAY = list(state["time_array"])
+    sandbox.RUN_TIMEOUT = state["run_timeout"]
+
+def resume_bisect(v8_path, db_path, os_name):
+    state = choose_session()
+    if state is None:
+        return
+
+    if state["os"] != os_name:
+        red(f"[-] Session {state['session']} was started for {state['os']}, this machine is {os_name}.")
+        return
+    if not os.path.exists(state["poc"]):
+        red(f"[-] PoC {state['poc']} of session {state['session']} does not exist anymore.")
+        return
+    if get_file_hash(state["poc"]) != state["poc_sha256"]:
+        # The recorded verdicts belong to the old PoC
+        red(f"[-] PoC {state['poc']} changed since session {state['session']} was checkpointed. Start a new bisect instead.")
+        return
+
+    restore_session(state, v8_path, db_path, os_name)
+    green(f"[+] Resuming session {SESSION_ID}: GOOD_COMMIT {GOOD_COMMIT} .. BAD_COMMIT {BAD_COMMIT}, {len(VERDICTS)} revisions already tested.")
+
+    try:
+        continue_bisect(CUSTOM_ARGS)
+    except KeyboardInterrupt:
+        print()
+        yellow(f"[*] Interrupted. Session {SESSION_ID} is checkpointed, resume it from the menu.")
+
+def find_bisect(v8_path,db_path,os_name): # Method 1 :TODO
+    global BAD_COMMIT, GOOD_COMMIT, PARALLEL, TRIALS, CUSTOM_ARGS, GOOD_INPUT
+    custom_args = None
+
+    while True:
+        poc_path = yellow_input(f"Enter the path for Crash PoC: ").strip()
+        if not os.path.exists(poc_path):
+            red("[-] Path does not exist. Try again.")
+        else:
+            break
+        print()
+
+    while True:
+        choice = yellow_input("Input Target (debug/release): ")
+
+        if (choice.lower() == "debug") or (choice.lower() == "release"):
+            target = choice
+            break
+        
+        red("[-] Invalid Target. Please try again.")
+        print()
+
+    while True:
+        choice = yellow_input("Build revisions locally instead of downloading prebuilt d8? (y/N): ").strip().lower()
+
+        if choice in ["", "n", "no"]:
+            local = False
+            break
+        if choice in ["y", "yes"]:
+            local = True
+            break
+
+        red("[-] Invalid choice. Please try again.")
+        print()
+
+    while True:
+        choice = yellow_input("Skip commits which only touch tests, docs, infra or build files? (Y/n): ").strip().lower()
+
+        if choice in ["", "y", "yes"]:
+            prune = True
+            break
+        if choice in ["n", "no"]:
+            prune = False
+            break
+
+        red("[-] Invalid choice. Please try again.")
+        print()
+
+    while True:
+        choice = yellow_input("Bisect strategy, binary midpoints or crash stack weighted Bayesian (binary/bayes): ").strip().lower()
+
+        if choice in ["", "binary"]:
+            strategy = "binary"
+            break
+        if choice == "bayes":
+            strategy = "bayes"
+            break
+
+        red("[-] Invalid strategy. Please try again.")
+        print()
+
+    setup_bisect(v8_path, db_path, os_name, poc_path, target, local=local, prune=prune, strategy=strategy)
+    green(f"[+] Session {SESSION_ID} is checkpointed after every verdict, resume it from the menu if interrupted.")
+
+    ## Enter BAD BISECT
+    while True:
+        choice = yellow_input("Input Commit Hash on which PoC Crashes (BAD_COMMIT): ")
+        print()
+        choice = choice[:11]
+        if is_commit_in_log(choice,V8_PATH):
+            BAD_COMMIT = choice
+            break
+        
+        red("[-] Invalid Commit Hash. Please try again.")
+
+    while True:
+        choice = yellow_input("Input custom arguments for d8 (space seperated like: \"--allow-natives-syntax --future\"): ")
+
+        if validate_flags(choice) != "":
+            custom_args = choice
+            CUSTOM_ARGS = custom_args
+            break
+        
+        red("[-] Invalid Arguments. Please try again.")
+        print()
+
+    # Local builds share one checkout, they are always bisected one revision at a time
+    while not LOCAL_BUILD:
+        choice = yellow_input(f"Input number of revisions to test in parallel per round (1 for binary bisect, {os.cpu_count()} cores available): ").strip()
+
+        if choice == "":
+            PARALLEL = 1
+            break
+        if choice.isdigit() and 1 <= int(choice) <= MAX_PARALLEL:
+            PARALLEL = int(choice)
+            break
+
+        red("[-] Invalid number of revisions. Please try again.")
+        print()
+
+    while True:
+        choice = yellow_input("Input number of trials per revision to classify flaky crashes (1 to trust a single run): ").strip()
+
+        if choice == "":
+            TRIALS = 1
+            break
+        if choice.isdigit() and 1 <= int(choice) <= MAX_TRIALS:
+            TRIALS = int(choice)
+            break
+
+        red("[-] Invalid number of trials. Please try again.")
+        print()
+
+    try:
+        checkpoint()
+        validate_bad_commit(custom_args)
+    except KeyboardInterrupt:
+        print()
+        yellow(f"[*] Interrupted. Session {SESSION_ID} is checkpointed, resume it from the menu.")
+        return
+
+    ## Enter GOOD BISECT
+    print()
+    while True:
+        choice = yellow_input("Input Commit Hash on which PoC Doesn't Crash (If you don't know just put \"None\"): ")
+        print()
 
+        choice = choice[:11]
+
+        if choice.lower() == "none":
+            # Speculate (the galloping search validates GOOD_COMMIT itself)
+            GOOD_INPUT = None
+            break
+        elif is_commit_in_log(choice,V8_PATH):
+            GOOD_INPUT = choice
+            break
+        
+        red("[-] Invalid Commit Hash or Keyword. Please try again.")
 
+    try:
+        checkpoint()
+        continue_bisect(custom_args)
+    except KeyboardInterrupt:
+        print()
+        yellow(f"[*] Interrupted. Session {SESSION_ID} is checkpointed, resume it from the menu.")
@@ -0,0 +1,108 @@
+import os, re, json
+from time import time
+
+from utils.colors import *
+from utils.download import get_session, TIMEOUT
+import requests
+
+# Variable to hold the bucket listing endpoint (VISECT_LISTING_URL in .env overrides it, e.g. for a local mirror)
+LISTING_URL = "https://www.googleapis.com/storage/v1/b/v8-asan/o"
+# Variable to hold the directory the availability indexes are stored in
+BUILDS_DIR = "testarea/builds"
+# Variable to hold how long a stored availability index is trusted before it is refreshed (Default: 12 hours)
+BUILDS_TTL = 12 * 60 * 60
+# Variable to hold the revisions which have a prebuilt d8 (None if the bucket listing is unavailable)
+AVAILABLE = None
+# Variable to hold the newest revision covered by AVAILABLE (newer ones are not known to be missing yet)
+LATEST = None
+# Variable to hold revisions that were requested in this session but have no build
+MISSING = set()
+
+def get_build_prefix(os_name, target):
+    if os_name == "x64":
+        return f"linux-{target}/d8-linux-{target}-v8-component-"
+    elif os_name == "w64":
+        return f"win64-{target}/d8-asan-win64-{target}-v8-component-"
+    return None
+
+def _index_path(os_name, target):
+    return os.path.join(BUILDS_DIR, f"{os_name}-{target.lower()}.json")
+
+def _list_bucket(prefix):
+    listing_url = os.getenv("VISECT_LISTING_URL", LISTING_URL)
+    revisions = set()
+    page_token = None
+
+    while True:
+        params = {"prefix": prefix, "fields": "items(name),nextPageToken", "maxResults": 1000}
+        if page_token:
+            params["pageToken"] = page_token
+
+        r = get_session().get(listing_url, params=params, timeout=TIMEOUT)
+        r.raise_for_status()
+        data = r.json()
+
+        for item in data.get("items", []):
+            match = re.search(r"-(\d+)\.zip$", item.get("name", ""))
+            if match:
+                revisions.add(int(match.group(1)))
+
+        page_token = data.get("nextPageToken")
+        if not page_token:
+            return revisions
+
+def _set_available(revisions):
+    global AVAILABLE, LATEST
+    AVAILABLE = revisions
+    LATEST = max(revisions) if revisions else None
+
+def load_build_index(os_name, target, force=False):
+    index_path = _index_path(os_name, target)
+
+    stored = None
+    try:
+        with open(index_path, "r") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    if stored and not force and time() - stored["updated"] < BUILDS_TTL:
+        _set_available(set(stored["revisions"]))
+        green(f"[+] Build index loaded: {len(AVAILABLE)} prebuilt d8 revisions for {os_name}-{target}")
+        return True
+
+    yellow(f"[*] Refreshing build index for {os_name}-{target} from bucket listing...")
+    try:
+        revisions = _list_bucket(get_build_prefix(os_name, target))
+    except (requests.RequestException, ValueError) as e:
+        if stored:
+            _set_available(set(stored["revisions"]))
+            red(f"[-] Could not refresh build index ({e}). Using stored index.")
+            return True
+        _set_available(None)
+        red(f"[-] Could not list available builds ({e}). Every revision will be tried.")
+        return False
+
+    os.makedirs(BUILDS_DIR, exist_ok=True)
+    with open(index_path, "w") as f:
+        json.dump({"updated": time(), "revisions": sorted(revisions)}, f)
+
+    _set_available(revisions)
+    MISSING.clear()
+    green(f"[+] Build index refreshed: {len(AVAILABLE)} prebuilt d8 revisions for {os_name}-{target}")
+    return True
+
+def is_build_available(revision):
+    if revision in MISSING:
+        return False
+    if AVAILABLE is None or LATEST is None or revision > LATEST:
+        return True
+    return revision in AVAILABLE
+
+def mark_build_missing(revision):
+    MISSING.add(revision)
+
+def use_local_builds():
+    # Every revision can be built locally, only the ones that failed to build are excluded
+    _set_available(None)
+    MISSING.clear()
@@ -0,0 +1,182 @@
+import os, json, shutil
+import threading
+import fcntl
+from contextlib import contextmanager
+from time import time
+
+from utils.colors import *
+
+# Variable to hold the root directory of the per-revision d8 build cache
+CACHE_DIR = "testarea/cache"
+# Variable to hold the index file which tracks size and last use of every cached build
+CACHE_INDEX = os.path.join(CACHE_DIR, "index.json")
+# Variable to hold the maximum size of the build cache in bytes (Default: 20 GB)
+CACHE_LIMIT = 20 * 1024 * 1024 * 1024
+# Variable to hold the tmpfs directory used for the cache when VISECT_SHM is set in .env
+SHM_CACHE_DIR = "/dev/shm/visect-cache"
+# Variable to hold the cache statistics of the current session
+CACHE_STATS = {"hits": 0, "misses": 0, "evictions": 0}
+
+# Lock guarding the cache index (builds can be stored from more than one thread)
+_LOCK = threading.Lock()
+
+@contextmanager
+def _file_lock(path):
+    # flock() also serializes the batch runner's worker processes sharing this cache
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(path, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+@contextmanager
+def _index_lock():
+    with _LOCK, _file_lock(os.path.join(CACHE_DIR, "index.lock")):
+        yield
+
+@contextmanager
+def build_lock(key):
+    # Held while a build is fetched, so concurrent bisects wait for one download instead of racing
+    with _file_lock(os.path.join(CACHE_DIR, f"{key}.lock")):
+        yield
+
+@contextmanager
+def build_in_use(key):
+    # Shared lock held while d8 runs from a cached build, eviction leaves the build alone meanwhile
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(os.path.join(CACHE_DIR, f"{key}.use"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _is_in_use(key):
+    # Any holder of build_in_use(key), in this process or another one, makes the exclusive try fail
+    path = os.path.join(CACHE_DIR, f"{key}.use")
+    if not os.path.isfile(path):
+        return False
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        fcntl.flock(f, fcntl.LOCK_UN)
+    return False
+
+def use_shm_cache():
+    global CACHE_DIR, CACHE_INDEX, CACHE_LIMIT
+    # Keep builds in memory so that extraction and d8 startup never touch the disk
+    if os.path.isdir("/dev/shm") and CACHE_DIR != SHM_CACHE_DIR:
+        CACHE_DIR = SHM_CACHE_DIR
+        CACHE_INDEX = os.path.join(CACHE_DIR, "index.json")
+        CACHE_LIMIT = min(CACHE_LIMIT, shutil.disk_usage("/dev/shm").total // 2)
+        green(f"[+] Build cache moved to {CACHE_DIR}")
+
+def build_key(os_name, target, revision):
+    # Every build is addressed by the (OS, TARGET, revision) triple it was built from
+    return f"{os_name}-{target.lower()}-{revision}"
+
+def get_build_path(key):
+    return os.path.join(CACHE_DIR, key)
+
+def get_staging_path(key):
+    # Staging lives inside the cache root so that store_build() is a plain rename
+    return os.path.join(CACHE_DIR, f"{key}.tmp")
+
+def _load_index():
+    try:
+        with open(CACHE_INDEX, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _save_index(index):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = CACHE_INDEX + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, CACHE_INDEX)
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def get_cached_build(key):
+    with _index_lock():
+        index = _load_index()
+        path = get_build_path(key)
+
+        if key not in index or not os.path.isdir(path):
+            # Drop entries whose directory vanished from under us
+            if key in index:
+                del index[key]
+                _save_index(index)
+            CACHE_STATS["misses"] += 1
+            return None
+
+        index[key]["last_used"] = time()
+        _save_index(index)
+        CACHE_STATS["hits"] += 1
+        return path
+
+def store_build(key, src_dir):
+    with _index_lock():
+        index = _load_index()
+        path = get_build_path(key)
+
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        shutil.move(src_dir, path)
+
+        index[key] = {"size": _dir_size(path), "last_used": time()}
+        _evict(index, keep=key)
+        _save_index(index)
+        return path
+
+def get_build_sanity(key, flags):
+    # Dry-run verdict of test.js on this build with these flags (None if never checked)
+    with _index_lock():
+        entry = _load_index().get(key)
+    if entry is None:
+        return None
+    return entry.get("sanity", {}).get(" ".join(flags.split()))
+
+def set_build_sanity(key, flags, ok):
+    with _index_lock():
+        index = _load_index()
+        if key in index:
+            index[key].setdefault("sanity", {})[" ".join(flags.split())] = ok
+            _save_index(index)
+
+def _evict(index, keep=None):
+    # Evict least recently used builds until the cache fits in CACHE_LIMIT, builds d8 is running from are kept
+    total = sum(entry["size"] for entry in index.values())
+    for key in sorted(index, key=lambda k: index[k]["last_used"]):
+        if total <= CACHE_LIMIT:
+            break
+        if key == keep or _is_in_use(key):
+            continue
+        shutil.rmtree(get_build_path(key), ignore_errors=True)
+        total -= index[key]["size"]
+        del index[key]
+        CACHE_STATS["evictions"] += 1
+
+def print_cache_stats():
+    with _index_lock():
+        index = _load_index()
+    size_mb = sum(entry["size"] for entry in index.values()) / (1024 * 1024)
+    limit_mb = CACHE_LIMIT / (1024 * 1024)
+    total = CACHE_STATS["hits"] + CACHE_STATS["misses"]
+    ratio = (CACHE_STATS["hits"] / total * 100) if total else 0
+    cyan(f"[*] Build Cache: {CACHE_STATS['hits']} hits, {CACHE_STATS['misses']} misses ({ratio:.1f}% hit rate), "
+         f"{CACHE_STATS['evictions']} evictions, {len(index)} builds using {size_mb:.1f}/{limit_mb:.0f} MB")
@@ -1,6 +1,10 @@
 import os
 import sys
+import json
+import fcntl
+import shutil
 import subprocess
+from time import time
 
 from base.util import get_gn_args
 from utils.colors import *
@@ -11,6 +15,14 @@ from utils.system import is_internet_working
 OS = None
 V8_PATH = None
 IS_DEBUG = None
+# Variable to hold the out/ directory bisect builds go to, kept warm across bisect steps ({target} = debug/release)
+LOCAL_OUT_DIR = "out/visect.{target}"
+# Variable to hold the state of the local bisect builds (DEPS blob last synced, build time per commit)
+LOCAL_STATE_FILE = "testarea/local_builds.json"
+# Variable to hold the directory with the per-commit logs of local bisect builds
+LOCAL_LOG_DIR = "testarea/local"
+# Variable to hold the build time of every commit built locally in this session (commit hash -> seconds)
+LOCAL_BUILD_TIMES = {}
 
 def run_gclient_sync():
     try:
@@ -199,3 +211,143 @@ def compile_v8(v8_path,os):
 
     green(f"[+] V8 compiled successfully for {OS}.{IS_DEBUG}")
     print()
+
+def _load_local_state():
+    try:
+        with open(LOCAL_STATE_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"deps": None, "builds": {}}
+
+def _save_local_state(state):
+    os.makedirs(os.path.dirname(LOCAL_STATE_FILE), exist_ok=True)
+    with open(LOCAL_STATE_FILE, "w") as f:
+        json.dump(state, f, indent=1)
+
+def get_deps_hash(commit_hash, v8_path):
+    # Blob hash of DEPS at commit_hash, equal hashes mean gclient sync would not change anything
+    result = subprocess.run(
+        ["git", "rev-parse", f"{commit_hash}:DEPS"],
+        cwd=v8_path,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True
+    )
+    return result.stdout.strip() if result.returncode == 0 else None
+
+def _open_checkout_lock():
+    # Bisects running side by side (batch mode) take turns on the one checkout and its state file
+    os.makedirs(LOCAL_LOG_DIR, exist_ok=True)
+    lock = open(os.path.join(LOCAL_LOG_DIR, "checkout.lock"), "w")
+    fcntl.flock(lock, fcntl.LOCK_EX)
+    return lock
+
+def get_synced_deps():
+    with _open_checkout_lock():
+        return _load_local_state().get("deps")
+
+def _get_head_ref(v8_path):
+    # The branch HEAD is on, or the commit of a detached HEAD
+    for cmd in [["git", "symbolic-ref", "--quiet", "--short", "HEAD"], ["git", "rev-parse", "HEAD"]]:
+        result = subprocess.run(cmd, cwd=v8_path, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        if result.returncode == 0:
+            return result.stdout.strip()
+    return None
+
+def restore_checkout(v8_path):
+    # Checks out the ref HEAD was on before the first local build again, so the commit index and the DB sync
+    # see the user's branch and not the last commit bisected. Also undoes what an interrupted bisect left behind.
+    with _open_checkout_lock():
+        state = _load_local_state()
+        origin = state.get("origin")
+        if not origin:
+            return None
+        result = subprocess.run(["git", "checkout", "--quiet", origin], cwd=v8_path, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            red(f"[-] Could not check out {origin} again in {v8_path}: {result.stderr.strip()}")
+            return None
+        del state["origin"]
+        _save_local_state(state)
+    green(f"[+] V8 checkout restored to {origin}.")
+    return origin
+
+def _run_logged(cmd, log):
+    log.write(f"$ {' '.join(cmd)}\n")
+    log.flush()
+    return subprocess.run(cmd, cwd=V8_PATH, stdout=log, stderr=subprocess.STDOUT).returncode == 0
+
+def build_local_d8(v8_path, os_name, target, commit_hash, dest_dir, select_members):
+    # Builds d8 at commit_hash in LOCAL_OUT_DIR and copies the artifacts picked by select_members to dest_dir.
+    # Returns dest_dir (None if the commit does not build)
+    global V8_PATH, OS
+    V8_PATH = v8_path
+    OS = os_name
+
+    out_dir = LOCAL_OUT_DIR.format(target=target.lower())
+    os.makedirs(LOCAL_LOG_DIR, exist_ok=True)
+    log_path = os.path.join(LOCAL_LOG_DIR, f"{commit_hash}.log")
+
+    yellow(f"[*] Building {commit_hash} locally in {out_dir} (log: {log_path})...")
+    start = time()
+
+    with _open_checkout_lock(), open(log_path, "w") as log:
+        # The state is only read and written under the lock, another bisect may have synced other DEPS meanwhile
+        state = _load_local_state()
+        if not state.get("origin"):
+            # Put back by restore_checkout() once the bisect is done
+            state["origin"] = _get_head_ref(V8_PATH)
+            _save_local_state(state)
+
+        if not _run_logged(["git", "checkout", "--quiet", "--detach", commit_hash], log):
+            red(f"[-] Git checkout of {commit_hash} failed. Is the V8 checkout clean?")
+            return None
+
+        # Most neighbouring commits share DEPS, only a DEPS roll needs a (slow) gclient sync
+        deps = get_deps_hash(commit_hash, V8_PATH)
+        if deps is None or deps != state.get("deps"):
+            is_internet_working()
+            yellow("[*] DEPS changed, running 'gclient sync -D'...")
+            if not _run_logged(["gclient", "sync", "-D"], log):
+                red(f"[-] gclient sync failed for {commit_hash}.")
+                return None
+            state["deps"] = deps
+            _save_local_state(state)
+        else:
+            green("[+] DEPS unchanged, skipping gclient sync.")
+
+        # gn gen only once, ninja regenerates the build files itself when BUILD.gn changes
+        if not os.path.isfile(os.path.join(V8_PATH, out_dir, "args.gn")):
+            gn_args = get_gn_args(OS, target.lower() == "debug")
+            if not _run_logged(["gn", "gen", out_dir, f'--args={gn_args.replace(chr(10), " ").strip()}'], log):
+                red(f"[-] GN gen failed for {out_dir}.")
+                return None
+
+        if not _run_logged(["ninja", "-C", out_dir, "d8"], log):
+            red(f"[-] Ninja build of {commit_hash} failed.")
+            return None
+
+        # Copied before the lock is released, the next build checks out and rebuilds out/ in place
+        build_dir = os.path.join(V8_PATH, out_dir)
+        if os.path.isdir(dest_dir):
+            shutil.rmtree(dest_dir)
+        os.makedirs(dest_dir)
+        for name in select_members(os.listdir(build_dir)):
+            src = os.path.join(build_dir, name)
+            if os.path.isfile(src):
+                shutil.copy2(src, os.path.join(dest_dir, name))
+
+        seconds = time() - start
+        LOCAL_BUILD_TIMES[commit_hash] = seconds
+        state.setdefault("builds", {})[f"{target.lower()}:{commit_hash}"] = round(seconds, 2)
+        _save_local_state(state)
+
+    green(f"[+] Built {commit_hash} in {seconds:.1f}s")
+    return dest_dir
+
+def print_local_build_stats():
+    if not LOCAL_BUILD_TIMES:
+        return
+    total = sum(LOCAL_BUILD_TIMES.values())
+    cyan(f"[*] Local Builds: {len(LOCAL_BUILD_TIMES)} commits built in {total:.1f}s ({total / len(LOCAL_BUILD_TIMES):.1f}s per commit)")
+    for commit_hash, seconds in LOCAL_BUILD_TIMES.items():
+        cyan(f"      {commit_hash:<14} {seconds:.1f}s")
@@ -0,0 +1,145 @@
+import os, csv
+
+import base.bisect as bisect
+import base.multi as multi
+from base.sandbox import CRASH, OUTCOME_NAMES
+from base.compiler import restore_checkout
+from base.util import get_cr_commit_position_and_date
+from utils.colors import *
+from utils.flags import validate_flags
+from utils.git import is_commit_in_log
+
+# Variable to hold the CSV file the last flag matrix is written to
+MATRIX_CSV = "testarea/matrix.csv"
+
+def make_flag_variants(poc_path, flag_sets):
+    # A flag matrix is a multi-PoC bisect in which every variant runs the same PoC
+    entries = [{"poc": poc_path, "flags": flags, "name": f"#{n}"} for n, flags in enumerate(flag_sets, 1)]
+    return entries, multi.make_variants(entries)
+
+def print_matrix(variants, commits):
+    rows = []
+    print()
+    green("=======================================================================================")
+    green(f"| Flag Matrix: {len(commits)} revisions x {len(variants)} flag sets")
+    green("=======================================================================================")
+    for v in variants:
+        cyan(f"{v['name']:>4}  {v['flags']}")
+    print()
+    magenta(f"{'Commit':<12} {'Revision':<9} " + " ".join(f"{v['name']:>8}" for v in variants))
+
+    for commit_hash in commits:
+        rev, _ = get_cr_commit_position_and_date(commit_hash, bisect.DB_PATH)
+        outcomes = multi.TESTED.get(commit_hash, {})
+        row = {"commit": commit_hash, "revision": rev}
+        cells = []
+        for v in variants:
+            outcome = outcomes.get(v["name"])
+            row[v["flags"]] = OUTCOME_NAMES[outcome] if outcome is not None else None
+            cells.append(f"{row[v['flags']] or '-':>8}")
+        rows.append(row)
+        (light_red if any(outcomes.get(v["name"]) == CRASH for v in variants) else green)(f"{commit_hash:<12} {str(rev):<9} " + " ".join(cells))
+
+    os.makedirs(os.path.dirname(MATRIX_CSV), exist_ok=True)
+    with open(MATRIX_CSV, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["commit", "revision"] + [v["flags"] for v in variants])
+        writer.writeheader()
+        writer.writerows(rows)
+    print()
+    green(f"[+] Matrix saved to {MATRIX_CSV}")
+    return rows
+
+def run_flag_matrix(v8_path, db_path, os_name, poc_path, target, flag_sets, commits, trials=1, local=False):
+    # Runs the PoC under every flag set on every commit, one build fetch per commit
+    multi.BUILDS_USED.clear()
+    multi.TESTED.clear()
+    bisect.setup_bisect(v8_path, db_path, os_name, poc_path, target, 1, trials, local=local)
+    bisect.CUSTOM_ARGS = flag_sets[0]
+    bisect.SESSION_ID = None
+
+    _, variants = make_flag_variants(poc_path, flag_sets)
+    try:
+        results = multi.test_revisions({commit_hash: variants for commit_hash in commits})
+    finally:
+        if local:
+            restore_checkout(v8_path)
+    for commit_hash, outcomes in results.items():
+        if outcomes is None:
+            red(f"[-] No d8 build for {commit_hash}. Left out of the matrix.")
+
+    rows = print_matrix(variants, [c for c in commits if results[c] is not None])
+    if trials > 1:
+        bisect.print_trial_report()
+    return rows
+
+def bisect_flag_matrix(v8_path, db_path, os_name, poc_path, target, flag_sets, bad_commit, good_commit=None, trials=1, local=False, prune=True):
+    # Bisects every flag set in one pass, the matrix shows every revision the bisect tested
+    entries, variants = make_flag_variants(poc_path, flag_sets)
+    results = multi.run_multi_bisect(v8_path, db_path, os_name, entries, target, bad_commit, good_commit, trials, local, prune)
+    revisions = {c: str(get_cr_commit_position_and_date(c, db_path)[0]) for c in multi.TESTED}
+    commits = sorted(multi.TESTED, key=lambda c: int(revisions[c]) if revisions[c].isdigit() else -1, reverse=True)
+    print_matrix(variants, commits)
+    return results
+
+def find_flag_matrix(v8_path, db_path, os_name):
+    while True:
+        poc_path = yellow_input("Enter the path for Crash PoC: ").strip()
+        if os.path.exists(poc_path):
+            break
+        red("[-] Path does not exist. Try again.")
+        print()
+
+    flag_sets = []
+    while True:
+        flags = yellow_input(f"Input flag set #{len(flag_sets) + 1} for d8 (empty to finish): ")
+        if flags.strip() == "":
+            if len(flag_sets) >= 2:
+                break
+            red("[-] At least two flag sets are needed for a matrix.")
+            continue
+        if validate_flags(flags) == "":
+            red("[-] Invalid Arguments. Please try again.")
+            continue
+        if flags in flag_sets:
+            red("[-] Flag set already in the matrix.")
+            continue
+        flag_sets.append(flags)
+
+    while True:
+        target = yellow_input("Input Target (debug/release): ").strip()
+        if target.lower() in ["debug", "release"]:
+            break
+        red("[-] Invalid Target. Please try again.")
+        print()
+
+    while True:
+        bad_commit = yellow_input("Input Commit Hash on which the PoC Crashes (BAD_COMMIT): ").strip()[:11]
+        print()
+        if is_commit_in_log(bad_commit, v8_path):
+            break
+        red("[-] Invalid Commit Hash. Please try again.")
+
+    mode = yellow_input("Bisect every flag set from BAD_COMMIT? (Y/n, n just tests the listed commits): ").strip().lower()
+    print()
+    if mode in ["n", "no"]:
+        commits = [bad_commit]
+        for commit_hash in yellow_input("Input more Commit Hashes to test (space separated, may be empty): ").split():
+            if is_commit_in_log(commit_hash[:11], v8_path):
+                commits.append(commit_hash[:11])
+            else:
+                red(f"[-] Invalid Commit Hash {commit_hash}. Left out.")
+        print()
+        run_flag_matrix(v8_path, db_path, os_name, poc_path, target, flag_sets, list(dict.fromkeys(commits)))
+        return
+
+    while True:
+        good_commit = yellow_input("Input Commit Hash on which the PoC Doesn't Crash (If you don't know just put \"None\"): ").strip()[:11]
+        print()
+        if good_commit.lower() == "none":
+            good_commit = None
+            break
+        if is_commit_in_log(good_commit, v8_path):
+            break
+        red("[-] Invalid Commit Hash or Keyword. Please try again.")
+
+    bisect_flag_matrix(v8_path, db_path, os_name, poc_path, target, flag_sets, bad_commit, good_commit)
@@ -0,0 +1,168 @@
+import os, re
+import sqlite3
+import threading
+from datetime import datetime
+
+from base.store import list_records, read_record
+from utils.colors import *
+
+# Variable to hold the file name of the commit metadata index inside the DB directory
+META_FILE = "meta.sqlite"
+# Variable to hold how many commits are looked up per query when a whole result set is resolved
+META_BATCH = 500
+
+POSITION = re.compile(r'Cr-Commit-Position: refs/heads/main@\{\#(\d+)\}')
+DATE = re.compile(r'^Date:\s+(.*)$', re.MULTILINE)
+AUTHOR = re.compile(r'^Author:\s+(.*)$', re.MULTILINE)
+FULL_HASH = re.compile(r'^commit ([0-9a-f]{40})', re.MULTILINE)
+DIFF_PATHS = re.compile(r'^diff --git a/(\S+) b/(\S+)$|^diff --cc (\S+)$', re.MULTILINE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS commits (
+    hash TEXT PRIMARY KEY,
+    full_hash TEXT,
+    position INTEGER,
+    date TEXT,
+    timestamp INTEGER,
+    author TEXT
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS commits_position ON commits (position);
+CREATE INDEX IF NOT EXISTS commits_timestamp ON commits (timestamp);
+CREATE TABLE IF NOT EXISTS paths (
+    hash TEXT,
+    path TEXT,
+    PRIMARY KEY (hash, path)
+) WITHOUT ROWID;
+"""
+
+# One connection per thread and DB (sqlite3 connections cannot be shared between threads)
+_LOCAL = threading.local()
+
+def get_meta_path(db_path):
+    return os.path.join(db_path, META_FILE)
+
+def has_meta(db_path):
+    return os.path.isfile(get_meta_path(db_path))
+
+def _connect(db_path):
+    connections = getattr(_LOCAL, "connections", None)
+    if connections is None:
+        connections = _LOCAL.connections = {}
+    if db_path not in connections:
+        os.makedirs(db_path, exist_ok=True)
+        conn = sqlite3.connect(get_meta_path(db_path), timeout=60)
+        # Ingest streams write while bisects read
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+        connections[db_path] = conn
+    return connections[db_path]
+
+def parse_metadata(diff_content):
+    position = POSITION.search(diff_content)
+    date = DATE.search(diff_content)
+    author = AUTHOR.search(diff_content)
+    full_hash = FULL_HASH.search(diff_content)
+
+    timestamp = None
+    if date:
+        try:
+            timestamp = int(datetime.strptime(date.group(1).strip(), "%a %b %d %H:%M:%S %Y %z").timestamp())
+        except ValueError:
+            timestamp = None
+
+    paths = set()
+    for match in DIFF_PATHS.finditer(diff_content):
+        paths.update(path for path in match.groups() if path)
+
+    return {
+        "full_hash": full_hash.group(1) if full_hash else None,
+        "position": int(position.group(1)) if position else None,
+        "date": date.group(1).strip() if date else None,
+        "timestamp": timestamp,
+        "author": author.group(1).strip() if author else None,
+        "paths": paths
+    }
+
+def index_records(records, db_path):
+    # records: iterable of (commit hash, diff text), called by the ingest right after they are stored
+    rows, path_rows = [], []
+    for commit_hash, diff_content in records:
+        meta = parse_metadata(diff_content)
+        rows.append((commit_hash, meta["full_hash"], meta["position"], meta["date"], meta["timestamp"], meta["author"]))
+        path_rows.extend((commit_hash, path) for path in meta["paths"])
+
+    conn = _connect(db_path)
+    with conn:
+        conn.executemany("INSERT OR REPLACE INTO commits VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.executemany("INSERT OR IGNORE INTO paths VALUES (?, ?)", path_rows)
+    return len(rows)
+
+def backfill_meta(db_path):
+    # Indexes the commits of a DB which was built before the metadata index (or by --pack-db)
+    conn = _connect(db_path)
+    indexed = {row[0] for row in conn.execute("SELECT hash FROM commits")}
+    missing = sorted(list_records(db_path) - indexed)
+    if not missing:
+        return 0
+
+    yellow(f"[*] Indexing the metadata of {len(missing)} commits...")
+    for start in range(0, len(missing), META_BATCH):
+        batch = []
+        for commit_hash in missing[start:start + META_BATCH]:
+            diff_content = read_record(commit_hash, db_path)
+            if diff_content is not None:
+                batch.append((commit_hash, diff_content))
+        index_records(batch, db_path)
+    green(f"[+] Indexed the metadata of {len(missing)} commits.")
+    return len(missing)
+
+def _row_to_meta(row):
+    return {"hash": row[0], "full_hash": row[1], "position": row[2], "date": row[3], "timestamp": row[4], "author": row[5]}
+
+def get_commit_meta(commit_hash, db_path):
+    # None if the commit is not indexed (yet)
+    if not has_meta(db_path):
+        return None
+    row = _connect(db_path).execute("SELECT * FROM commits WHERE hash = ?", (commit_hash,)).fetchone()
+    return _row_to_meta(row) if row else None
+
+def get_commits_meta(hashes, db_path):
+    # Metadata of many commits at once (hash -> metadata), the ones not indexed are left out
+    result = {}
+    if not has_meta(db_path):
+        return result
+    conn = _connect(db_path)
+    hashes = list(hashes)
+    for start in range(0, len(hashes), META_BATCH):
+        chunk = hashes[start:start + META_BATCH]
+        for row in conn.execute(f"SELECT * FROM commits WHERE hash IN ({','.join('?' * len(chunk))})", chunk):
+            result[row[0]] = _row_to_meta(row)
+    return result
+
+def get_commit_paths(commit_hash, db_path):
+    # None if the commit is not indexed, so callers can tell "no paths" from "unknown"
+    if get_commit_meta(commit_hash, db_path) is None:
+        return None
+    return {row[0] for row in _connect(db_path).execute("SELECT path FROM paths WHERE hash = ?", (commit_hash,))}
+
+def get_commit_at_position(position, db_path):
+    if not has_meta(db_path):
+        return None
+    row = _connect(db_path).execute("SELECT * FROM commits WHERE position = ?", (position,)).fetchone()
+    return _row_to_meta(row) if row else None
+
+def get_commits_by_position(first, last, db_path):
+    # Commits with first <= Cr-Commit-Position <= last, oldest first
+    if not has_meta(db_path):
+        return []
+    rows = _connect(db_path).execute("SELECT * FROM commits WHERE position BETWEEN ? AND ? ORDER BY position", (first, last))
+    return [_row_to_meta(row) for row in rows]
+
+def get_commits_by_date(start, end, db_path):
+    # Commits authored between two datetimes (or unix timestamps), oldest first
+    start = int(start.timestamp()) if isinstance(start, datetime) else int(start)
+    end = int(end.timestamp()) if isinstance(end, datetime) else int(end)
+    if not has_meta(db_path):
+        return []
+    rows = _connect(db_path).execute("SELECT * FROM commits WHERE timestamp BETWEEN ? AND ? ORDER BY timestamp", (start, end))
+    return [_row_to_meta(row) for row in rows]
@@ -0,0 +1,420 @@
+import os, sys, re, math
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import base.bisect as bisect
+import base.sandbox as sandbox
+from base.sandbox import CRASH, OK, TIMEOUT, OOM, BROKEN, OUTCOMES, calibrate_timeout, run_sandboxed
+from base.compiler import restore_checkout
+from base.cache import build_key, build_in_use, get_build_sanity, set_build_sanity, print_cache_stats
+from base.verdicts import lookup_verdict, print_verdict_stats
+from base.util import get_cr_commit_position_and_date, get_file_hash
+from utils.colors import *
+from utils.flags import validate_flags
+from utils.download import print_download_stats
+from utils.git import is_commit_in_log, get_commit, get_commits_behind, get_distance
+
+# Variable to hold the number of distinct revisions fetched and tested at the same time per round
+MULTI_DOWNLOADS = 2
+# Variable to hold the number of d8 runs (PoC/flag sets x trials) running at the same time on one build
+CELL_WORKERS = os.cpu_count() or 4
+# Variable to hold the number of builds fetched by the current multi-PoC bisect
+BUILDS_USED = set()
+# Variable to hold every outcome of the current multi-PoC bisect (commit hash -> variant name -> outcome)
+TESTED = {}
+
+def make_variants(entries):
+    # entries: [{"poc": ..., "flags": ..., "name": optional}], every entry is bisected on its own window
+    variants = []
+    for n, entry in enumerate(entries, 1):
+        name = entry.get("name") or f"{n}:{os.path.basename(entry['poc'])}"
+        variants.append({
+            "name": name,
+            "poc": entry["poc"],
+            "flags": entry["flags"],
+            "hash": get_file_hash(entry["poc"]),
+            "slug": re.sub(r"[^\w.-]", "_", name),
+            "bad": None,
+            "good": None,
+            "skipped": set(),
+            "status": "open"
+        })
+    return variants
+
+def get_stored_outcome(variant, commit_hash):
+    revision, _ = get_cr_commit_position_and_date(commit_hash, bisect.DB_PATH)
+    if not re.fullmatch(r"\d{5,6}", str(revision)):
+        return None
+    record = lookup_verdict(build_key(bisect.OS, bisect.get_build_target(), revision), variant["hash"], variant["flags"], bisect.TRIALS, sandbox.RUN_TIMEOUT)
+    return OUTCOMES[record["outcome"]] if record else None
+
+def run_cell(d8_path, flags, poc_path, dry_run):
+    # Runs in a pool thread, which only waits for its d8 subprocess
+    if dry_run:
+        try:
+            subprocess.run([d8_path] + flags.split() + ["test/test.js"], check=True, timeout=sandbox.RUN_TIMEOUT,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+            return BROKEN, None, None, None
+    outcome, returncode, output, runtime = run_sandboxed([d8_path] + flags.split() + [poc_path], d8_path)
+    return outcome, returncode, output if outcome == CRASH else None, runtime
+
+def vote_trials(results):
+    # Same vote as run_poc_trials(), over runs which all went to completion
+    needed = max(1, math.ceil(bisect.TRIALS * bisect.TRIAL_THRESHOLD))
+    outcomes = [r[0] for r in results]
+    crashes = sum(1 for o in outcomes if o == CRASH or bisect.get_verdict(o) == "bad")
+    if crashes >= needed:
+        return CRASH, crashes
+    if all(o in [TIMEOUT, OOM] for o in outcomes):
+        return max(set(outcomes), key=outcomes.count), crashes
+    return OK, crashes
+
+def run_variants(commit_hash, build_dir, variants, runtimes=None):
+    # Every variant (and every trial of it) on this build runs at once, one thread per d8 subprocess
+    # runtimes, if given, collects name -> runtime of the variants which ran
+    d8_path = os.path.join(build_dir, "d8")
+    if not os.access(d8_path, os.X_OK):
+        os.chmod(d8_path, os.stat(d8_path).st_mode | 0o111)
+    if not os.path.exists("test/test.js"):
+        os.makedirs("test", exist_ok=True)
+        with open("test/test.js", "w") as f:
+            f.write('var a = 42;')
+
+    key = os.path.basename(build_dir)
+    outcomes = {}
+    sanity = {}
+    for v in variants:
+        sanity[v["name"]] = get_build_sanity(key, v["flags"])
+        if sanity[v["name"]] is False:
+            red(f"[-] {v['name']}: {key} failed the test.js sanity check earlier. Skipping it.")
+            outcomes[v["name"]] = BROKEN
+    runs = [v for v in variants if v["name"] not in outcomes]
+    if not runs:
+        return outcomes
+
+    yellow(f"[*] Running {len(runs)} PoC/flag sets x {bisect.TRIALS} trials on {commit_hash}...")
+    with build_in_use(key), ThreadPoolExecutor(max_workers=max(1, min(CELL_WORKERS, len(runs) * bisect.TRIALS))) as executor:
+        futures = {
+            v["name"]: [executor.submit(run_cell, d8_path, v["flags"], v["poc"], sanity[v["name"]] is None and n == 0)
+                        for n in range(bisect.TRIALS)]
+            for v in runs
+        }
+        results = {name: [f.result() for f in fs] for name, fs in futures.items()}
+
+    for v in runs:
+        cells = results[v["name"]]
+        if any(cell[0] == BROKEN for cell in cells):
+            red(f"[-] {v['name']}: Error running d8 with test.js. Check d8 binary or arguments.")
+            set_build_sanity(key, v["flags"], False)
+            outcomes[v["name"]] = BROKEN
+            continue
+        if sanity[v["name"]] is None:
+            set_build_sanity(key, v["flags"], True)
+
+        report_key = f"{key} {os.path.basename(v['poc'])} {v['flags']}"
+        if bisect.TRIALS > 1:
+            outcome, crashes = vote_trials(cells)
+            bisect.REPORT[report_key] = [crashes, len(cells)]
+        else:
+            outcome = cells[0][0]
+        runtime = cells[0][3]
+        if runtimes is not None and runtime is not None:
+            runtimes[v["name"]] = runtime
+        bisect.remember_outcome(key, v["flags"], outcome, runtime, v["poc"], v["hash"], report_key)
+        outcomes[v["name"]] = outcome
+
+        if outcome == CRASH:
+            crash_log = os.path.join(os.path.dirname(bisect.CRASH_LOG), f"crash-{v['slug']}-{commit_hash}.log")
+            os.makedirs(os.path.dirname(crash_log), exist_ok=True)
+            with open(crash_log, "w") as f:
+                f.write(next(cell[2] for cell in cells if cell[0] == CRASH) or "")
+            light_red(f"[-] {v['name']}: d8 crashed. Output saved to {crash_log}.")
+        elif outcome in [TIMEOUT, OOM]:
+            light_red(f"[-] {v['name']}: d8 hit the timeout/memory limit (treated as {bisect.get_verdict(outcome)}).")
+        else:
+            green(f"[+] {v['name']}: d8 ran without a Crash.")
+    return outcomes
+
+def test_revision(commit_hash, variants, runtimes=None):
+    # One fetch per revision, every variant runs on it in parallel. Returns name -> outcome, None without a build
+    outcomes = {}
+    pending = []
+    for variant in variants:
+        known = get_stored_outcome(variant, commit_hash)
+        if known is not None:
+            outcomes[variant["name"]] = known
+        else:
+            pending.append(variant)
+
+    if pending:
+        build_dir = bisect.download_and_extract_d8(commit_hash, quiet=True)
+        if build_dir is None:
+            return None
+        BUILDS_USED.add(commit_hash)
+        outcomes.update(run_variants(commit_hash, build_dir, pending, runtimes))
+    TESTED.setdefault(commit_hash, {}).update(outcomes)
+    return outcomes
+
+def test_revisions(plan):
+    # plan: commit hash -> variants to run on it
+    with ThreadPoolExecutor(max_workers=max(1, min(MULTI_DOWNLOADS, len(plan)))) as executor:
+        futures = {ch: executor.submit(test_revision, ch, variants) for ch, variants in plan.items()}
+        return {ch: f.result() for ch, f in futures.items()}
+
+def apply_outcome(variant, offset, outcome):
+    verdict = bisect.get_verdict(outcome)
+    if verdict == "skip":
+        variant["skipped"].add(offset)
+    elif verdict == "bad":
+        variant["bad"] = max(variant["bad"], offset)
+    elif variant["good"] is None or offset < variant["good"]:
+        variant["good"] = offset
+    return verdict
+
+def validate_variants(variants, anchor):
+    yellow(f"[*] Trying to reproduce the crash of {len(variants)} PoCs on {anchor}...")
+    runtimes = {}
+    outcomes = test_revision(anchor, variants, runtimes)
+    if outcomes is None:
+        red("[-] No prebuilt d8 for BAD_COMMIT. Please pick a nearby commit which has a build.")
+        sys.exit(1)
+
+    for variant in variants:
+        if outcomes[variant["name"]] == CRASH:
+            variant["bad"] = 0
+            green(f"[+] {variant['name']} crashes on BAD_COMMIT.")
+        else:
+            variant["status"] = "no crash"
+            red(f"[-] {variant['name']} does not crash on BAD_COMMIT. Leaving it out.")
+
+    if not any(v["status"] == "open" for v in variants):
+        red("[-] None of the PoCs crash on BAD_COMMIT. Please check the Testcases (were flags put correctly?)")
+        sys.exit(1)
+    # The slowest PoC which crashes sets the timeout for all of them
+    runtime = max((runtimes[v["name"]] for v in variants if v["status"] == "open" and v["name"] in runtimes), default=None)
+    if runtime is not None:
+        calibrate_timeout(runtime)
+
+def find_variant_commit(anchor, variant):
+    # Midpoint of the variant's window, snapped to a buildable commit this variant did not skip
+    lo, hi = variant["bad"], variant["good"]
+    mid = (lo + hi) // 2
+    for delta in range(0, max(mid - lo, hi - mid)):
+        for offset in ([mid] if delta == 0 else [mid - delta, mid + delta]):
+            if lo < offset < hi and offset not in variant["skipped"]:
+                commit_hash = get_commit(anchor, offset, bisect.V8_PATH)
+                if bisect.is_commit_buildable(commit_hash):
+                    return offset, commit_hash
+    return None, None
+
+def gallop_variants(variants, anchor):
+    limit = get_commits_behind(anchor)
+    distance = bisect.DISTANCE
+
+    while True:
+        waiting = [v for v in variants if v["status"] == "open" and v["good"] is None]
+        if not waiting:
+            return
+
+        d = min(distance, limit) if limit is not None else distance
+        if d == 0:
+            for v in waiting:
+                v["status"] = "no good"
+            red("[-] BAD_COMMIT is the oldest commit in the history. Cannot speculate a GOOD_COMMIT.")
+            return
+
+        hi = limit + 1 if limit is not None else 2 * d
+        d, commit_hash = bisect.find_available_commit(anchor, d, 0, hi)
+        if commit_hash is None:
+            for v in waiting:
+                v["status"] = "no good"
+            red("[-] No prebuilt d8 found behind BAD_COMMIT. Cannot speculate a GOOD_COMMIT.")
+            return
+
+        yellow(f"[*] Speculating GOOD_COMMIT for {len(waiting)} PoCs by moving {d} spaces behind {anchor}...")
+        outcomes = test_revision(commit_hash, waiting) or {}
+        for v in waiting:
+            if v["name"] in outcomes and apply_outcome(v, d, outcomes[v["name"]]) == "good":
+                green(f"[+] {v['name']}: GOOD_COMMIT Found {d} spaces behind {anchor}.")
+
+        if limit is not None and d >= limit:
+            for v in variants:
+                if v["status"] == "open" and v["good"] is None:
+                    v["status"] = "no good"
+                    red(f"[-] {v['name']}: Reached the oldest commit and the PoC still crashes.")
+            return
+        distance = d * 2
+
+def bisect_variants(variants, anchor):
+    rounds = 0
+    while True:
+        open_variants = [v for v in variants if v["status"] == "open"]
+        for v in open_variants:
+            if v["good"] - v["bad"] <= 1:
+                v["status"] = "found"
+        open_variants = [v for v in open_variants if v["status"] == "open"]
+        if not open_variants:
+            return rounds
+
+        # Union of the revisions the open windows need, variants sharing a window share one midpoint
+        needed = {}
+        for v in open_variants:
+            offset, commit_hash = find_variant_commit(anchor, v)
+            if commit_hash is None:
+                # Only pruned commits left means the window is done, anything else had no build
+                remaining = [get_commit(anchor, o, bisect.V8_PATH) for o in range(v["bad"] + 1, v["good"])]
+                unresolved = not bisect.PRUNE or any(bisect.is_runtime_commit(ch) for ch in remaining)
+                v["status"] = "unresolved" if unresolved else "found"
+                continue
+            needed[offset] = commit_hash
+        if not needed:
+            return rounds
+
+        # Every open variant whose window holds a scheduled revision runs on it, the build is there anyway
+        plan = {}
+        for offset, commit_hash in sorted(needed.items()):
+            runs = [v for v in open_variants if v["bad"] < offset < v["good"] and offset not in v["skipped"]]
+            if runs:
+                plan[commit_hash] = runs
+        offsets = {commit_hash: offset for offset, commit_hash in needed.items()}
+
+        rounds += 1
+        print()
+        magenta(f"[*] Round {rounds}: {len(open_variants)} open windows, testing {', '.join(plan)}")
+        results = test_revisions(plan)
+
+        for commit_hash, outcomes in results.items():
+            offset = offsets[commit_hash]
+            if outcomes is None:
+                # Missing build, is_commit_buildable() leaves it out from now on
+                continue
+            for v in plan[commit_hash]:
+                verdict = apply_outcome(v, offset, outcomes[v["name"]])
+                if verdict == "bad":
+                    light_red(f"[-] {v['name']}: {commit_hash} [{offset} away from {anchor}] ran with a Crash.")
+                elif verdict == "good":
+                    green(f"[+] {v['name']}: {commit_hash} [{offset} away from {anchor}] ran without a Crash.")
+                else:
+                    yellow(f"[*] {v['name']}: {commit_hash} [{offset} away from {anchor}] skipped (timeout/OOM).")
+
+def report_variants(variants, anchor, rounds):
+    results = []
+    print()
+    green("=======================================================================================")
+    green(f"| Multi-PoC Bisect: {len(variants)} PoCs, {rounds} rounds, {len(BUILDS_USED)} builds fetched")
+    green("=======================================================================================")
+    for v in variants:
+        result = {"name": v["name"], "poc": v["poc"], "flags": v["flags"], "status": v["status"]}
+        if v["bad"] is not None and v["good"] is not None:
+            bad_commit = get_commit(anchor, v["bad"], bisect.V8_PATH)
+            rev, date_str = get_cr_commit_position_and_date(bad_commit, bisect.DB_PATH)
+            result.update({
+                "bad_commit": bad_commit,
+                "good_commit": get_commit(anchor, v["good"], bisect.V8_PATH),
+                "revision": rev,
+                "date": date_str,
+                "unresolved_commits": v["good"] - v["bad"] if v["status"] == "unresolved" else None
+            })
+            line = f"{v['name']:<28} {result['status']:<11} {bad_commit}  Revision: {str(rev):<7} Date: {date_str}"
+            if v["status"] == "unresolved":
+                line += f"  (unresolved: {result['good_commit']}..{bad_commit}, {v['good'] - v['bad']} commits)"
+            (green if v["status"] == "found" else yellow)(line)
+        else:
+            red(f"{v['name']:<28} {v['status']}")
+        results.append(result)
+    print()
+    if bisect.TRIALS > 1:
+        bisect.print_trial_report()
+    print_cache_stats()
+    print_download_stats()
+    print_verdict_stats()
+    print()
+    return results
+
+def run_multi_bisect(v8_path, db_path, os_name, entries, target, bad_commit, good_commit=None, trials=1, local=False, prune=True):
+    BUILDS_USED.clear()
+    TESTED.clear()
+    bisect.setup_bisect(v8_path, db_path, os_name, entries[0]["poc"], target, 1, trials, local=local, prune=prune)
+    bisect.CUSTOM_ARGS = entries[0]["flags"]
+    # A multi-PoC bisect is not checkpointed, the verdict store makes a rerun cheap
+    bisect.SESSION_ID = None
+
+    try:
+        variants = make_variants(entries)
+        anchor = bad_commit
+        bisect.BAD_COMMIT = anchor
+        validate_variants(variants, anchor)
+
+        if good_commit is None:
+            gallop_variants(variants, anchor)
+        else:
+            dist = get_distance(good_commit, anchor, v8_path)
+            if dist == 0:
+                red("[-] Bad commit is behind Good commit. Please check the data and try again.")
+                sys.exit(1)
+            outcomes = test_revision(good_commit, [v for v in variants if v["status"] == "open"])
+            if outcomes is None:
+                red("[-] No prebuilt d8 for GOOD_COMMIT. Please pick a nearby commit which has a build.")
+                sys.exit(1)
+            for v in variants:
+                if v["status"] == "open":
+                    if bisect.get_verdict(outcomes[v["name"]]) == "good":
+                        v["good"] = dist
+                    else:
+                        v["status"] = "no good"
+                        red(f"[-] {v['name']} does not run cleanly on GOOD_COMMIT. Leaving it out.")
+
+        rounds = bisect_variants(variants, anchor)
+        return report_variants(variants, anchor, rounds)
+    finally:
+        if local:
+            # Local builds detach HEAD, the next launch indexes and syncs from the user's branch again
+            restore_checkout(v8_path)
+
+def find_multi_bisect(v8_path, db_path, os_name):
+    entries = []
+    while True:
+        poc_path = yellow_input(f"Enter the path for Crash PoC #{len(entries) + 1} (empty to finish): ").strip()
+        if poc_path == "":
+            if len(entries) >= 1:
+                break
+            red("[-] At least one PoC is needed.")
+            continue
+        if not os.path.exists(poc_path):
+            red("[-] Path does not exist. Try again.")
+            continue
+
+        while True:
+            flags = yellow_input(f"Input custom arguments for d8 for {poc_path}: ")
+            if validate_flags(flags) != "":
+                break
+            red("[-] Invalid Arguments. Please try again.")
+        entries.append({"poc": poc_path, "flags": flags})
+        print()
+
+    while True:
+        target = yellow_input("Input Target (debug/release): ").strip()
+        if target.lower() in ["debug", "release"]:
+            break
+        red("[-] Invalid Target. Please try again.")
+        print()
+
+    while True:
+        bad_commit = yellow_input("Input Commit Hash on which the PoCs Crash (BAD_COMMIT): ").strip()[:11]
+        print()
+        if is_commit_in_log(bad_commit, v8_path):
+            break
+        red("[-] Invalid Commit Hash. Please try again.")
+
+    while True:
+        good_commit = yellow_input("Input Commit Hash on which the PoCs Don't Crash (If you don't know just put \"None\"): ").strip()[:11]
+        print()
+        if good_commit.lower() == "none":
+            good_commit = None
+            break
+        if is_commit_in_log(good_commit, v8_path):
+            break
+        red("[-] Invalid Commit Hash or Keyword. Please try again.")
+
+    run_multi_bisect(v8_path, db_path, os_name, entries, target, bad_commit, good_commit)
@@ -1,36 +1,61 @@
-import os
-from datetime import datetime
+import os, re
+from time import time
+from datetime import datetime, timezone
 from ripgrepy import Ripgrepy
 from utils.colors import *
 
 from base.util import get_cr_commit_position_and_date
+from base.store import search_records, has_legacy_diffs
+from base.meta import get_commits_meta
+from base.trigram import candidate_commits
 
 
 def search_string_in_db(db_path):
     print()
     search_term = yellow_input("Input Search Term: ")
 
-    yellow(f"[*] Searching for '{search_term}' in commit diffs...")
-
-    try:
-        rg = Ripgrepy(search_term, db_path).fixed_strings().with_filename().json()
-        output = rg.run()
-
-        if not output:
-            red("[-] No results returned by ripgrep.")
+    # Fixed string unless asked otherwise, so terms with regex characters keep matching literally
+    while True:
+        choice = yellow_input("Treat the Search Term as a regular expression? (y/N): ").strip().lower()
+        if choice in ["", "n", "y"]:
+            regex = choice == "y"
+            break
+        red("[-] Invalid Input. Please Try again.")
+        print()
+
+    pattern = search_term
+    if regex:
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            red(f"[-] Invalid regular expression: {e}")
             return []
 
-        results = output.as_dict
+    yellow(f"[*] Searching for '{search_term}' in commit diffs...")
 
-        matching_commits = set()
-        for match in results:
-            if match.get("type") != "match":
-                continue
-            path = match["data"]["path"]["text"]
-            filename = os.path.basename(path)
-            if filename.endswith(".diff"):
-                commit_hash = filename.replace(".diff", "")
-                matching_commits.add(commit_hash)
+    try:
+        # The trigram index narrows the commits down, only those are decompressed and matched (in parallel)
+        start = time()
+        candidates = candidate_commits(pattern, db_path, regex)
+        matching_commits = search_records(pattern, db_path, hashes=candidates, regex=regex)
+        scanned = "all commits" if candidates is None else f"{len(candidates)} candidate commits"
+        cyan(f"[*] Matched {scanned} in {time() - start:.2f}s")
+
+        # Only a pre-pack DB still needs ripgrep
+        if has_legacy_diffs(db_path):
+            rg = Ripgrepy(pattern, db_path).with_filename().glob("*.diff").json()
+            if not regex:
+                rg = rg.fixed_strings()
+            output = rg.run()
+
+            for match in (output.as_dict if output else []):
+                if match.get("type") != "match":
+                    continue
+                path = match["data"]["path"]["text"]
+                filename = os.path.basename(path)
+                if filename.endswith(".diff"):
+                    commit_hash = filename.replace(".diff", "")
+                    matching_commits.add(commit_hash)
 
         if matching_commits:
             green(f"[+] Found '{search_term}' in {len(matching_commits)} commits:")
@@ -50,8 +75,17 @@ def search_string_in_db(db_path):
 
             if do_print:
                 commits_with_meta = []
+                # One indexed lookup for the whole result set, the diffs of the rest are read
+                metas = get_commits_meta(matching_commits, db_path)
 
                 for ch in matching_commits:
+                    meta = metas.get(ch)
+                    if meta is not None:
+                        rev, date_str = meta["position"] if meta["position"] is not None else "Not Found", meta["date"]
+                        date_obj = datetime.fromtimestamp(meta["timestamp"], timezone.utc) if meta["timestamp"] is not None else None
+                        commits_with_meta.append((ch, rev, date_str, date_obj))
+                        continue
+
                     rev, date_str = get_cr_commit_position_and_date(ch, db_path)
                     if date_str:
                         try:
@@ -65,7 +99,7 @@ def search_string_in_db(db_path):
                     commits_with_meta.append((ch, rev, date_str, date_obj))
 
                 # Sort by datetime object (newest first), unknown dates go last
-                commits_with_meta.sort(key=lambda x: x[3] or datetime.min, reverse=True)
+                commits_with_meta.sort(key=lambda x: x[3] or datetime.min.replace(tzinfo=timezone.utc), reverse=True)
 
                 for ch, rev, date_str, _ in commits_with_meta[:100]:
                     url = f"https://chromium.googlesource.com/v8/v8/+/{ch}"
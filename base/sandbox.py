@@ -0,0 +1,124 @@
+import os, math
+import mmap
+import resource
+import subprocess
+from time import time
+
+from utils.colors import *
+
+# Outcomes of a d8 run
+CRASH = -1
+OK = 0
+ERROR = 1 # d8 exited with a JS exception/generic error
+TIMEOUT = 2
+OOM = 3
+BROKEN = 4 # the build itself failed the test.js sanity check
+
+# Names of the outcomes as they are stored and reported
+OUTCOME_NAMES = {CRASH: "CRASH", OK: "OK", ERROR: "ERROR", TIMEOUT: "TIMEOUT", OOM: "OOM", BROKEN: "BROKEN"}
+OUTCOMES = {name: outcome for outcome, name in OUTCOME_NAMES.items()}
+
+# Variable to hold the wall-clock timeout of a d8 run in seconds, recalibrated after BAD_COMMIT validation
+RUN_TIMEOUT = 600
+# Variable to hold how many times the BAD_COMMIT runtime a run may take before it counts as TIMEOUT
+TIMEOUT_FACTOR = 5
+# Variable to hold the lower bound of the adaptive timeout in seconds
+MIN_TIMEOUT = 10
+# Variable to hold the memory limit of a d8 run in bytes (Default: 8 GB)
+MEMORY_LIMIT = 8 * 1024 * 1024 * 1024
+
+# Output of ASAN/V8 when a run hits the memory limit
+OOM_PATTERNS = [
+    "hard rss limit exhausted",
+    "allocator is out of memory",
+    "out-of-memory",
+    "Fatal process out of memory",
+    "Fatal JavaScript out of memory",
+    "std::bad_alloc",
+]
+
+# Cache of which d8 binaries are ASAN builds (path -> bool)
+_ASAN_BUILDS = {}
+
+def is_asan_build(d8_path):
+    if d8_path not in _ASAN_BUILDS:
+        try:
+            with open(d8_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                _ASAN_BUILDS[d8_path] = m.find(b"AddressSanitizer") != -1
+        except (OSError, ValueError):
+            _ASAN_BUILDS[d8_path] = False
+    return _ASAN_BUILDS[d8_path]
+
+def calibrate_timeout(runtime):
+    global RUN_TIMEOUT
+    RUN_TIMEOUT = max(MIN_TIMEOUT, math.ceil(runtime * TIMEOUT_FACTOR))
+    green(f"[+] d8 runs are limited to {RUN_TIMEOUT}s ({TIMEOUT_FACTOR}x the BAD_COMMIT runtime of {runtime:.2f}s)")
+
+def get_run_env(asan):
+    env = os.environ.copy()
+    if asan and MEMORY_LIMIT:
+        # ASAN maps terabytes of writable shadow memory, so no rlimit can be used; let ASAN cap the RSS
+        options = env.get("ASAN_OPTIONS", "")
+        limit = f"hard_rss_limit_mb={MEMORY_LIMIT // (1024 * 1024)}"
+        env["ASAN_OPTIONS"] = f"{options}:{limit}" if options else limit
+    return env
+
+def _set_limits(proc, asan):
+    # Applied to the started child with prlimit(), a preexec_fn is not safe while the prefetch and round threads run
+    cpu = RUN_TIMEOUT + 5
+    try:
+        resource.prlimit(proc.pid, resource.RLIMIT_CPU, (cpu, cpu + 5))
+        if not asan and MEMORY_LIMIT:
+            # RLIMIT_AS would count the pointer compression cage, the sandbox and the wasm guard regions d8 only reserves.
+            # RLIMIT_DATA counts the writable memory it maps, so a PoC hitting it is really out of memory
+            resource.prlimit(proc.pid, resource.RLIMIT_DATA, (MEMORY_LIMIT, MEMORY_LIMIT))
+    except ProcessLookupError:
+        # d8 is already gone, nothing to limit
+        pass
+
+def classify_run(returncode, output):
+    if returncode == 0:
+        return OK
+    if any(pattern in (output or "") for pattern in OOM_PATTERNS) or returncode == -9:
+        # -9 is the kernel OOM killer
+        return OOM
+    if returncode == -24:
+        # SIGXCPU, RLIMIT_CPU exceeded
+        return TIMEOUT
+    if returncode == 1:
+        return ERROR
+    return CRASH
+
+def run_sandboxed(cmd, d8_path):
+    # Returns (outcome, returncode, output, runtime)
+    asan = is_asan_build(d8_path)
+    start = time()
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        errors="replace",
+        env=get_run_env(asan)
+    )
+    _set_limits(proc, asan)
+    try:
+        output, _ = proc.communicate(timeout=RUN_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        output, _ = proc.communicate()
+        return TIMEOUT, None, output or "", time() - start
+
+    return classify_run(proc.returncode, output), proc.returncode, output, time() - start
+
+def start_sandboxed(cmd, d8_path, out):
+    asan = is_asan_build(d8_path)
+    proc = subprocess.Popen(
+        cmd,
+        stdout=out,
+        stderr=subprocess.STDOUT,
+        text=True,
+        env=get_run_env(asan)
+    )
+    _set_limits(proc, asan)
+    return proc
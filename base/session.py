@@ -0,0 +1,63 @@
+import os, json
+from datetime import datetime
+
+from utils.colors import *
+
+# Variable to hold the directory the bisect checkpoints are written to
+SESSIONS_DIR = "testarea/sessions"
+
+def new_session_id():
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+def get_checkpoint_path(session_id):
+    return os.path.join(SESSIONS_DIR, f"{session_id}.json")
+
+def save_checkpoint(state):
+    os.makedirs(SESSIONS_DIR, exist_ok=True)
+    path = get_checkpoint_path(state["session"])
+    tmp_path = path + ".tmp"
+    # Write then rename, so a Ctrl-C mid-write never leaves a truncated checkpoint
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp_path, path)
+
+def load_checkpoint(session_id):
+    try:
+        with open(get_checkpoint_path(session_id), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        red(f"[-] Could not read checkpoint {session_id}: {e}")
+        return None
+
+def list_sessions(include_finished=False):
+    if not os.path.isdir(SESSIONS_DIR):
+        return []
+
+    sessions = []
+    for name in sorted(os.listdir(SESSIONS_DIR), reverse=True):
+        if not name.endswith(".json"):
+            continue
+        state = load_checkpoint(name[:-len(".json")])
+        if state and (include_finished or not state.get("finished")):
+            sessions.append(state)
+    return sessions
+
+def choose_session():
+    sessions = list_sessions()
+    if not sessions:
+        red("[-] No unfinished bisect sessions found.")
+        return None
+
+    magenta("\nUnfinished Bisect Sessions:")
+    for n, state in enumerate(sessions, 1):
+        window = f"{state.get('good_commit') or '?'}..{state.get('bad_commit')}"
+        magenta(f"{n}. {state['session']}  PoC: {state['poc']}  Target: {state['target']}  Window: {window}  Verdicts: {len(state.get('verdicts', {}))}")
+    print()
+
+    while True:
+        choice = yellow_input("Choose a session to resume (Enter for the latest): ").strip()
+        if choice == "":
+            return sessions[0]
+        if choice.isdigit() and 1 <= int(choice) <= len(sessions):
+            return sessions[int(choice) - 1]
+        red("[-] Invalid choice. Please try again.")
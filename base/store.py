@@ -0,0 +1,435 @@
+import os, re, struct
+import mmap
+import fcntl
+import zlib
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.colors import *
+
+try:
+    import zstandard
+except ImportError:
+    # Records are compressed with zlib and a preset dictionary instead
+    zstandard = None
+
+# Variable to hold the directory inside the DB with the packed commit diffs
+PACK_DIR = "pack"
+# Variable to hold the size at which a segment is closed and the next one started (Default: 256 MB)
+SEGMENT_SIZE = 256 * 1024 * 1024
+# Variable to hold the name of the offset index inside PACK_DIR
+INDEX_FILE = "index"
+# Variable to hold the name of the file inside PACK_DIR with the commit the DB was last synced to
+WATERMARK_FILE = "watermark"
+# Variable to hold the size of a trained dictionary (zlib only uses the last 32 KB of it)
+DICT_SIZE = 112 * 1024
+# Variable to hold how many records, drawn from the whole store, a dictionary is trained on
+DICT_SAMPLES = 2000
+# Variable to hold how many records a store needs before the first dictionary is trained (records before it stay uncompressed)
+DICT_MIN_SAMPLES = 256
+# Variable to hold how many times over the store has to grow before a new dictionary is trained for the records after it
+DICT_RETRAIN = 4
+# Variable to hold the compression level of the records
+COMPRESSION_LEVEL = 9
+# Variable to hold the number of processes the query engine decompresses and scans records with
+SCAN_WORKERS = os.cpu_count() or 4
+# Variable to hold the number of records up to which a scan is not worth starting a process pool
+SCAN_INLINE = 64
+# Offset index record: commit hash (as abbreviated by git, NUL padded), segment, offset, length
+RECORD = struct.Struct("<16sIQI")
+# Header of a compressed record: NUL (plain records start with "commit"), codec (b"s" zstd, b"z" zlib), dictionary id (0: none)
+COMPRESSED = struct.Struct("<ccI")
+
+# Variable to hold whether the missing zstandard module was already reported (once per process, not once per record)
+CODEC_WARNED = False
+
+# Open stores (DB path -> {"index": hash -> (segment, offset, length), "read": bytes of the index read, "maps": segment -> mmap, "dicts": id -> (codec, bytes)})
+_STORES = {}
+_LOCK = threading.Lock()
+
+class MissingCodecError(ValueError):
+    pass
+
+def get_pack_dir(db_path):
+    return os.path.join(db_path, PACK_DIR)
+
+def get_segment_path(db_path, segment):
+    return os.path.join(get_pack_dir(db_path), f"seg-{segment:05d}.pack")
+
+def get_legacy_path(db_path, commit_hash):
+    # One plain diff file per commit, the layout of DBs built before the packed store
+    return os.path.join(db_path, f"{commit_hash}.diff")
+
+def _get_store(db_path):
+    return _STORES.setdefault(db_path, {"index": {}, "read": 0, "maps": {}, "dicts": {}})
+
+def _refresh(db_path):
+    # Reads the index records appended since the last call (other processes keep appending)
+    store = _get_store(db_path)
+    index_path = os.path.join(get_pack_dir(db_path), INDEX_FILE)
+    if not os.path.isfile(index_path) or os.path.getsize(index_path) <= store["read"]:
+        return store
+
+    with open(index_path, "rb") as f:
+        f.seek(store["read"])
+        data = f.read()
+    # A record still being written is picked up on the next refresh
+    data = data[:len(data) - len(data) % RECORD.size]
+    for key, segment, offset, length in RECORD.iter_unpack(data):
+        store["index"][key.rstrip(b"\0").decode()] = (segment, offset, length)
+    store["read"] += len(data)
+    return store
+
+def _get_map(store, db_path, segment, end):
+    # Segments only grow, a mapping made before the record was appended is remade
+    m = store["maps"].get(segment)
+    if m is None or len(m) < end:
+        if m is not None:
+            m.close()
+        with open(get_segment_path(db_path, segment), "rb") as f:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        store["maps"][segment] = m
+    return m
+
+def get_dict_path(db_path, dict_id, codec):
+    return os.path.join(get_pack_dir(db_path), f"dict-{dict_id:05d}.{'zstd' if codec == b's' else 'zlib'}")
+
+def _load_dictionary(store, db_path, dict_id):
+    if dict_id not in store["dicts"]:
+        for codec in [b"s", b"z"]:
+            path = get_dict_path(db_path, dict_id, codec)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    data = f.read()
+                if codec == b"s" and zstandard is not None:
+                    data = zstandard.ZstdCompressionDict(data)
+                store["dicts"][dict_id] = (codec, data)
+                break
+        else:
+            raise ValueError(f"Dictionary {dict_id} of the DB is missing")
+    return store["dicts"][dict_id]
+
+def get_dict_trained(db_path, dict_id):
+    # Number of records the store held when the dictionary was trained (0 if unknown, so it is retrained)
+    try:
+        with open(os.path.join(get_pack_dir(db_path), f"dict-{dict_id:05d}.count"), "r") as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def get_dictionary(db_path):
+    # Newest trained dictionary of the DB as (id, codec, data), None before the first one
+    names = [name for name in os.listdir(get_pack_dir(db_path)) if name.startswith("dict-") and not name.endswith(".count")] if os.path.isdir(get_pack_dir(db_path)) else []
+    if not names:
+        return None
+    dict_id = max(int(name[5:10]) for name in names)
+    codec, data = _load_dictionary(_get_store(db_path), db_path, dict_id)
+    return dict_id, codec, data
+
+def _train_zlib(samples, size):
+    # zlib has no trainer, its preset dictionary is the lines most commits share, the most common last
+    # (the closest to the data, so the cheapest to refer to)
+    counts = Counter(line for body in samples for line in set(body.splitlines(keepends=True)))
+    lines, total = [], 0
+    for line, n in counts.most_common():
+        if n < 2 or total + len(line) > min(size, 32 * 1024):
+            break
+        lines.append(line)
+        total += len(line)
+    return b"".join(reversed(lines))
+
+def _sample_bodies(db_path, bodies):
+    # Uniform sample of the records already stored and the ones about to be
+    known = sorted(list_records(db_path))
+    picks = random.sample(range(len(known) + len(bodies)), min(DICT_SAMPLES, len(known) + len(bodies)))
+    samples = []
+    for i in picks:
+        if i >= len(known):
+            samples.append(bodies[i - len(known)])
+            continue
+        diff = read_record(known[i], db_path)
+        if diff is not None:
+            samples.append(diff.encode("utf-8", errors="replace"))
+    return samples, len(known) + len(bodies)
+
+def train_dictionary(db_path, bodies):
+    # Trained on a sample of the repo's own diffs (Change-Id, Reviewed-by, Cr-Commit-Position, build file context...).
+    # Every dictionary gets the next id, the records compressed with an older one keep pointing at it
+    samples, total = _sample_bodies(db_path, bodies)
+    codec, data = b"z", None
+    if zstandard is not None:
+        try:
+            data = zstandard.train_dictionary(DICT_SIZE, samples).as_bytes()
+            codec = b"s"
+        except zstandard.ZstdError:
+            # Too few or too similar samples, zlib's dictionary needs neither
+            data = None
+    if data is None:
+        data = _train_zlib(samples, DICT_SIZE)
+
+    existing = get_dictionary(db_path)
+    dict_id = existing[0] + 1 if existing else 1
+    with open(get_dict_path(db_path, dict_id, codec), "wb") as f:
+        f.write(data)
+    with open(os.path.join(get_pack_dir(db_path), f"dict-{dict_id:05d}.count"), "w") as f:
+        f.write(f"{total}\n")
+    green(f"[+] Trained a {len(data) // 1024} KB {'zstd' if codec == b's' else 'zlib'} dictionary on {len(samples)} commit diffs.")
+    return get_dictionary(db_path)
+
+def compress_record(body, dictionary):
+    if dictionary is None:
+        return body
+    dict_id, codec, data = dictionary
+    if codec == b"s":
+        payload = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL, dict_data=data).compress(body)
+    else:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=data) if data else zlib.compressobj(COMPRESSION_LEVEL)
+        payload = compressor.compress(body) + compressor.flush()
+    return COMPRESSED.pack(b"\0", codec, dict_id) + payload
+
+def _decode(store, db_path, data):
+    # One record in, one record out: only this record is decompressed
+    if not data.startswith(b"\0"):
+        return data
+    _, codec, dict_id = COMPRESSED.unpack_from(data)
+    payload = data[COMPRESSED.size:]
+    dictionary = _load_dictionary(store, db_path, dict_id)[1] if dict_id else None
+
+    if codec == b"s":
+        if zstandard is None:
+            raise MissingCodecError("The DB is compressed with zstd, please install the zstandard module (pip install zstandard)")
+        return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(payload)
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return decompressor.decompress(payload) + decompressor.flush()
+
+def read_record(commit_hash, db_path):
+    # Diff of the commit as `git show` prints it, None if it is not in the DB
+    global CODEC_WARNED
+    with _LOCK:
+        store = _refresh(db_path)
+        entry = store["index"].get(commit_hash)
+        if entry is not None:
+            segment, offset, length = entry
+            try:
+                data = _get_map(store, db_path, segment, offset + length)[offset:offset + length]
+                return _decode(store, db_path, data).decode("utf-8", errors="replace")
+            except MissingCodecError as e:
+                if not CODEC_WARNED:
+                    CODEC_WARNED = True
+                    red(f"[-] {e}")
+                return None
+            except (OSError, ValueError, zlib.error) as e:
+                red(f"[-] Could not read {commit_hash} from the DB: {e}")
+                return None
+
+    try:
+        with open(get_legacy_path(db_path, commit_hash), "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def list_records(db_path):
+    # Every commit hash in the DB, packed or in the legacy layout
+    with _LOCK:
+        hashes = set(_refresh(db_path)["index"])
+    if os.path.isdir(db_path):
+        hashes.update(name[:-len(".diff")] for name in os.listdir(db_path) if name.endswith(".diff"))
+    return hashes
+
+def append_records(records, db_path):
+    # records: iterable of (commit hash, diff text). Segment data is written before its index records,
+    # so a crash never leaves an index entry pointing at missing data
+    pack_dir = get_pack_dir(db_path)
+    os.makedirs(pack_dir, exist_ok=True)
+    written = 0
+
+    bodies = []
+    for commit_hash, diff in records:
+        body = diff.encode("utf-8", errors="replace")
+        bodies.append((commit_hash, body if body.endswith(b"\n") else body + b"\n"))
+
+    with open(os.path.join(pack_dir, "lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            # A dictionary once the store is big enough, and a fresh one each time it grew DICT_RETRAIN times over.
+            # Without the zstandard module a zstd dictionary cannot be used, a zlib one is trained in its place
+            dictionary = get_dictionary(db_path)
+            total = len(list_records(db_path)) + len(bodies)
+            if total >= DICT_MIN_SAMPLES and (
+                dictionary is None
+                or total >= DICT_RETRAIN * get_dict_trained(db_path, dictionary[0])
+                or (dictionary[1] == b"s" and zstandard is None)
+            ):
+                dictionary = train_dictionary(db_path, [body for _, body in bodies])
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # Compressed outside of the lock, other streams keep appending meanwhile
+    bodies = [(commit_hash, compress_record(body, dictionary)) for commit_hash, body in bodies]
+
+    with open(os.path.join(pack_dir, "lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            index_path = os.path.join(pack_dir, INDEX_FILE)
+            with open(index_path, "ab") as index:
+                # Drop a partial record left behind by a writer that was killed
+                size = index.tell()
+                if size % RECORD.size:
+                    index.truncate(size - size % RECORD.size)
+
+                segment = _last_segment(db_path)
+                data = open(get_segment_path(db_path, segment), "ab")
+                try:
+                    for commit_hash, body in bodies:
+                        key = commit_hash.encode()
+                        if len(key) > 16:
+                            raise ValueError(f"Commit hash {commit_hash} is too long for the offset index")
+
+                        if data.tell() and data.tell() + len(body) > SEGMENT_SIZE:
+                            data.close()
+                            segment += 1
+                            data = open(get_segment_path(db_path, segment), "ab")
+
+                        offset = data.tell()
+                        data.write(body)
+                        data.flush()
+                        index.write(RECORD.pack(key, segment, offset, len(body)))
+                        written += 1
+                finally:
+                    data.close()
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+    return written
+
+def _last_segment(db_path):
+    segments = [int(name[4:9]) for name in os.listdir(get_pack_dir(db_path)) if name.startswith("seg-") and name.endswith(".pack")]
+    return max(segments, default=0)
+
+def get_watermark(db_path):
+    try:
+        with open(os.path.join(get_pack_dir(db_path), WATERMARK_FILE), "r") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+def set_watermark(db_path, commit_hash):
+    pack_dir = get_pack_dir(db_path)
+    os.makedirs(pack_dir, exist_ok=True)
+    tmp_path = os.path.join(pack_dir, WATERMARK_FILE + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(commit_hash + "\n")
+    os.replace(tmp_path, os.path.join(pack_dir, WATERMARK_FILE))
+
+def check_store(db_path):
+    # Cheap startup check: whole index records, and the newest one points at data that is there
+    index_path = os.path.join(get_pack_dir(db_path), INDEX_FILE)
+    if not os.path.isfile(index_path):
+        return True
+    size = os.path.getsize(index_path)
+    if size % RECORD.size:
+        return False
+    if size == 0:
+        return True
+    with open(index_path, "rb") as f:
+        f.seek(size - RECORD.size)
+        _, segment, offset, length = RECORD.unpack(f.read(RECORD.size))
+    segment_path = get_segment_path(db_path, segment)
+    return os.path.isfile(segment_path) and os.path.getsize(segment_path) >= offset + length
+
+def repair_store(db_path):
+    # Rewrites the index with the records whose data is complete, the rescan after it ingests the rest again
+    index_path = os.path.join(get_pack_dir(db_path), INDEX_FILE)
+    if not os.path.isfile(index_path):
+        return 0
+    with open(index_path, "rb") as f:
+        data = f.read()
+    data = data[:len(data) - len(data) % RECORD.size]
+
+    sizes = {}
+    kept = []
+    for record in RECORD.iter_unpack(data):
+        _, segment, offset, length = record
+        if segment not in sizes:
+            path = get_segment_path(db_path, segment)
+            sizes[segment] = os.path.getsize(path) if os.path.isfile(path) else -1
+        if offset + length <= sizes[segment]:
+            kept.append(RECORD.pack(*record))
+
+    with open(os.path.join(get_pack_dir(db_path), "lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(index_path + ".tmp", "wb") as f:
+                f.write(b"".join(kept))
+            os.replace(index_path + ".tmp", index_path)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+    with _LOCK:
+        _STORES.pop(db_path, None)
+    dropped = len(data) // RECORD.size - len(kept)
+    yellow(f"[*] Dropped {dropped} damaged records from the DB index.")
+    return dropped
+
+def _scan_records(db_path, entries, pattern, regex=False):
+    # Runs in a pool worker: decompresses its share of the records and looks for pattern in each
+    store = _get_store(db_path)
+    # ^ and $ anchor to every line, as they do for ripgrep on the legacy .diff files
+    matcher = re.compile(pattern, re.MULTILINE).search if regex else (lambda body: pattern in body)
+    hits = []
+    for commit_hash, segment, offset, length in entries:
+        data = _get_map(store, db_path, segment, offset + length)[offset:offset + length]
+        if matcher(_decode(store, db_path, data)):
+            hits.append(commit_hash)
+    return hits
+
+def search_records(pattern, db_path, workers=SCAN_WORKERS, hashes=None, regex=False):
+    # Commits whose packed diff holds the fixed string (or regex) pattern, scanned by a process pool.
+    # hashes limits the scan to the candidates of the trigram index
+    with _LOCK:
+        index = _refresh(db_path)["index"]
+        if hashes is None:
+            entries = [(h,) + entry for h, entry in index.items()]
+        else:
+            entries = [(h,) + index[h] for h in hashes if h in index]
+    entries.sort(key=lambda e: (e[1], e[2]))
+    pattern = pattern.encode("utf-8")
+    if len(entries) <= SCAN_INLINE:
+        return set(_scan_records(db_path, entries, pattern, regex))
+
+    # A few chunks per worker, in segment order so every worker reads its pages sequentially
+    chunk = max(1, -(-len(entries) // (workers * 4)))
+    chunks = [entries[i:i + chunk] for i in range(0, len(entries), chunk)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+        results = executor.map(_scan_records, [db_path] * len(chunks), chunks, [pattern] * len(chunks), [regex] * len(chunks))
+        return {commit_hash for hits in results for commit_hash in hits}
+
+def has_legacy_diffs(db_path):
+    return os.path.isdir(db_path) and any(name.endswith(".diff") for name in os.listdir(db_path))
+
+def pack_legacy_diffs(db_path):
+    # Moves every db/<hash>.diff file into the packed store
+    names = sorted(name for name in os.listdir(db_path) if name.endswith(".diff")) if os.path.isdir(db_path) else []
+    if not names:
+        green("[+] No legacy diff files to pack.")
+        return 0
+
+    yellow(f"[*] Packing {len(names)} legacy diff files...")
+    packed = 0
+    for start in range(0, len(names), 1000):
+        batch = []
+        for name in names[start:start + 1000]:
+            commit_hash = name[:-len(".diff")]
+            with _LOCK:
+                known = commit_hash in _refresh(db_path)["index"]
+            if not known:
+                with open(os.path.join(db_path, name), "r", encoding="utf-8", errors="replace") as f:
+                    batch.append((commit_hash, f.read()))
+        packed += append_records(batch, db_path)
+        # Only removed once the records are in the pack
+        for name in names[start:start + 1000]:
+            os.remove(os.path.join(db_path, name))
+
+    green(f"[+] Packed {packed} legacy diff files into {get_pack_dir(db_path)}")
+    return packed
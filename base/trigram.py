@@ -0,0 +1,346 @@
+import os, re, struct
+import mmap
+import fcntl
+import threading
+from array import array
+from contextlib import contextmanager
+
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    import sre_parse, sre_constants
+
+from base.store import list_records, read_record
+from utils.colors import *
+
+# Variable to hold the directory inside the DB with the trigram index shards
+TRIGRAM_DIR = "trigram"
+# Variable to hold the number of commits below which a shard counts as small (incremental updates write small shards)
+MERGE_DOCS = 1024
+# Variable to hold how many small shards are kept before they are merged into one
+MERGE_SHARDS = 8
+# Variable to hold how many commits a backfill indexes per shard
+BACKFILL_BATCH = 2000
+
+# Shard: header, the commit hashes (local doc id -> hash), the trigram table sorted by trigram, then the posting lists
+HEADER = struct.Struct("<8sII")
+MAGIC = b"VTRIGRM1"
+DOC = struct.Struct("<16s")
+# Trigram table entry: trigram, offset of its posting list (from the start of the shard), number of commits
+ENTRY = struct.Struct("<3sxQI")
+
+# Open shards (path -> {"map": mmap, "docs": n, "trigrams": n, "table": offset of the table})
+_SHARDS = {}
+_LOCK = threading.Lock()
+# Lock guarding shard writes and merges (the ingest streams index from several threads)
+_WRITE_LOCK = threading.Lock()
+
+def get_trigram_dir(db_path):
+    return os.path.join(db_path, TRIGRAM_DIR)
+
+def has_trigrams(db_path):
+    # Written once every stored commit was indexed, a half-built index would hide matches
+    return os.path.isfile(os.path.join(get_trigram_dir(db_path), "ready"))
+
+def _mark_ready(db_path):
+    os.makedirs(get_trigram_dir(db_path), exist_ok=True)
+    with open(os.path.join(get_trigram_dir(db_path), "ready"), "w") as f:
+        f.write("1\n")
+
+def unmark_ready(db_path):
+    # Called before an ingest, candidate_commits() scans everything until backfill_trigrams() has caught up
+    try:
+        os.remove(os.path.join(get_trigram_dir(db_path), "ready"))
+    except FileNotFoundError:
+        pass
+
+@contextmanager
+def _index_lock(db_path):
+    # flock() also serializes other Visect processes updating the same DB
+    os.makedirs(get_trigram_dir(db_path), exist_ok=True)
+    with _WRITE_LOCK, open(os.path.join(get_trigram_dir(db_path), "lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def extract_trigrams(body):
+    # Every distinct line once, the trigrams of a diff are mostly repeated context and boilerplate
+    grams = set()
+    for line in set(body.split(b"\n")):
+        grams.update(line[i:i + 3] for i in range(len(line) - 2))
+    return grams
+
+def _encode_postings(ids):
+    # Ascending local doc ids as varint deltas
+    out = bytearray()
+    last = 0
+    for doc in ids:
+        delta = doc - last
+        last = doc
+        while delta >= 0x80:
+            out.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return out
+
+def _decode_postings(data, offset, count):
+    ids = []
+    last = 0
+    for _ in range(count):
+        delta, shift = 0, 0
+        while True:
+            byte = data[offset]
+            offset += 1
+            delta |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        last += delta
+        ids.append(last)
+    return ids
+
+def _shard_names(db_path):
+    trigram_dir = get_trigram_dir(db_path)
+    if not os.path.isdir(trigram_dir):
+        return []
+    return sorted(name for name in os.listdir(trigram_dir) if name.startswith("tri-") and name.endswith(".idx"))
+
+def _open_shard(path):
+    with _LOCK:
+        if path not in _SHARDS:
+            with open(path, "rb") as f:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, docs, trigrams = HEADER.unpack_from(m)
+            if magic != MAGIC:
+                m.close()
+                raise ValueError(f"{path} is not a trigram index shard")
+            _SHARDS[path] = {"map": m, "docs": docs, "trigrams": trigrams, "table": HEADER.size + docs * DOC.size}
+        return _SHARDS[path]
+
+def _shard_docs(shard):
+    m, start = shard["map"], HEADER.size
+    return [m[start + i * DOC.size:start + (i + 1) * DOC.size].rstrip(b"\0").decode() for i in range(shard["docs"])]
+
+def _lookup(shard, gram):
+    # Binary search of the trigram table, (offset, count) or None
+    m, table = shard["map"], shard["table"]
+    lo, hi = 0, shard["trigrams"]
+    while lo < hi:
+        mid = (lo + hi) // 2
+        key, offset, count = ENTRY.unpack_from(m, table + mid * ENTRY.size)
+        if key < gram:
+            lo = mid + 1
+        elif key > gram:
+            hi = mid
+        else:
+            return offset, count
+    return None
+
+def _write_shard(db_path, hashes, postings):
+    # Called with _index_lock() held
+    grams = sorted(postings)
+    table = bytearray()
+    blob = bytearray()
+    base = HEADER.size + len(hashes) * DOC.size + len(grams) * ENTRY.size
+    for gram in grams:
+        ids = postings[gram]
+        table += ENTRY.pack(gram, base + len(blob), len(ids))
+        blob += _encode_postings(ids)
+
+    names = _shard_names(db_path)
+    shard_id = int(names[-1][4:9]) + 1 if names else 1
+    path = os.path.join(get_trigram_dir(db_path), f"tri-{shard_id:05d}.idx")
+    # Written aside and renamed, a query never sees half a shard
+    with open(path + ".tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(hashes), len(grams)))
+        f.write(b"".join(DOC.pack(h.encode()) for h in hashes))
+        f.write(table)
+        f.write(blob)
+    os.replace(path + ".tmp", path)
+    return path
+
+def index_trigrams(records, db_path):
+    # records: iterable of (commit hash, diff text), called by the ingest right after they are stored
+    hashes = []
+    postings = {}
+    for commit_hash, diff_content in records:
+        doc = len(hashes)
+        hashes.append(commit_hash)
+        for gram in extract_trigrams(diff_content.encode("utf-8", errors="replace")):
+            ids = postings.get(gram)
+            if ids is None:
+                ids = postings[gram] = array("I")
+            ids.append(doc)
+    if not hashes:
+        return 0
+
+    with _index_lock(db_path):
+        _write_shard(db_path, hashes, postings)
+        _merge_small_shards(db_path)
+    return len(hashes)
+
+def _merge_small_shards(db_path):
+    # Tiered like an LSM tree: many incremental updates leave many small shards, they are merged into one.
+    # Called with _index_lock() held
+    trigram_dir = get_trigram_dir(db_path)
+    small = [name for name in _shard_names(db_path) if _open_shard(os.path.join(trigram_dir, name))["docs"] < MERGE_DOCS]
+    if len(small) <= MERGE_SHARDS:
+        return 0
+
+    hashes = []
+    postings = {}
+    # Shards are merged in name order, so the ids of every posting list stay ascending
+    for name in small:
+        shard = _open_shard(os.path.join(trigram_dir, name))
+        base = len(hashes)
+        hashes.extend(_shard_docs(shard))
+        m = shard["map"]
+        for i in range(shard["trigrams"]):
+            gram, offset, count = ENTRY.unpack_from(m, shard["table"] + i * ENTRY.size)
+            ids = postings.get(gram)
+            if ids is None:
+                ids = postings[gram] = array("I")
+            ids.extend(base + doc for doc in _decode_postings(m, offset, count))
+
+    _write_shard(db_path, hashes, postings)
+    for name in small:
+        path = os.path.join(trigram_dir, name)
+        with _LOCK:
+            shard = _SHARDS.pop(path, None)
+        if shard:
+            shard["map"].close()
+        os.remove(path)
+    return len(small)
+
+def indexed_commits(db_path):
+    hashes = set()
+    for name in _shard_names(db_path):
+        hashes.update(_shard_docs(_open_shard(os.path.join(get_trigram_dir(db_path), name))))
+    return hashes
+
+def backfill_trigrams(db_path):
+    # Indexes the commits of a DB built before the trigram index (or whose ingest died between store and index)
+    missing = sorted(list_records(db_path) - indexed_commits(db_path))
+    if not missing:
+        _mark_ready(db_path)
+        return 0
+
+    yellow(f"[*] Building the trigram index of {len(missing)} commits...")
+    for start in range(0, len(missing), BACKFILL_BATCH):
+        batch = []
+        for commit_hash in missing[start:start + BACKFILL_BATCH]:
+            diff_content = read_record(commit_hash, db_path)
+            if diff_content is not None:
+                batch.append((commit_hash, diff_content))
+        index_trigrams(batch, db_path)
+    _mark_ready(db_path)
+    green(f"[+] Indexed the trigrams of {len(missing)} commits.")
+    return len(missing)
+
+def _regex_query(parsed):
+    # Literals every match must contain: ("and", [...]), ("or", [...]) or ("lit", bytes), None when nothing is required
+    items = []
+    run = bytearray()
+
+    def flush():
+        if len(run) >= 3:
+            items.append(("lit", bytes(run)))
+        run.clear()
+
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            run.append(av)
+            continue
+        flush()
+        if op is sre_constants.SUBPATTERN:
+            _, add_flags, _, sub = av
+            if not add_flags & re.IGNORECASE:
+                items.append(_regex_query(sub))
+        elif op in [sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, getattr(sre_constants, "POSSESSIVE_REPEAT", None)]:
+            low, _, sub = av
+            if low >= 1:
+                items.append(_regex_query(sub))
+        elif op is getattr(sre_constants, "ATOMIC_GROUP", None):
+            items.append(_regex_query(av))
+        elif op is sre_constants.BRANCH:
+            branches = [_regex_query(branch) for branch in av[1]]
+            if all(branches):
+                items.append(("or", branches))
+    flush()
+
+    items = [item for item in items if item]
+    if not items:
+        return None
+    return items[0] if len(items) == 1 else ("and", items)
+
+def build_query(pattern, regex=False):
+    if not regex:
+        return ("lit", pattern.encode("utf-8"))
+    try:
+        parsed = sre_parse.parse(pattern.encode("utf-8"))
+    except re.error:
+        return None
+    state = getattr(parsed, "state", None) or parsed.pattern
+    if state.flags & re.IGNORECASE:
+        return None
+    return _regex_query(parsed)
+
+def _evaluate(node, shard):
+    # Local doc ids of the shard which may match, None for "every doc"
+    kind, value = node
+    if kind == "lit":
+        grams = set()
+        for piece in value.split(b"\n"):
+            grams.update(piece[i:i + 3] for i in range(len(piece) - 2))
+        if not grams:
+            return None
+        entries = []
+        for gram in grams:
+            entry = _lookup(shard, gram)
+            if entry is None:
+                return set()
+            entries.append(entry)
+        # Shortest posting list first, the intersection only shrinks
+        result = None
+        for offset, count in sorted(entries, key=lambda e: e[1]):
+            ids = _decode_postings(shard["map"], offset, count)
+            result = set(ids) if result is None else result.intersection(ids)
+            if not result:
+                break
+        return result
+
+    results = [_evaluate(child, shard) for child in value]
+    if kind == "and":
+        known = [r for r in results if r is not None]
+        if not known:
+            return None
+        return set.intersection(*known)
+    if any(r is None for r in results):
+        return None
+    return set().union(*results)
+
+def candidate_commits(pattern, db_path, regex=False):
+    # Commits which may hold a match, None when the index cannot narrow it down (the caller scans everything)
+    if not has_trigrams(db_path):
+        return None
+    query = build_query(pattern, regex)
+    if query is None:
+        return None
+
+    candidates = set()
+    for name in _shard_names(db_path):
+        try:
+            shard = _open_shard(os.path.join(get_trigram_dir(db_path), name))
+        except (OSError, ValueError):
+            # Merged away in the meantime, its commits are in the merged shard
+            continue
+        ids = _evaluate(query, shard)
+        if ids is None:
+            return None
+        if ids:
+            docs = _shard_docs(shard)
+            candidates.update(docs[i] for i in ids)
+    return candidates
@@ -1,5 +1,9 @@
 
-import os, re
+import re
+import hashlib
+
+from base.store import read_record
+from base.meta import get_commit_meta, get_commit_paths
 
 def get_gn_args(target_cpu: str, is_debug: bool) -> str:
     if is_debug:
@@ -27,13 +31,13 @@ def get_gn_args(target_cpu: str, is_debug: bool) -> str:
         """
 
 def get_cr_commit_position_and_date(commit_hash, db_path):
-    diff_file_path = os.path.join(db_path, f"{commit_hash}.diff")
-    
-    try:
-        with open(diff_file_path, 'r', encoding='utf-8') as f:
-            diff_content = f.read()
-    except Exception as e:
-        # red(f"Failed to read diff file: {e}")
+    # One indexed lookup, the diff is only read for commits the metadata index does not have
+    meta = get_commit_meta(commit_hash, db_path)
+    if meta is not None:
+        return meta["position"] if meta["position"] is not None else "Not Found", meta["date"] or "Not Found"
+
+    diff_content = read_record(commit_hash, db_path)
+    if diff_content is None:
         return None, None
 
     # Extract Cr-Commit-Position
@@ -45,3 +49,28 @@ def get_cr_commit_position_and_date(commit_hash, db_path):
     commit_datetime_str = date_match.group(1).strip() if date_match else "Not Found"
 
     return cr_commit_position, commit_datetime_str
+
+def get_file_hash(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def get_commit_diff(commit_hash, db_path):
+    return read_record(commit_hash, db_path)
+
+def get_touched_paths(commit_hash, db_path, diff_content=None):
+    # Paths changed by the commit, None if its diff is not in the DB
+    if diff_content is None:
+        paths = get_commit_paths(commit_hash, db_path)
+        if paths is not None:
+            return paths
+        diff_content = get_commit_diff(commit_hash, db_path)
+    if diff_content is None:
+        return None
+
+    paths = set()
+    for match in re.finditer(r'^diff --git a/(\S+) b/(\S+)$|^diff --cc (\S+)$', diff_content, re.MULTILINE):
+        paths.update(path for path in match.groups() if path)
+    return paths
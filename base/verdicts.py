@@ -0,0 +1,108 @@
+import os, json, csv
+import threading
+import fcntl
+from time import time
+
+from utils.colors import *
+
+# Variable to hold the append-only store of every PoC outcome observed on a build (one JSON record per line)
+VERDICT_STORE = "testarea/verdicts.jsonl"
+# Variable to hold the records read from VERDICT_STORE so far (store key -> record)
+KNOWN_VERDICTS = {}
+# Variable to hold the verdict store statistics of the current session
+VERDICT_STATS = {"hits": 0, "stored": 0}
+
+# Byte offset up to which VERDICT_STORE has been read (other bisects keep appending to it)
+_OFFSET = 0
+_LOCK = threading.Lock()
+
+def normalize_flags(flags):
+    # The flags exactly as d8 gets them (custom_args.split()), flag order is kept, later flags override earlier ones
+    return " ".join((flags or "").split())
+
+def verdict_key(build, poc_hash, flags):
+    # build is the build cache key, it already holds the (OS, TARGET, revision) triple
+    return f"{build}|{poc_hash}|{normalize_flags(flags)}"
+
+def _refresh():
+    global _OFFSET
+    if not os.path.isfile(VERDICT_STORE):
+        return
+
+    with open(VERDICT_STORE, "r") as f:
+        fcntl.flock(f, fcntl.LOCK_SH)
+        try:
+            f.seek(_OFFSET)
+            for line in f:
+                if not line.endswith("\n"):
+                    # Record still being written, pick it up on the next refresh
+                    break
+                _OFFSET += len(line.encode())
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                KNOWN_VERDICTS[record["key"]] = record
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def lookup_verdict(build, poc_hash, flags, trials=1, run_timeout=None):
+    with _LOCK:
+        _refresh()
+        record = KNOWN_VERDICTS.get(verdict_key(build, poc_hash, flags))
+
+    if record is None:
+        return None
+    # A single run does not settle a revision that is now being tested for flakiness
+    if record["trials"] < trials:
+        return None
+    # A timeout under a shorter limit says nothing about a longer one
+    if record["outcome"] == "TIMEOUT" and run_timeout and run_timeout > record["run_timeout"]:
+        return None
+
+    VERDICT_STATS["hits"] += 1
+    return record
+
+def store_verdict(build, poc_hash, flags, outcome, trials=1, crash_rate=None, runtime=None, run_timeout=None, poc=None):
+    record = {
+        "key": verdict_key(build, poc_hash, flags),
+        "build": build,
+        "poc": poc,
+        "poc_sha256": poc_hash,
+        "flags": normalize_flags(flags),
+        "outcome": outcome,
+        "trials": trials,
+        "crash_rate": crash_rate,
+        "runtime": runtime,
+        "run_timeout": run_timeout,
+        "time": time()
+    }
+
+    with _LOCK:
+        os.makedirs(os.path.dirname(VERDICT_STORE), exist_ok=True)
+        with open(VERDICT_STORE, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.write(json.dumps(record) + "\n")
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        KNOWN_VERDICTS[record["key"]] = record
+        VERDICT_STATS["stored"] += 1
+
+def export_verdicts(out_path):
+    with _LOCK:
+        _refresh()
+        records = sorted(KNOWN_VERDICTS.values(), key=lambda r: (r["poc_sha256"], r["flags"], r["build"]))
+
+    columns = ["build", "poc", "poc_sha256", "flags", "outcome", "trials", "crash_rate", "runtime", "run_timeout", "time"]
+    with open(out_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(records)
+
+    green(f"[+] Exported {len(records)} verdicts to {out_path}")
+    return len(records)
+
+def print_verdict_stats():
+    if VERDICT_STATS["hits"] or VERDICT_STATS["stored"]:
+        cyan(f"[*] Verdict Store: {VERDICT_STATS['hits']} verdicts reused, {VERDICT_STATS['stored']} new verdicts stored")
@@ -0,0 +1,119 @@
+import json
+
+import pytest
+
+import base.batch as batch
+
+BAD = "23996db34af"
+
+
+@pytest.fixture
+def poc(tmp_path):
+    path = tmp_path / "poc.js"
+    path.write_text("print(1);\n")
+    return str(path)
+
+
+@pytest.fixture
+def fake_bisect(tmp_path, monkeypatch):
+    # Every commit exists, every bisect finds the commit after BAD
+    calls = []
+
+    def run_bisect(v8_path, db_path, os_name, poc_path, target, bad_commit, custom_args, **kwargs):
+        calls.append((poc_path, target, bad_commit, custom_args, kwargs))
+        if custom_args == "--jitless":
+            raise ValueError("no build")
+        return {"bad_commit": bad_commit, "revision": 100000}
+
+    monkeypatch.setattr(batch, "BATCH_DIR", str(tmp_path / "batch"))
+    monkeypatch.setattr(batch, "is_commit_in_log", lambda commit_hash, v8_path: commit_hash != "fffffffffff")
+    monkeypatch.setattr(batch, "load_commit_index", lambda db_path, v8_path: None)
+    monkeypatch.setattr(batch.bisect, "run_bisect", run_bisect)
+    return calls
+
+
+def write_jobs(tmp_path, lines):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_load_jobs(tmp_path, poc):
+    job_file = write_jobs(tmp_path, [
+        "# a comment",
+        json.dumps({"poc": poc, "flags": "--allow-natives-syntax", "target": "release", "bad": BAD}),
+        "",
+        "{not json",
+        json.dumps({"id": "matrix", "poc": poc, "flag_sets": ["--future", "--jitless"], "target": "debug", "bad": BAD}),
+    ])
+    jobs = batch.load_jobs(job_file)
+
+    assert [job["id"] for job in jobs] == ["job2", "matrix"]
+    # A flag matrix job becomes a multi-PoC job of the same PoC
+    assert jobs[1]["pocs"] == [
+        {"poc": poc, "flags": "--future", "name": "#1"},
+        {"poc": poc, "flags": "--jitless", "name": "#2"},
+    ]
+
+
+@pytest.mark.parametrize("change,error", [
+    ({}, None),
+    ({"poc": "missing.js"}, "PoC missing.js does not exist"),
+    ({"flags": ""}, "Missing field 'flags'"),
+    ({"flags": "--no-such-flag"}, "Invalid flags --no-such-flag"),
+    ({"target": None}, "Missing field 'target'"),
+    ({"target": "asan"}, "Invalid target asan"),
+    ({"strategy": "linear"}, "Invalid strategy linear"),
+    ({"bad": "fffffffffff"}, "BAD commit fffffffffff not found"),
+    ({"good": "fffffffffff"}, "GOOD commit fffffffffff not found"),
+    ({"pocs": []}, "Empty 'pocs' list"),
+])
+def test_check_job(poc, fake_bisect, change, error):
+    job = {"poc": poc, "flags": "--allow-natives-syntax", "target": "release", "bad": BAD}
+    job.update(change)
+    assert batch.check_job(job, "v8") == error
+
+
+def test_run_job(poc, fake_bisect):
+    job = {"id": "one", "poc": poc, "flags": "--allow-natives-syntax", "target": "release", "bad": BAD + "0123", "trials": "3"}
+    result = batch.run_job(job, "v8", "db", "x64")
+
+    assert result["status"] == "ok"
+    assert result["bad_commit"] == BAD
+    assert result["flags"] == "--allow-natives-syntax"
+    _, _, bad_commit, _, kwargs = fake_bisect[0]
+    # Hashes are cut to the 11 characters of the DB, numbers arrive as numbers
+    assert bad_commit == BAD
+    assert kwargs["trials"] == 3
+    assert kwargs["strategy"] == "binary"
+
+
+def test_run_job_reports_an_invalid_job(poc, fake_bisect):
+    result = batch.run_job({"id": "bad", "poc": poc, "flags": "--allow-natives-syntax", "target": "asan", "bad": BAD}, "v8", "db", "x64")
+    assert result["status"] == "failed"
+    assert result["error"] == "Invalid target asan"
+    assert fake_bisect == []
+
+
+def test_run_batch_writes_json_lines(tmp_path, poc, fake_bisect):
+    job_file = write_jobs(tmp_path, [
+        json.dumps({"id": "ok", "poc": poc, "flags": "--allow-natives-syntax", "target": "release", "bad": BAD}),
+        json.dumps({"id": "broken", "poc": poc, "flags": "--jitless", "target": "release", "bad": BAD}),
+    ])
+    results = batch.run_batch(job_file, "v8", "db", "x64", jobs=2)
+
+    out_path = str(tmp_path / "jobs.results.jsonl")
+    with open(out_path) as f:
+        lines = [json.loads(line) for line in f]
+    assert sorted(r["id"] for r in lines) == ["broken", "ok"]
+    assert lines == results
+
+    by_id = {r["id"]: r for r in lines}
+    assert by_id["ok"]["status"] == "ok"
+    assert by_id["ok"]["bad_commit"] == BAD
+    assert by_id["broken"]["status"] == "failed"
+    assert by_id["broken"]["error"] == "no build"
+    # Results are appended, a second run keeps the first one
+    batch.run_batch(job_file, "v8", "db", "x64", jobs=1)
+    with open(out_path) as f:
+        assert len(f.readlines()) == 4
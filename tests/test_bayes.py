@@ -0,0 +1,169 @@
+import random
+
+import pytest
+
+import base.bayes as bayes
+
+ASAN_OUTPUT = """==1234==ERROR: AddressSanitizer: heap-buffer-overflow on address 0x602000000010
+    #0 0x5581c8 in __asan_memcpy
+    #1 0x5581d0 in v8::internal::compiler::JSCallReducer::ReduceArrayMap(v8::internal::compiler::Node*) ../../src/compiler/js-call-reducer.cc:120:3
+    #2 0x5581e0 in v8::internal::compiler::JSCallReducer::Reduce<int>(v8::internal::compiler::Node*) ../../src/compiler/js-call-reducer.cc:40:5
+    #3 0x5581f0 in v8::internal::compiler::GraphReducer::ReduceNode(v8::internal::compiler::Node*) ../../src/compiler/graph-reducer.cc:88:1
+    #4 0x558200 in main ../../src/d8/d8.cc:10:1
+"""
+
+
+def brute_expected_entropy(posterior, t, noise):
+    # Expected entropy after testing t, straight from update_posterior()
+    p_bad = sum(p * ((1 - noise) if t <= c else noise) for c, p in enumerate(posterior))
+    result = 0.0
+    for bad, weight in [(True, p_bad), (False, 1 - p_bad)]:
+        if weight > 0:
+            result += weight * bayes.entropy(bayes.update_posterior(posterior, t, bad, noise))
+    return result
+
+
+def test_parse_crash_frames():
+    files, functions = bayes.parse_crash_frames(ASAN_OUTPUT)
+    # Sanitizer and main frames are skipped, the rest are weighted by rank from the top
+    assert functions == {"ReduceArrayMap": 1.0, "Reduce": 0.5, "ReduceNode": 1 / 3}
+    assert files == {"src/compiler/js-call-reducer.cc": 1.0, "src/compiler/graph-reducer.cc": 1 / 3}
+
+
+def test_parse_fatal_error_line():
+    files, functions = bayes.parse_crash_frames("#\n# Fatal error in ../../src/objects/map.h, line 12\n# Check failed: x.\n")
+    assert files == {"src/objects/map.h": 1.0}
+    assert functions == {}
+
+
+def test_function_name():
+    assert bayes._function_name("v8::internal::Foo<Bar<int>>::Baz<X>(int)") == "Baz"
+
+
+def test_score_commit():
+    files, functions = bayes.parse_crash_frames(ASAN_OUTPUT)
+    unrelated = bayes.score_commit(["src/heap/heap.cc"], "", files, functions)
+    same_name = bayes.score_commit(["src/other/js-call-reducer.cc"], "", files, functions)
+    same_file = bayes.score_commit(["src/compiler/js-call-reducer.cc"], "", files, functions)
+    assert unrelated == bayes.BASE_PRIOR
+    assert unrelated < same_name < same_file
+
+    diff = "@@ -1,3 +1,3 @@ Reduction JSCallReducer::ReduceArrayMap(Node* node) {\n-  old();\n+  new();\n"
+    assert bayes.score_commit(["src/heap/heap.cc"], diff, files, functions) == bayes.BASE_PRIOR + bayes.FUNCTION_WEIGHT
+    # Context lines do not count
+    assert bayes.score_commit(["src/heap/heap.cc"], " ReduceArrayMap();\n", files, functions) == bayes.BASE_PRIOR
+
+
+def test_normalize():
+    assert bayes.normalize([1, 3]) == [0.25, 0.75]
+    assert bayes.normalize([0, 0]) == [0.5, 0.5]
+
+
+def test_update_posterior_without_noise():
+    uniform = [0.25] * 4
+    # A crash at t means the culprit is at t or further behind
+    assert bayes.update_posterior(uniform, 2, True, noise=0) == [0, 0, 0.5, 0.5]
+    assert bayes.update_posterior(uniform, 2, False, noise=0) == [0.5, 0.5, 0, 0]
+
+
+def test_update_posterior_with_noise():
+    posterior = bayes.update_posterior([0.25] * 4, 2, True, noise=0.1)
+    assert sum(posterior) == pytest.approx(1)
+    assert posterior[0] == pytest.approx(0.05)
+    assert posterior[3] == pytest.approx(0.45)
+
+
+def test_entropy():
+    assert bayes.entropy([1 / 8] * 8) == pytest.approx(3)
+    assert bayes.entropy([1, 0, 0]) == 0
+
+
+@pytest.mark.parametrize("noise", [0, 0.05, 0.2])
+def test_expected_entropies_match_brute_force(noise):
+    rng = random.Random(7)
+    posterior = bayes.normalize([rng.random() for _ in range(40)])
+    expected = bayes.expected_entropies(posterior, noise)
+    for t in range(len(posterior)):
+        assert expected[t] == pytest.approx(brute_expected_entropy(posterior, t, noise), abs=1e-9)
+
+
+def test_best_test_point_is_the_midpoint_of_a_uniform_posterior():
+    t, gain = bayes.best_test_point([1 / 16] * 16, list(range(1, 16)), noise=0)
+    assert t == 8
+    assert gain == pytest.approx(1)
+
+
+def test_best_test_point_follows_the_probability_mass():
+    posterior = bayes.normalize([1] * 10 + [30] + [1] * 10)
+    t, _ = bayes.best_test_point(posterior, list(range(1, 21)))
+    assert t in [10, 11]
+    assert bayes.best_test_point(posterior, []) == (None, 0.0)
+
+
+def test_quantile_points():
+    assert bayes.quantile_points([0.25] * 4, [1, 2, 3], 1) == [2]
+    assert bayes.quantile_points([0.25] * 4, [1, 2, 3], 3) == [1, 2, 3]
+    # Never more points than testable offsets
+    assert bayes.quantile_points([0.25] * 4, [2], 3) == [2]
+
+
+def run_passes(prior, culprit, buildable=None, k=1):
+    # The pass loop of bisect.bayes_bisect_window() against a PoC which crashes from `culprit` on
+    tested = {}
+    while True:
+        posterior = prior
+        for t, verdict in tested.items():
+            posterior = bayes.update_posterior(posterior, t, verdict == "bad")
+        testable = [o for o in range(1, len(prior)) if o not in tested and (buildable is None or o in buildable)]
+        found, good, bracketed = bayes.bracket(posterior, tested, testable)
+        if bracketed:
+            return found, tested, True
+        points = bayes.next_test_points(posterior, found, good, testable, k)
+        if not points:
+            return found, tested, False
+        for t in points:
+            tested[t] = "bad" if t <= culprit else "good"
+
+
+def test_a_confident_prior_is_not_a_result():
+    # The middle commit touches the crash stack file, nothing is tested yet
+    posterior = bayes.normalize([1, 62, 1])
+    assert posterior[1] >= bayes.CONFIDENCE
+    culprit, good, bracketed = bayes.bracket(posterior, {}, [1, 2])
+    assert (culprit, good, bracketed) == (1, 3, False)
+    # The culprit is tested first, then the commit right behind it
+    assert bayes.next_test_points(posterior, culprit, good, [1, 2]) == [1]
+    posterior = bayes.update_posterior(posterior, 1, True)
+    assert bayes.next_test_points(posterior, 1, 3, [2]) == [2]
+    posterior = bayes.update_posterior(posterior, 2, False)
+    assert bayes.bracket(posterior, {1: "bad", 2: "good"}, []) == (1, 2, True)
+
+
+def test_bracket():
+    uniform = [0.25] * 4
+    # BAD_COMMIT itself needs no test, the commit behind it does
+    assert bayes.bracket([0.7, 0.1, 0.1, 0.1], {}, [1, 2, 3]) == (0, 4, False)
+    assert bayes.bracket([0.7, 0.1, 0.1, 0.1], {1: "good"}, [2, 3]) == (0, 1, True)
+    # A commit without a build between the culprit and the clean commit leaves it bracketed
+    assert bayes.bracket(bayes.update_posterior(uniform, 2, False), {1: "bad", 2: "good"}, [3])[2]
+    assert not bayes.bracket(uniform, {1: "bad"}, [2, 3])[2]
+
+
+@pytest.mark.parametrize("k", [1, 3])
+@pytest.mark.parametrize("culprit", [0, 3, 7, 15])
+def test_passes_only_stop_on_a_bracketed_culprit(culprit, k):
+    # A strong prior on the wrong commit still ends on the real culprit, with a clean commit right behind it
+    prior = bayes.normalize([200 if c == 9 else 1 for c in range(16)])
+    found, tested, bracketed = run_passes(prior, culprit, k=k)
+    assert bracketed
+    assert found == culprit
+    assert found == 0 or tested[found] == "bad"
+    assert tested.get(found + 1, "good") == "good"
+
+
+def test_passes_without_builds_around_the_culprit_are_not_bracketed():
+    prior = bayes.normalize([1, 62, 1, 1])
+    found, tested, bracketed = run_passes(prior, 1, buildable={3})
+    assert found == 1
+    assert not bracketed
+    assert 1 not in tested
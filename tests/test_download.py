@@ -0,0 +1,144 @@
+import io
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import utils.download as download
+
+BODY = os.urandom(300 * 1024)
+
+
+class Handler(BaseHTTPRequestHandler):
+    # /flaky drops the connection halfway through the first GET, /busy always answers 503,
+    # /nohead answers HEAD with 405 and GET with 503
+    drops = {}
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _range(self):
+        header = self.headers.get("Range")
+        if not header:
+            return 0, len(BODY) - 1
+        start, end = header[len("bytes="):].split("-")
+        return int(start), int(end) if end else len(BODY) - 1
+
+    def do_HEAD(self):
+        Handler.requests.append(("HEAD", self.path, None))
+        if self.path == "/nohead":
+            self.send_response(405)
+            self.end_headers()
+            return
+        if self.path == "/busy":
+            self.send_response(503)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+    def do_GET(self):
+        Handler.requests.append(("GET", self.path, self.headers.get("Range")))
+        if self.path in ["/busy", "/nohead"]:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = self._range()
+        data = BODY[start:end + 1]
+        self.send_response(206 if self.headers.get("Range") else 200)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Accept-Ranges", "bytes")
+        if self.headers.get("Range"):
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(BODY)}")
+        self.end_headers()
+
+        if self.path == "/flaky" and not Handler.drops.get(self.path):
+            # Half the body, then the connection goes away
+            Handler.drops[self.path] = True
+            self.wfile.write(data[:len(data) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(data)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    Handler.drops = {}
+    Handler.requests = []
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    # No waiting between resumes and retries
+    monkeypatch.setattr(download, "sleep", lambda seconds: None)
+    monkeypatch.setattr(download.Retry, "sleep", lambda self, response=None: None)
+    monkeypatch.setattr(download, "SESSION", None)
+
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_stream_download(server):
+    out = io.BytesIO()
+    stats = download.download_to_file(f"{server}/ok", out)
+    assert out.getvalue() == BODY
+    assert stats["bytes"] == len(BODY)
+    assert stats["ranges"] == 1
+    assert stats["resumes"] == 0
+
+
+def test_stream_download_resumes_with_range(server, monkeypatch):
+    # Chunks smaller than what arrives before the drop, so some of the body is kept
+    monkeypatch.setattr(download, "CHUNK_SIZE", 16 * 1024)
+    out = io.BytesIO()
+    stats = download.download_to_file(f"{server}/flaky", out)
+    assert out.getvalue() == BODY
+    assert stats["resumes"] == 1
+    # The second GET only asks for what is still missing
+    gets = [r for r in Handler.requests if r[0] == "GET"]
+    assert gets[0][2] is None
+    resumed_at = int(gets[1][2][len("bytes="):-1])
+    assert 0 < resumed_at <= len(BODY) // 2
+
+
+def test_ranged_download(server, monkeypatch):
+    monkeypatch.setattr(download, "RANGE_THRESHOLD", 64 * 1024)
+    out = io.BytesIO()
+    progress = []
+    stats = download.download_to_file(f"{server}/ok", out, progress=progress.append)
+    assert out.getvalue() == BODY
+    assert stats["ranges"] == download.RANGE_PARTS
+    assert sum(progress) == len(BODY)
+    ranges = sorted(r[2] for r in Handler.requests if r[0] == "GET")
+    assert len(ranges) == download.RANGE_PARTS
+
+
+def test_ranged_download_resumes(server, monkeypatch):
+    monkeypatch.setattr(download, "RANGE_THRESHOLD", 64 * 1024)
+    out = io.BytesIO()
+    stats = download.download_to_file(f"{server}/flaky", out)
+    assert out.getvalue() == BODY
+    assert stats["resumes"] == 1
+
+
+def test_persistent_server_error_on_probe(server):
+    with pytest.raises(download.DownloadError) as e:
+        download.download_to_file(f"{server}/busy", io.BytesIO())
+    assert e.value.status_code == 503
+    # Retried before giving up
+    assert len([r for r in Handler.requests if r[0] == "HEAD"]) > 1
+
+
+def test_persistent_server_error_on_get(server):
+    with pytest.raises(download.DownloadError) as e:
+        download.download_to_file(f"{server}/nohead", io.BytesIO())
+    assert e.value.status_code == 503
+    assert len([r for r in Handler.requests if r[0] == "GET"]) > 1
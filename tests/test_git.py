@@ -0,0 +1,57 @@
+import subprocess
+
+import pytest
+
+import utils.git as git
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    # Five commits on a linear history, newest first in the index
+    path = tmp_path / "v8"
+    path.mkdir()
+
+    def run(*args):
+        return subprocess.run(["git", *args], cwd=path, check=True, capture_output=True, text=True).stdout.strip()
+
+    run("init", "-q")
+    for i in range(5):
+        (path / "file").write_text(f"{i}\n")
+        run("add", "file")
+        run("-c", "user.name=Dev", "-c", "user.email=dev@example.com", "commit", "-q", "-m", f"c{i}")
+    full = run("log", "--first-parent", "--pretty=format:%H").splitlines()
+
+    monkeypatch.setattr(git, "COMMIT_INDEX", None)
+    monkeypatch.setattr(git, "COMMIT_POSITIONS", None)
+    assert git.load_commit_index(str(tmp_path / "db"), str(path))
+    return full
+
+
+def test_commit_positions(repo):
+    short = git.COMMIT_INDEX
+    assert len(short) == 5
+    assert git.get_commit_position(short[2]) == 2
+    # Full and shorter hashes resolve to the same commit
+    assert git.get_commit_position(repo[3]) == 3
+    assert git.get_commit_position(repo[4][:8]) == 4
+    assert git.get_commits_behind(repo[1]) == 3
+    assert git.get_distance(repo[4], repo[0], "unused") == 4
+    assert git.get_commit(repo[0], 2, "unused") == short[2]
+
+
+def test_misses_are_remembered(repo, monkeypatch):
+    calls = []
+    find = git._find_commit_position
+    monkeypatch.setattr(git, "_find_commit_position", lambda commit_hash: calls.append(commit_hash) or find(commit_hash))
+
+    for _ in range(3):
+        assert git.get_commit_position("f" * 40) is None
+        assert git.get_commit_position(repo[1]) == 1
+    assert calls == ["f" * 40, repo[1]]
+
+
+def test_reloading_the_index_forgets_the_lookups(repo, tmp_path):
+    assert git.get_commit_position("f" * 11) is None
+    assert git.COMMIT_LOOKUPS
+    git.load_commit_index(str(tmp_path / "db"), str(tmp_path / "v8"))
+    assert git.COMMIT_LOOKUPS == {}
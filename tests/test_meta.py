@@ -0,0 +1,150 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import base.meta as meta
+import base.store as store
+
+DIFF = """commit 0123456789abcdef0123456789abcdef01234567
+Author: Jane Dev <jane@example.com>
+Date:   Tue Mar 5 14:07:09 2024 +0100
+
+    [turbofan] Fix the typing of Foo
+
+    Change-Id: I0123456789abcdef0123456789abcdef01234567
+    Cr-Commit-Position: refs/heads/main@{#92345}
+
+diff --git a/src/compiler/typer.cc b/src/compiler/typer.cc
+index 1111111..2222222 100644
+--- a/src/compiler/typer.cc
++++ b/src/compiler/typer.cc
+@@ -1,3 +1,3 @@
+-old
++new
+diff --git a/test/mjsunit/regress/regress-1.js b/test/mjsunit/regress/regress-1.js
+new file mode 100644
+"""
+
+MERGE = """commit 89abcdef0123456789abcdef0123456789abcdef
+Merge: 1111111 2222222
+Author: Jane Dev <jane@example.com>
+Date:   Wed Mar 6 10:00:00 2024 +0000
+
+    Merge branch
+
+diff --cc src/api/api.cc
+"""
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "db")
+
+
+def test_parse_metadata():
+    parsed = meta.parse_metadata(DIFF)
+    assert parsed["full_hash"] == "0123456789abcdef0123456789abcdef01234567"
+    assert parsed["position"] == 92345
+    assert parsed["date"] == "Tue Mar 5 14:07:09 2024 +0100"
+    assert parsed["timestamp"] == 1709644029
+    assert parsed["author"] == "Jane Dev <jane@example.com>"
+    assert parsed["paths"] == {"src/compiler/typer.cc", "test/mjsunit/regress/regress-1.js"}
+
+
+def test_parse_metadata_of_a_merge():
+    parsed = meta.parse_metadata(MERGE)
+    assert parsed["position"] is None
+    assert parsed["paths"] == {"src/api/api.cc"}
+
+
+def test_parse_metadata_of_a_malformed_date():
+    parsed = meta.parse_metadata(DIFF.replace("Tue Mar 5 14:07:09 2024 +0100", "yesterday"))
+    assert parsed["date"] == "yesterday"
+    assert parsed["timestamp"] is None
+
+
+def test_lookups(db):
+    assert not meta.has_meta(db)
+    assert meta.get_commit_meta("0123456789a", db) is None
+    assert meta.get_commits_meta(["0123456789a"], db) == {}
+
+    assert meta.index_records([("0123456789a", DIFF), ("89abcdef012", MERGE)], db) == 2
+    assert meta.has_meta(db)
+
+    row = meta.get_commit_meta("0123456789a", db)
+    assert row["position"] == 92345
+    assert row["timestamp"] == 1709644029
+    assert meta.get_commit_meta("fffffffffff", db) is None
+
+    assert meta.get_commit_paths("89abcdef012", db) == {"src/api/api.cc"}
+    # Unknown is not the same as "touches nothing"
+    assert meta.get_commit_paths("fffffffffff", db) is None
+
+
+def test_get_commits_meta_in_batches(db, monkeypatch):
+    monkeypatch.setattr(meta, "META_BATCH", 2)
+    records = [(f"{i:011x}", DIFF.replace("#92345", f"#{i}")) for i in range(7)]
+    meta.index_records(records, db)
+
+    found = meta.get_commits_meta([h for h, _ in records] + ["fffffffffff"], db)
+    assert sorted(found) == [h for h, _ in records]
+    assert [found[h]["position"] for h, _ in records] == list(range(7))
+
+
+def make_commit(i):
+    # One commit a day from 2024-03-01 on, positions 92000, 92010, 92020, ...
+    return (f"{i:011x}", DIFF
+            .replace("#92345", f"#{92000 + 10 * i}")
+            .replace("Tue Mar 5 14:07:09 2024 +0100", f"Fri Mar {1 + i} 12:00:00 2024 +0000"))
+
+
+def test_get_commit_at_position(db):
+    assert meta.get_commit_at_position(92000, db) is None
+    meta.index_records([make_commit(i) for i in range(5)], db)
+    assert meta.get_commit_at_position(92030, db)["hash"] == f"{3:011x}"
+    assert meta.get_commit_at_position(92031, db) is None
+
+
+def test_get_commits_by_position(db):
+    assert meta.get_commits_by_position(92000, 92040, db) == []
+    # Inserted out of order, returned oldest first
+    meta.index_records([make_commit(i) for i in [4, 0, 2, 1, 3]], db)
+    meta.index_records([("89abcdef012", MERGE)], db)
+
+    rows = meta.get_commits_by_position(92010, 92030, db)
+    assert [row["position"] for row in rows] == [92010, 92020, 92030]
+    assert [row["hash"] for row in rows] == [f"{i:011x}" for i in [1, 2, 3]]
+    assert meta.get_commits_by_position(93000, 94000, db) == []
+
+
+def test_get_commits_by_date(db):
+    assert meta.get_commits_by_date(0, 2 ** 31, db) == []
+    meta.index_records([make_commit(i) for i in [3, 1, 0, 2, 4]], db)
+
+    start = datetime(2024, 3, 2, tzinfo=timezone.utc)
+    end = datetime(2024, 3, 4, 12, tzinfo=timezone.utc)
+    assert [row["hash"] for row in meta.get_commits_by_date(start, end, db)] == [f"{i:011x}" for i in [1, 2, 3]]
+    # Unix timestamps work as well, both ends are included
+    assert [row["hash"] for row in meta.get_commits_by_date(end.timestamp(), end.timestamp() + 86400, db)] == [f"{i:011x}" for i in [3, 4]]
+
+
+def test_range_scans_use_the_indexes(db):
+    meta.index_records([make_commit(i) for i in range(5)], db)
+    conn = meta._connect(db)
+    for column in ["position", "timestamp"]:
+        plan = " ".join(str(row) for row in conn.execute(f"EXPLAIN QUERY PLAN SELECT * FROM commits WHERE {column} BETWEEN 1 AND 2 ORDER BY {column}"))
+        assert f"commits_{column}" in plan
+
+
+def test_reindexing_replaces_the_row(db):
+    meta.index_records([("0123456789a", DIFF)], db)
+    meta.index_records([("0123456789a", DIFF.replace("#92345", "#92346"))], db)
+    assert meta.get_commit_meta("0123456789a", db)["position"] == 92346
+
+
+def test_backfill_meta(db):
+    store.append_records([("0123456789a", DIFF), ("89abcdef012", MERGE)], db)
+    assert meta.backfill_meta(db) == 2
+    assert meta.get_commit_meta("0123456789a", db)["position"] == 92345
+    # Nothing left to do the second time
+    assert meta.backfill_meta(db) == 0
@@ -0,0 +1,41 @@
+import pytest
+
+import base.multi as multi
+import base.sandbox as sandbox
+from base.sandbox import CRASH, OK
+
+
+def make_variant(name):
+    return {"name": name, "bad": None, "good": None, "skipped": set(), "status": "open"}
+
+
+@pytest.fixture
+def anchor_runs(monkeypatch):
+    # name -> (outcome, runtime) of every variant on the anchor
+    runs = {}
+
+    def test_revision(commit_hash, variants, runtimes=None):
+        # Like run_variants(), outcomes from the verdict store come without a runtime
+        runtimes.update({v["name"]: runs[v["name"]][1] for v in variants if runs[v["name"]][1] is not None})
+        return {v["name"]: runs[v["name"]][0] for v in variants}
+
+    monkeypatch.setattr(multi, "test_revision", test_revision)
+    monkeypatch.setattr(sandbox, "RUN_TIMEOUT", 600)
+    return runs
+
+
+def test_validate_variants_calibrates_on_the_slowest_crash(anchor_runs):
+    anchor_runs.update({"fast": (CRASH, 1.0), "slow": (CRASH, 3.0), "clean": (OK, 50.0)})
+    variants = [make_variant(name) for name in anchor_runs]
+    multi.validate_variants(variants, "23996db34af")
+
+    assert [v["status"] for v in variants] == ["open", "open", "no crash"]
+    assert variants[0]["bad"] == 0
+    # The PoC which does not crash is left out of the timeout as well
+    assert sandbox.RUN_TIMEOUT == 15
+
+
+def test_validate_variants_keeps_the_timeout_without_runtimes(anchor_runs):
+    anchor_runs.update({"stored": (CRASH, None)})
+    multi.validate_variants([make_variant("stored")], "23996db34af")
+    assert sandbox.RUN_TIMEOUT == 600
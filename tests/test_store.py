@@ -0,0 +1,168 @@
+import os
+import random
+
+import pytest
+
+import base.store as store
+
+
+def make_diff(i, lines=30):
+    rng = random.Random(i)
+    body = "".join(f"+    int value_{rng.randint(0, 40)} = {rng.randint(0, 9)};\n" for _ in range(lines))
+    return (
+        f"commit {i:040x}\n"
+        f"Author: Dev <dev@example.com>\n"
+        f"Date:   Mon Jan 1 00:00:00 2024 +0000\n\n"
+        f"    Change {i}\n\n"
+        f"    Change-Id: I{i:040x}\n"
+        f"    Cr-Commit-Position: refs/heads/main@{{#{100000 + i}}}\n\n"
+        f"diff --git a/src/f{i % 7}.cc b/src/f{i % 7}.cc\n"
+        f"{body}"
+    )
+
+
+def make_records(start, count):
+    return [(f"{i:011x}", make_diff(i)) for i in range(start, start + count)]
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "db")
+
+
+def test_round_trip(db):
+    records = make_records(0, 50)
+    assert store.append_records(records, db) == 50
+    for commit_hash, diff in records:
+        assert store.read_record(commit_hash, db) == diff
+    assert store.list_records(db) == {h for h, _ in records}
+    assert store.read_record("deadbeef000", db) is None
+
+
+def test_records_stay_plain_until_the_store_is_big_enough(db, monkeypatch):
+    monkeypatch.setattr(store, "DICT_MIN_SAMPLES", 40)
+    store.append_records(make_records(0, 20), db)
+    assert store.get_dictionary(db) is None
+
+    store.append_records(make_records(20, 20), db)
+    dict_id, codec, _ = store.get_dictionary(db)
+    assert dict_id == 1
+    assert store.get_dict_trained(db, dict_id) == 40
+
+    # The plain and the compressed records read back the same
+    for commit_hash, diff in make_records(0, 40):
+        assert store.read_record(commit_hash, db) == diff
+
+
+def test_dictionary_is_retrained_as_the_store_grows(db, monkeypatch):
+    monkeypatch.setattr(store, "DICT_MIN_SAMPLES", 10)
+    records = make_records(0, 200)
+    for start in range(0, 200, 10):
+        store.append_records(records[start:start + 10], db)
+
+    # Trained at 10 records, then at 40 and 160
+    dict_id, _, _ = store.get_dictionary(db)
+    assert dict_id == 3
+    assert [store.get_dict_trained(db, i) for i in [1, 2, 3]] == [10, 40, 160]
+    for commit_hash, diff in records:
+        assert store.read_record(commit_hash, db) == diff
+
+
+def test_segments_roll_over(db, monkeypatch):
+    monkeypatch.setattr(store, "SEGMENT_SIZE", 4096)
+    records = make_records(0, 60)
+    store.append_records(records[:30], db)
+    store.append_records(records[30:], db)
+
+    segments = [name for name in os.listdir(store.get_pack_dir(db)) if name.startswith("seg-")]
+    assert len(segments) > 1
+    for name in segments:
+        assert os.path.getsize(os.path.join(store.get_pack_dir(db), name)) <= 4096
+    for commit_hash, diff in records:
+        assert store.read_record(commit_hash, db) == diff
+
+
+def test_reader_sees_records_appended_later(db):
+    store.append_records(make_records(0, 5), db)
+    assert store.read_record(f"{3:011x}", db) is not None
+    store.append_records(make_records(5, 5), db)
+    assert store.read_record(f"{8:011x}", db) == make_diff(8)
+
+
+def test_check_and_repair_store(db):
+    records = make_records(0, 20)
+    store.append_records(records, db)
+    assert store.check_store(db)
+
+    # The last segment loses its tail, as if the writer died before the data reached the disk
+    segment_path = store.get_segment_path(db, store._last_segment(db))
+    size = os.path.getsize(segment_path)
+    with open(segment_path, "r+b") as f:
+        f.truncate(size - 10)
+    assert not store.check_store(db)
+
+    assert store.repair_store(db) == 1
+    assert store.check_store(db)
+    assert store.list_records(db) == {h for h, _ in records[:-1]}
+
+
+def test_partial_index_record_is_dropped(db):
+    store.append_records(make_records(0, 3), db)
+    with open(os.path.join(store.get_pack_dir(db), store.INDEX_FILE), "ab") as f:
+        f.write(b"\1\2\3")
+    assert not store.check_store(db)
+
+    # The next writer truncates it before appending
+    store.append_records(make_records(3, 2), db)
+    assert store.check_store(db)
+    assert len(store.list_records(db)) == 5
+
+
+def test_watermark(db):
+    assert store.get_watermark(db) is None
+    store.set_watermark(db, "a" * 40)
+    assert store.get_watermark(db) == "a" * 40
+
+
+def test_legacy_diffs(db):
+    os.makedirs(db)
+    legacy = make_records(0, 5)
+    for commit_hash, diff in legacy:
+        with open(store.get_legacy_path(db, commit_hash), "w") as f:
+            f.write(diff)
+    store.append_records(make_records(5, 5), db)
+
+    assert store.has_legacy_diffs(db)
+    assert store.read_record(legacy[0][0], db) == legacy[0][1]
+    assert len(store.list_records(db)) == 10
+
+    assert store.pack_legacy_diffs(db) == 5
+    assert not store.has_legacy_diffs(db)
+    for commit_hash, diff in make_records(0, 10):
+        assert store.read_record(commit_hash, db) == diff
+
+
+def test_search_records(db, monkeypatch):
+    # Most of the records are compressed
+    monkeypatch.setattr(store, "DICT_MIN_SAMPLES", 10)
+    records = make_records(0, 40)
+    store.append_records(records, db)
+
+    def expected(match):
+        return {h for h, diff in records if match(diff)}
+
+    assert store.search_records("refs/heads/main@{#100007}", db) == {f"{7:011x}"}
+    assert store.search_records("src/f3.cc", db) == expected(lambda d: "src/f3.cc" in d)
+    assert store.search_records(r"value_1\d = 9", db, regex=True) == expected(lambda d: any(f"value_{n} = 9" in d for n in range(10, 20)))
+    assert store.search_records("nothing like this", db) == set()
+
+    # Only the given hashes are scanned
+    subset = {f"{3:011x}", f"{10:011x}"}
+    assert store.search_records("src/f3.cc", db, hashes=subset) == {f"{3:011x}", f"{10:011x}"}
+
+
+def test_search_records_in_a_process_pool(db, monkeypatch):
+    monkeypatch.setattr(store, "SCAN_INLINE", 0)
+    records = make_records(0, 30)
+    store.append_records(records, db)
+    assert store.search_records("src/f2.cc", db, workers=2) == {h for h, diff in records if "src/f2.cc" in diff}
@@ -0,0 +1,136 @@
+import re
+
+import pytest
+
+import base.store as store
+import base.trigram as trigram
+
+
+def make_diff(i):
+    return (
+        f"commit {i:040x}\n"
+        f"Author: Dev <dev@example.com>\n\n"
+        f"    Change {i}\n\n"
+        f"diff --git a/src/f{i % 5}.cc b/src/f{i % 5}.cc\n"
+        f"+  ReduceCall{i % 3}(node);\n"
+        f"+  return value_{i} + {i % 11};\n"
+    )
+
+
+RECORDS = [(f"{i:011x}", make_diff(i)) for i in range(60)]
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "db")
+
+
+def build(db, batch=60):
+    for start in range(0, len(RECORDS), batch):
+        chunk = RECORDS[start:start + batch]
+        store.append_records(chunk, db)
+        trigram.index_trigrams(chunk, db)
+    trigram.backfill_trigrams(db)
+
+
+def expected(pattern, regex=False):
+    return {h for h, diff in RECORDS if (re.search(pattern, diff) if regex else pattern in diff)}
+
+
+def test_postings_round_trip():
+    ids = [0, 1, 2, 127, 128, 300, 70000, 2 ** 31]
+    data = trigram._encode_postings(ids)
+    assert trigram._decode_postings(data, 0, len(ids)) == ids
+
+
+def test_extract_trigrams():
+    assert trigram.extract_trigrams(b"abcd\nabcd\nxy") == {b"abc", b"bcd"}
+
+
+def test_build_query_of_a_fixed_string():
+    assert trigram.build_query("ReduceCall") == ("lit", b"ReduceCall")
+
+
+def test_build_query_of_a_regex():
+    assert trigram.build_query(r"ReduceCall\d+\(node\)", regex=True) == ("and", [("lit", b"ReduceCall"), ("lit", b"(node)")])
+    assert trigram.build_query(r"value_(12|34)", regex=True) == ("lit", b"value_")
+    assert trigram.build_query(r"(ReduceCall|return value)", regex=True) == ("or", [("lit", b"ReduceCall"), ("lit", b"return value")])
+    # An alternation with a branch that requires nothing requires nothing
+    assert trigram.build_query(r"(ReduceCall|x)", regex=True) is None
+    # Optional parts require nothing, repeated ones their content
+    assert trigram.build_query(r"(?:abcd)?efg", regex=True) == ("lit", b"efg")
+    assert trigram.build_query(r"(?:abcd)+", regex=True) == ("lit", b"abcd")
+
+
+def test_build_query_without_usable_literals():
+    assert trigram.build_query(r"a.c", regex=True) is None
+    assert trigram.build_query(r"(?i)ReduceCall", regex=True) is None
+    assert trigram.build_query(r"(?i:ReduceCall)", regex=True) is None
+    assert trigram.build_query(r"(unclosed", regex=True) is None
+
+
+@pytest.mark.parametrize("pattern,regex", [
+    ("ReduceCall1", False),
+    ("value_42 ", False),
+    ("src/f3.cc", False),
+    ("not in any diff", False),
+    ("ab", False),
+    (r"value_\d+ \+ 1[0-9]", True),
+    (r"(ReduceCall2|value_7 )", True),
+    (r"a.c", True),
+])
+def test_candidates_cover_every_match(db, pattern, regex):
+    build(db)
+    candidates = trigram.candidate_commits(pattern, db, regex)
+    matches = store.search_records(pattern, db, hashes=candidates, regex=regex)
+    assert matches == expected(pattern, regex)
+    if candidates is not None:
+        assert expected(pattern, regex) <= candidates
+
+
+@pytest.mark.parametrize("pattern", [r"^\+  ReduceCall1\(node\);$", r"^\+  return value_4\d \+", r"^commit 0+2"])
+def test_regex_anchors_match_each_line(db, pattern):
+    build(db)
+    # Line by line, as ripgrep searches the legacy .diff files
+    lines = {h for h, diff in RECORDS if any(re.search(pattern, line) for line in diff.splitlines())}
+    assert lines
+    candidates = trigram.candidate_commits(pattern, db, regex=True)
+    assert store.search_records(pattern, db, hashes=candidates, regex=True) == lines
+    assert store.search_records(pattern, db, regex=True) == lines
+
+
+def test_candidates_narrow_the_scan(db):
+    build(db)
+    assert trigram.candidate_commits("value_42 ", db) == {f"{42:011x}"}
+    assert trigram.candidate_commits("not in any diff", db) == set()
+    # Nothing to narrow down with
+    assert trigram.candidate_commits("ab", db) is None
+
+
+def test_small_shards_are_merged(db, monkeypatch):
+    monkeypatch.setattr(trigram, "MERGE_SHARDS", 3)
+    build(db, batch=5)
+
+    shards = trigram._shard_names(db)
+    assert len(shards) <= 4
+    assert trigram.indexed_commits(db) == {h for h, _ in RECORDS}
+    for pattern in ["ReduceCall1", "value_42 ", "src/f3.cc"]:
+        assert trigram.candidate_commits(pattern, db) >= expected(pattern)
+    assert trigram.candidate_commits("value_42 ", db) == {f"{42:011x}"}
+
+
+def test_index_is_not_used_until_it_is_complete(db):
+    store.append_records(RECORDS, db)
+    trigram.index_trigrams(RECORDS[:30], db)
+    # Half of the commits are not indexed yet
+    assert trigram.candidate_commits("ReduceCall1", db) is None
+
+    assert trigram.backfill_trigrams(db) == 30
+    assert trigram.candidate_commits("ReduceCall1", db) == expected("ReduceCall1")
+
+    # An ingest takes the index out of use until the backfill after it
+    trigram.unmark_ready(db)
+    assert trigram.candidate_commits("ReduceCall1", db) is None
+    assert trigram.backfill_trigrams(db) == 0
+    assert trigram.has_trigrams(db)
+
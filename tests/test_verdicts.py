@@ -0,0 +1,40 @@
+import pytest
+
+import base.verdicts as verdicts
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(verdicts, "VERDICT_STORE", str(tmp_path / "verdicts.jsonl"))
+    monkeypatch.setattr(verdicts, "KNOWN_VERDICTS", {})
+    monkeypatch.setattr(verdicts, "_OFFSET", 0)
+
+
+def test_flags_are_keyed_as_d8_gets_them():
+    assert verdicts.normalize_flags("  --future\t--allow-natives-syntax ") == "--future --allow-natives-syntax"
+    assert verdicts.normalize_flags(None) == ""
+    # A flag utils/flags.py does not know is still passed to d8, so it is part of the key
+    assert verdicts.verdict_key("b", "h", "--future --no-such-flag") != verdicts.verdict_key("b", "h", "--future")
+
+
+def test_lookup_verdict():
+    verdicts.store_verdict("x64-release-100000", "h", "--future  --jitless", "CRASH", trials=3, run_timeout=10)
+    assert verdicts.lookup_verdict("x64-release-100000", "h", "--future --jitless")["outcome"] == "CRASH"
+    assert verdicts.lookup_verdict("x64-release-100000", "h", "--future --jitless --no-such-flag") is None
+    assert verdicts.lookup_verdict("x64-release-100000", "other", "--future --jitless") is None
+    # Fewer trials than asked for do not settle it
+    assert verdicts.lookup_verdict("x64-release-100000", "h", "--future --jitless", trials=5) is None
+
+
+def test_timeout_under_a_shorter_limit_is_not_reused():
+    verdicts.store_verdict("x64-release-100000", "h", "", "TIMEOUT", run_timeout=10)
+    assert verdicts.lookup_verdict("x64-release-100000", "h", "", run_timeout=10)["outcome"] == "TIMEOUT"
+    assert verdicts.lookup_verdict("x64-release-100000", "h", "", run_timeout=60) is None
+
+
+def test_records_of_other_processes_are_picked_up():
+    verdicts.store_verdict("x64-release-100000", "h", "", "OK")
+    # A fresh process starts with nothing read
+    verdicts.KNOWN_VERDICTS.clear()
+    verdicts._OFFSET = 0
+    assert verdicts.lookup_verdict("x64-release-100000", "h", "")["outcome"] == "OK"
@@ -0,0 +1,194 @@
+import threading
+import requests
+from time import time, sleep
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.colors import *
+
+# Variable to hold the shared connection-pooled HTTP session
+SESSION = None
+# Variable to hold the (connect, read) timeouts of every request in seconds
+TIMEOUT = (10, 60)
+# Variable to hold how many times a dropped download is resumed before giving up
+MAX_RESUMES = 5
+# Variable to hold the size above which archives are fetched in parallel byte ranges (64 MB)
+RANGE_THRESHOLD = 64 * 1024 * 1024
+# Variable to hold the number of parallel byte ranges per archive
+RANGE_PARTS = 4
+# Variable to hold the size of the chunks read from the network (1 MB)
+CHUNK_SIZE = 1024 * 1024
+# Variable to hold the throughput metrics of every finished download of this session
+DOWNLOAD_STATS = []
+
+_SESSION_LOCK = threading.Lock()
+
+class DownloadError(Exception):
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+def get_session():
+    global SESSION
+    with _SESSION_LOCK:
+        if SESSION is None:
+            # Retry transient server errors at the connection level, resumes are handled below.
+            # Once the retries are used up the last response is returned and turned into a DownloadError
+            retry = Retry(
+                total=3,
+                backoff_factor=1,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET", "HEAD"],
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=retry)
+            SESSION = requests.Session()
+            SESSION.mount("http://", adapter)
+            SESSION.mount("https://", adapter)
+        return SESSION
+
+def _get(url, start=None, end=None):
+    headers = {}
+    if start is not None:
+        headers["Range"] = f"bytes={start}-" if end is None else f"bytes={start}-{end}"
+
+    try:
+        r = get_session().get(url, headers=headers, stream=True, timeout=TIMEOUT)
+    except requests.exceptions.RetryError as e:
+        raise DownloadError(f"Giving up on {url}: {e}")
+    if r.status_code >= 400:
+        r.close()
+        raise DownloadError(f"HTTP {r.status_code} for {url}", r.status_code)
+    return r
+
+def _write_at(fileobj, lock, offset, data):
+    with lock:
+        fileobj.seek(offset)
+        fileobj.write(data)
+
+def _fetch_range(url, fileobj, lock, start, end, progress, stats):
+    # Fetch bytes [start, end] resuming after the last written byte on failure
+    offset = start
+    resumes = 0
+
+    while offset <= end:
+        last_offset = offset
+        try:
+            with _get(url, offset, end) as r:
+                if r.status_code != 206:
+                    raise DownloadError(f"Server ignored Range request for {url}")
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        _write_at(fileobj, lock, offset, chunk)
+                        offset += len(chunk)
+                        if progress:
+                            progress(len(chunk))
+            if offset <= end and offset == last_offset:
+                raise requests.ConnectionError(f"No data received for bytes {offset}-{end}")
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            resumes += 1
+            if resumes > MAX_RESUMES:
+                raise DownloadError(f"Download of {url} failed after {MAX_RESUMES} resumes: {e}")
+            sleep(min(2 ** resumes, 30))
+
+    with lock:
+        stats["resumes"] += resumes
+
+def _fetch_stream(url, fileobj, progress, stats):
+    # Sequential download, resumed with an HTTP Range request after a dropped connection
+    written = 0
+    resumes = 0
+    total = None
+
+    while True:
+        try:
+            r = _get(url, written if written else None)
+            with r:
+                if written and r.status_code != 206:
+                    # Server does not support ranges, start over
+                    fileobj.seek(0)
+                    fileobj.truncate()
+                    if progress:
+                        progress(-written)
+                    written = 0
+                if total is None:
+                    total = int(r.headers.get("content-length", 0)) or None
+
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        fileobj.write(chunk)
+                        written += len(chunk)
+                        if progress:
+                            progress(len(chunk))
+
+            if total is None or written >= total:
+                break
+            raise requests.ConnectionError(f"Connection closed after {written}/{total} bytes")
+
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            resumes += 1
+            if resumes > MAX_RESUMES:
+                raise DownloadError(f"Download of {url} failed after {MAX_RESUMES} resumes: {e}")
+            sleep(min(2 ** resumes, 30))
+
+    stats["resumes"] += resumes
+    return written
+
+def probe_download(url):
+    # Returns (size, supports_ranges) without downloading the body
+    try:
+        r = get_session().head(url, timeout=TIMEOUT, allow_redirects=True)
+    except requests.RequestException as e:
+        raise DownloadError(f"Could not reach {url}: {e}")
+    if r.status_code == 405:
+        # HEAD not allowed, fall back to a plain streamed GET
+        return 0, False
+    if r.status_code >= 400:
+        raise DownloadError(f"HTTP {r.status_code} for {url}", r.status_code)
+    size = int(r.headers.get("content-length", 0))
+    return size, r.headers.get("accept-ranges", "").lower() == "bytes"
+
+def download_to_file(url, fileobj, progress=None, on_size=None):
+    stats = {"url": url, "bytes": 0, "seconds": 0.0, "ranges": 1, "resumes": 0}
+    start_time = time()
+
+    size, ranged = probe_download(url)
+    if on_size:
+        on_size(size)
+
+    if ranged and size > RANGE_THRESHOLD:
+        # Large archive, fetch RANGE_PARTS byte ranges in parallel into the same file
+        lock = threading.Lock()
+        part = -(-size // RANGE_PARTS)
+        ranges = [(s, min(s + part, size) - 1) for s in range(0, size, part)]
+        stats["ranges"] = len(ranges)
+
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            futures = [executor.submit(_fetch_range, url, fileobj, lock, s, e, progress, stats) for s, e in ranges]
+            for f in futures:
+                f.result()
+        fileobj.seek(size)
+        stats["bytes"] = size
+    else:
+        stats["bytes"] = _fetch_stream(url, fileobj, progress, stats)
+
+    stats["seconds"] = time() - start_time
+    DOWNLOAD_STATS.append(stats)
+    return stats
+
+def format_throughput(stats):
+    mb = stats["bytes"] / (1024 * 1024)
+    rate = mb / stats["seconds"] if stats["seconds"] else 0
+    return f"{mb:.1f} MB in {stats['seconds']:.1f}s ({rate:.1f} MB/s, {stats['ranges']} ranges, {stats['resumes']} resumes)"
+
+def print_download_stats():
+    if not DOWNLOAD_STATS:
+        return
+    total = {
+        "bytes": sum(s["bytes"] for s in DOWNLOAD_STATS),
+        "seconds": sum(s["seconds"] for s in DOWNLOAD_STATS),
+        "ranges": sum(s["ranges"] for s in DOWNLOAD_STATS),
+        "resumes": sum(s["resumes"] for s in DOWNLOAD_STATS)
+    }
+    cyan(f"[*] Downloads: {len(DOWNLOAD_STATS)} archives, {format_throughput(total)}")
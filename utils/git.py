@@ -1,11 +1,37 @@
 import os
 import sys, re
 import subprocess, shutil
+from time import time
 from tqdm import tqdm
 import multiprocessing
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
 
 from utils.colors import *
+from base.store import list_records, append_records, get_watermark, set_watermark, check_store, repair_store
+from base.meta import index_records, has_meta, backfill_meta
+from base.trigram import index_trigrams, has_trigrams, backfill_trigrams, unmark_ready
+
+# Variable to hold the first-parent history of HEAD (newest first) as abbreviated hashes
+COMMIT_INDEX = None
+# Variable to hold the position of every hash in COMMIT_INDEX
+COMMIT_POSITIONS = None
+# Variable to hold the hashes of COMMIT_INDEX in sorted order (prefix lookups of differently abbreviated hashes)
+SORTED_HASHES = None
+# Variable to hold the lengths of the abbreviated hashes in COMMIT_INDEX
+HASH_LENGTHS = None
+# Variable to hold the position of every hash resolved by prefix so far (None = not in COMMIT_INDEX)
+COMMIT_LOOKUPS = {}
+# Variable to hold the file name of the persisted commit index inside the DB directory
+COMMIT_INDEX_FILE = ".commit_index"
+# Variable to hold the line git log prints in front of every commit during ingest (followed by %h)
+INGEST_SENTINEL = b"\x1eVISECT-COMMIT "
+# Variable to hold the git log format of an ingested commit, the header `git show` prints after the sentinel
+INGEST_FORMAT = "%x1eVISECT-COMMIT %h%ncommit %H%nAuthor: %an <%ae>%nDate:   %ad%n%n%w(0,4,4)%B"
+# Variable to hold the number of git log streams an ingest is sharded over
+INGEST_STREAMS = min(4, multiprocessing.cpu_count())
+# Variable to hold how many bytes of diffs a stream buffers before appending them to the DB (Default: 16 MB)
+INGEST_BATCH = 16 * 1024 * 1024
 
 def is_git_installed(system):
     try:
@@ -58,27 +84,144 @@ def is_commit_in_log(commit_hash,v8_path):
         red(f"Error: {e}")
         return False
 
-def save_commit_diff(commit_hash,db_path,v8_path):
-    diff_file_path = os.path.join(db_path, f"{commit_hash}.diff")
+def stream_commit_diffs(hashes,db_path,v8_path,progress=None):
+    # One git log process for all the hashes, records are split on the sentinel line as they arrive
+    proc = subprocess.Popen(
+        ["git", "log", "-p", "--cc", "--no-walk=unsorted", "--stdin", f"--format={INGEST_FORMAT}"],
+        cwd=v8_path,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
+    )
+    # git reads every revision from stdin before it prints anything
+    proc.stdin.write(("\n".join(hashes) + "\n").encode())
+    proc.stdin.close()
+
+    saved = 0
+    batch, batch_size = [], 0
+    commit_hash, lines = None, []
 
-    if os.path.isfile(diff_file_path):
-        return True  # Already exists, skip
+    def take_record():
+        nonlocal batch_size
+        body = b"".join(lines)
+        batch.append((commit_hash, body.decode("utf-8", errors="replace")))
+        batch_size += len(body)
+        if progress is not None:
+            progress.update(1)
+
+    for line in proc.stdout:
+        if line.startswith(INGEST_SENTINEL):
+            if commit_hash is not None:
+                take_record()
+                if batch_size >= INGEST_BATCH:
+                    saved += append_records(batch, db_path)
+                    index_records(batch, db_path)
+                    index_trigrams(batch, db_path)
+                    batch, batch_size = [], 0
+            commit_hash, lines = line[len(INGEST_SENTINEL):].strip().decode(), []
+        else:
+            lines.append(line)
+    if commit_hash is not None:
+        take_record()
+    saved += append_records(batch, db_path)
+    index_records(batch, db_path)
+    index_trigrams(batch, db_path)
+
+    if proc.wait() != 0:
+        raise subprocess.CalledProcessError(proc.returncode, "git log -p --stdin", stderr=f"{len(hashes) - saved} commits not read")
+    return saved
+
+def load_commit_index(db_path,v8_path):
+    global COMMIT_INDEX, COMMIT_POSITIONS, SORTED_HASHES, HASH_LENGTHS, COMMIT_LOOKUPS
+    index_path = os.path.join(db_path, COMMIT_INDEX_FILE)
 
     try:
-        with open(diff_file_path, "w") as diff_file:
-            subprocess.run(
-                ["git", "show", commit_hash],
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=v8_path,
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        head = result.stdout.strip()
+
+        # First line of the persisted index is the HEAD it was built from
+        hashes = None
+        if os.path.isfile(index_path):
+            with open(index_path, "r") as f:
+                lines = f.read().splitlines()
+            if lines and lines[0] == head:
+                hashes = lines[1:]
+
+        if hashes is None:
+            yellow("[*] Building commit index...")
+            result = subprocess.run(
+                ["git", "log", "--first-parent", "--pretty=format:%h", "HEAD"],
                 cwd=v8_path,
-                stdout=diff_file,
-                stderr=subprocess.DEVNULL,
+                capture_output=True,
                 text=True,
                 check=True
             )
+            hashes = result.stdout.strip().splitlines()
+
+            os.makedirs(db_path, exist_ok=True)
+            with open(index_path, "w") as f:
+                f.write("\n".join([head] + hashes))
+
+        COMMIT_INDEX = hashes
+        COMMIT_POSITIONS = {ch: pos for pos, ch in enumerate(hashes)}
+        SORTED_HASHES = sorted(hashes)
+        HASH_LENGTHS = sorted({len(ch) for ch in hashes})
+        COMMIT_LOOKUPS = {}
+        green(f"[+] Commit index loaded: {len(hashes)} commits up to {head}")
         return True
+
+    except subprocess.CalledProcessError as e:
+        red(f"[-] Git command failed: {e.stderr}")
+        return False
     except Exception as e:
-        return f"Error for {commit_hash}: {e}"    
-    
+        red(f"[-] Error: {e}")
+        return False
+
+def get_commit_position(commit_hash):
+    if COMMIT_POSITIONS is None or not commit_hash:
+        return None
+
+    position = COMMIT_POSITIONS.get(commit_hash)
+    if position is not None:
+        return position
+    if commit_hash not in COMMIT_LOOKUPS:
+        # Misses are remembered too, hashes off the index fall back to git on every call anyway
+        COMMIT_LOOKUPS[commit_hash] = _find_commit_position(commit_hash)
+    return COMMIT_LOOKUPS[commit_hash]
+
+def _find_commit_position(commit_hash):
+    # Hashes typed by the user may be abbreviated differently than git's %h
+    for length in HASH_LENGTHS:
+        # A longer hash of an indexed commit
+        if length < len(commit_hash) and commit_hash[:length] in COMMIT_POSITIONS:
+            return COMMIT_POSITIONS[commit_hash[:length]]
+    # A shorter hash of an indexed commit sorts right before it
+    i = bisect_left(SORTED_HASHES, commit_hash)
+    if i < len(SORTED_HASHES) and SORTED_HASHES[i].startswith(commit_hash):
+        return COMMIT_POSITIONS[SORTED_HASHES[i]]
+    return None
+
+def get_commits_behind(commit_hash):
+    # Number of first-parent commits older than commit_hash (None if the index is not loaded)
+    position = get_commit_position(commit_hash)
+    if position is None:
+        return None
+    return len(COMMIT_INDEX) - 1 - position
+
 def get_commit(start_hash,distance,v8_path):
+    position = get_commit_position(start_hash)
+    if position is not None:
+        if position + distance >= len(COMMIT_INDEX):
+            red(f"[-] Less than {distance} commits found from the given hash.")
+            sys.exit(1)
+        return COMMIT_INDEX[position + distance]
+
     try:
         yellow(f"[*] Getting the commit {distance} behind {start_hash}...")
 
@@ -116,6 +259,12 @@ def get_commit(start_hash,distance,v8_path):
         return None
     
 def get_distance(older_commit, newer_commit, repo_path):
+    older_position = get_commit_position(older_commit)
+    newer_position = get_commit_position(newer_commit)
+    if older_position is not None and newer_position is not None:
+        # Same semantics as rev-list --count older..newer on a linear history
+        return max(older_position - newer_position, 0)
+
     try:
         yellow(f"[*] Calculating distance from {older_commit} to {newer_commit}...")
 
@@ -145,45 +294,94 @@ def get_distance(older_commit, newer_commit, repo_path):
         red(f"[-] Error: {e}")
         return None
 
+def ingest_commits(missing_commits,db_path,v8_path):
+    total = len(missing_commits)
+    # Contiguous shards of the history, one git log stream each
+    streams = max(1, min(INGEST_STREAMS, total // 1000))
+    shard = -(-total // streams)
+    shards = [missing_commits[i:i + shard] for i in range(0, total, shard)]
+    green(f"[+] Found {total} new commits. Saving to DB using {len(shards)} git log streams...")
+
+    start = time()
+    with tqdm(total=total, desc="Updating DB", unit="commit") as progress, ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        futures = [executor.submit(stream_commit_diffs, hashes, db_path, v8_path, progress) for hashes in shards]
+        saved = sum(f.result() for f in futures)
+
+    elapsed = max(time() - start, 1e-6)
+    green(f"[+] Done: {saved} new commit diffs saved to: {db_path} in {elapsed:.1f}s ({saved / elapsed:.0f} commits/s)")
+    return saved
+
+def is_ancestor(older_commit,newer_commit,v8_path):
+    result = subprocess.run(
+        ["git", "merge-base", "--is-ancestor", older_commit, newer_commit],
+        cwd=v8_path,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    return result.returncode == 0
+
 def extract_git_diffs_to_db(db_path,v8_path):
     try:
         yellow("[*] Checking if DB is upto date...")
         os.makedirs(db_path, exist_ok=True)
 
-        # Get all commit hashes
         result = subprocess.run(
-            ["git", "log", "--pretty=format:%h"],
+            ["git", "rev-parse", "HEAD"],
             cwd=v8_path,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
             check=True
         )
+        head = result.stdout.strip()
+        watermark = get_watermark(db_path)
 
-        all_commits = result.stdout.strip().splitlines()
-
-        # Filter out existing ones
-        missing_commits = [
-            ch for ch in all_commits
-            if not os.path.isfile(os.path.join(db_path, f"{ch}.diff"))
-        ]
+        if not check_store(db_path):
+            red("[-] The DB index is damaged. Repairing it and rescanning the whole history...")
+            repair_store(db_path)
+            watermark = None
 
-        total = len(missing_commits)
+        if not has_meta(db_path):
+            # DB built before the metadata index
+            backfill_meta(db_path)
+        if not has_trigrams(db_path):
+            # DB built before the trigram index
+            backfill_trigrams(db_path)
 
-        if total == 0:
+        if watermark == head:
             green("[+] All commit diffs are already up to date.")
             return True
 
-        green(f"[+] Found {total} new commits. Saving to DB using {multiprocessing.cpu_count()} cores...")
+        if watermark and is_ancestor(watermark, head, v8_path):
+            # Only the commits since the last sync
+            rev_range = [f"{watermark}..{head}"]
+        else:
+            if watermark:
+                yellow(f"[*] The DB was synced to {watermark[:11]}, which is not in the history of HEAD anymore (rebase?). Rescanning...")
+            rev_range = [head]
 
-        with ProcessPoolExecutor() as executor:
-            futures = {executor.submit(save_commit_diff, ch,db_path,v8_path): ch for ch in missing_commits}
-            for f in tqdm(as_completed(futures), total=total, desc="Updating DB", unit="commit"):
-                result = f.result()
-                if result is not True:
-                    print(result)
+        result = subprocess.run(
+            ["git", "log", "--pretty=format:%h"] + rev_range,
+            cwd=v8_path,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=True
+        )
+        all_commits = result.stdout.strip().splitlines()
+
+        # Filter out existing ones (packed or legacy diff files)
+        known_commits = list_records(db_path)
+        missing_commits = [ch for ch in all_commits if ch not in known_commits]
 
-        green(f"[+] Done: {total} new commit diffs saved to: {db_path}")
+        if missing_commits:
+            unmark_ready(db_path)
+            ingest_commits(missing_commits, db_path, v8_path)
+            # Commits stored by an ingest which died before it indexed them
+            backfill_trigrams(db_path)
+        else:
+            green("[+] All commit diffs are already up to date.")
+        set_watermark(db_path, head)
         return True
 
     except subprocess.CalledProcessError as e:
@@ -191,4 +389,4 @@ def extract_git_diffs_to_db(db_path,v8_path):
         return False
     except Exception as e:
         red(f"[-] Unexpected error: {e}")
-        return False
\ No newline at end of file
+        return False